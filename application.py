@@ -0,0 +1,152 @@
+"""
+Application factory and the multi-worker server.
+
+    python application.py                      # WMS_WORKERS uvicorn workers, each built by create_app()
+
+Importing this module has no side effects: uvicorn's worker processes import it and build
+exactly one app each. main.py holds the module-level app for `uvicorn main:app` and the tests.
+With several workers, set WMS_DB_MAX_CONNECTIONS to split a connection budget between them,
+and either leave WMS_STARTUP_TASKS=lock or run `python -m bootstrap` once and set it to skip.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from functools import partial
+
+import uvicorn
+from fastapi import Depends, FastAPI, Response
+from tortoise.contrib.fastapi import register_tortoise
+from user.controller import router as user_router
+from inventory.controller import router as inventory_router
+from user.model import User
+from user.auth import get_admin_user
+from bootstrap import run_startup_tasks
+from db import pool_stats, tortoise_config
+from jobs import run_as_leader
+from inventory.partitions import run_log_maintenance
+from inventory.snapshots import run_snapshot_scheduler
+from inventory.reservations import run_reservation_expiry
+from inventory.events import change_feed
+from inventory.group_commit import group_committer
+from settings import Settings, settings
+import metrics
+
+
+def create_app(config: Settings = settings) -> FastAPI:
+    created = time.perf_counter()
+    app = FastAPI(title="Warehouse Management System")
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(user_router, prefix="/users")
+    app.include_router(inventory_router, prefix="/inventory")
+
+    # Register Tortoise first. Tables are created by the startup tasks, not by every worker.
+    register_tortoise(
+        app,
+        # One shared, instrumented asyncpg pool sized for this worker (see db.py)
+        config=tortoise_config(config),
+        generate_schemas=False,
+        add_exception_handlers=True,
+    )
+
+    # Startup events: only run AFTER Tortoise is ready
+    @app.on_event("startup")
+    async def run_one_time_setup():
+        # Schema and default admin, one worker at a time (or skipped, see bootstrap.py)
+        app.state.startup_tasks = await run_startup_tasks(config)
+
+    @app.on_event("startup")
+    async def start_background_jobs():
+        # Partition rotation/archiving and stock snapshots run in one worker of the deployment
+        # at a time (see jobs.py); the others stand by to take over
+        jobs = [partial(
+            run_log_maintenance,
+            config.maintenance_interval,
+            config.log_partitions_ahead,
+            config.log_retention_months,
+            config.log_archive_dir,
+        )]
+        if config.stock_snapshot_interval > 0:
+            # Periodic stock snapshots behind the point-in-time stock report
+            jobs.append(partial(
+                run_snapshot_scheduler,
+                config.stock_snapshot_interval,
+                config.stock_snapshot_retention_days,
+            ))
+        app.state.background_jobs = asyncio.create_task(run_as_leader(jobs, config.background_jobs_retry))
+
+    @app.on_event("startup")
+    async def start_reservation_expiry():
+        # Returns units held by expired reservations to available stock; safe in every worker,
+        # as concurrent expiry rounds skip each other's locked rows
+        app.state.reservation_expiry = asyncio.create_task(run_reservation_expiry(
+            config.reservation_expiry_batch,
+            config.reservation_expiry_poll,
+        ))
+
+    @app.on_event("startup")
+    async def start_change_feed():
+        # One LISTEN connection per worker feeds every GET /inventory/stream client
+        app.state.change_feed = asyncio.create_task(change_feed.listen())
+
+    @app.on_event("startup")
+    async def start_metrics_sharing():
+        # Each worker publishes its metrics so that a scrape of any worker covers all of them
+        app.state.metrics_writer = None
+        if config.metrics_dir:
+            app.state.metrics_writer = asyncio.create_task(metrics.run_snapshot_writer(
+                config.metrics_dir,
+                config.metrics_flush_interval,
+            ))
+
+    @app.on_event("startup")
+    async def report_startup_time():
+        app.state.startup_seconds = time.perf_counter() - created
+        metrics.APP_STARTUP_SECONDS.set(app.state.startup_seconds)
+        print(
+            f"Worker {os.getpid()} ready in {app.state.startup_seconds:.2f}s "
+            f"(startup tasks: {app.state.startup_tasks}, pool max size: {config.worker_pool_max_size})"
+        )
+
+    @app.on_event("shutdown")
+    async def stop_background_tasks():
+        background = (
+            app.state.background_jobs, app.state.reservation_expiry, app.state.change_feed, app.state.metrics_writer
+        )
+        for task in background:
+            if task is not None:
+                task.cancel()
+        if config.metrics_dir:
+            metrics.write_snapshot(config.metrics_dir, final=True)
+        # Queued group-commit adjustments are written before the pool closes
+        await group_committer.drain()
+
+    # Live connection pool statistics (in use, idle, waiters, acquire latency)
+    @app.get("/system/db-pool", tags=["System"])
+    async def database_pool_stats(admin: User = Depends(get_admin_user)):
+        return pool_stats()
+
+    # Prometheus scrape endpoint: route latency, in-flight requests, query timings, pool state,
+    # for every worker sharing config.metrics_dir
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return Response(content=metrics.render(config.metrics_dir), media_type=metrics.CONTENT_TYPE)
+
+    return app
+
+
+def prepare_metrics_dir(config: Settings) -> None:
+    """Gives the workers a fresh shared metrics directory; they inherit it through the environment."""
+    if config.workers > 1 and not config.metrics_dir:
+        os.environ["WMS_METRICS_DIR"] = tempfile.mkdtemp(prefix="wms-metrics-")
+    elif config.metrics_dir:
+        # Counters of a previous run would be added to this one's
+        for name in os.listdir(config.metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(config.metrics_dir, name))
+
+
+if __name__ == "__main__":
+    prepare_metrics_dir(settings)
+    # Each worker process imports this module and builds its own app and pool
+    uvicorn.run("application:create_app", factory=True, host=settings.host, port=settings.port, workers=settings.workers)
@@ -0,0 +1,151 @@
+"""
+Reproducible load test for the inventory and user APIs.
+
+Drives the ASGI app in-process through httpx.ASGITransport against a seeded local
+database, for every combination of catalog size and concurrency, and writes
+throughput / p50 / p99 per scenario to a JSON file.
+
+    python -m benchmarks.harness --catalog-size 1000 10000 --concurrency 8 32 \\
+        --output bench_results.json --baseline benchmarks/baseline.json --threshold 0.25
+
+With --baseline the run fails (exit 1) when a scenario's throughput drops or its
+p99 grows by more than --threshold relative to the baseline file.
+The database named by --database is TRUNCATEd: never point it at real data.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+from httpx import ASGITransport, AsyncClient
+from tortoise import Tortoise
+
+from db import tortoise_config
+from inventory.ddl import apply_schema_extensions
+from settings import Settings
+
+from .scenarios import SCENARIOS, seed
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(factories: list, concurrency: int) -> dict:
+    """Fires the requests with at most `concurrency` in flight and summarises latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(factory):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await factory()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(factory) for factory in factories))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(factories),
+        "errors": errors,
+        "throughput_rps": round(len(factories) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current["p99_ms"] > previous["p99_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p99 {previous['p99_ms']} -> {current['p99_ms']} ms")
+    return regressions
+
+
+async def main(args) -> int:
+    # Imported here so the app (and its settings) load only when a run actually starts
+    from main import app
+
+    results = {}
+    for concurrency in args.concurrency:
+        config = Settings(
+            db_name=args.database,
+            db_pool_min_size=1,
+            db_pool_max_size=max(2, min(concurrency, args.max_pool_size)),
+        )
+        await Tortoise.init(config=tortoise_config(config))
+        try:
+            await Tortoise.generate_schemas()
+            await apply_schema_extensions()
+            for catalog_size in args.catalog_size:
+                context = await seed(catalog_size)
+                transport = ASGITransport(app=app)
+                async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                    for name in args.scenarios:
+                        factories = SCENARIOS[name](client, context, args.requests)
+                        # One untimed request warms caches (auth, prepared statements)
+                        await factories[0]()
+                        key = f"{name}@catalog={catalog_size},concurrency={concurrency}"
+                        results[key] = await run_scenario(factories, concurrency)
+                        print(f"{key:<60} {results[key]}")
+        finally:
+            await Tortoise.close_connections()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "catalog_sizes": args.catalog_size,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="warehouse_bench", help="scratch database (will be truncated)")
+    parser.add_argument("--catalog-size", type=int, nargs="+", default=[1000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16])
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--max-pool-size", type=int, default=20)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main(parse_args())))
@@ -0,0 +1,95 @@
+"""
+Wave picking planner on synthetic warehouse layouts.
+
+Generates random orders over a layout of --zones aisles with --shelves shelves each,
+plans them with inventory.picking.plan_waves for every --wave-orders size and prints:
+
+  plan time      p50 / max over --iterations runs of the whole plan (pure Python, no database)
+  stops          locations visited, summed over waves
+  walk           total route length, aisles and shelves one unit apart, cross-aisles at
+                 both ends, depot at the front of zone 0; against picking order by order
+
+    python -m benchmarks.picking --zones 10 40 --shelves 50 --orders 2000 --wave-orders 20 200 1000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from inventory.picking import PickLine, plan_waves
+
+
+def synthetic_lines(zones: int, shelves: int, orders: int, max_lines: int, seed: int = 7) -> list[PickLine]:
+    """Orders of 1..max_lines lines; a tenth of the products are fast movers picked most of the time."""
+    rng = random.Random(seed)
+    slots = [(f"Z{zone:03}", shelf) for zone in range(zones) for shelf in range(1, shelves + 1)]
+    hot = slots[:max(1, len(slots) // 10)]
+    lines = []
+    for order in range(orders):
+        for _ in range(rng.randint(1, max_lines)):
+            location_id = rng.randrange(len(hot)) if rng.random() < 0.6 else rng.randrange(len(slots))
+            zone_name, shelf_number = slots[location_id]
+            lines.append(PickLine(
+                f"SO-{order:06}", location_id, f"SKU-{location_id:06}", rng.randint(1, 5),
+                location_id, zone_name, shelf_number,
+            ))
+    return lines
+
+
+def walk_length(route: list[dict], shelves: int) -> int:
+    """Aisles have a cross-aisle at both ends (shelf 0 and shelves + 1); the shorter one is taken."""
+    position = (0, 0)
+    total = 0
+    for stop in route + [{"zone_name": "Z000", "shelf_number": 0}]:
+        point = (int(stop["zone_name"][1:]), stop["shelf_number"])
+        if point[0] != position[0]:
+            front = position[1] + point[1]
+            back = (shelves + 1 - position[1]) + (shelves + 1 - point[1])
+            total += min(front, back) + abs(point[0] - position[0])
+        else:
+            total += abs(point[1] - position[1])
+        position = point
+    return total
+
+
+def measure(lines: list[PickLine], wave_orders: int, iterations: int, shelves: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        waves = plan_waves(lines, wave_orders)
+        timings.append(time.perf_counter() - started)
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "waves": len(waves),
+        "largest_wave": max(wave["lines"] for wave in waves),
+        "stops": sum(len(wave["route"]) for wave in waves),
+        "walk": sum(walk_length(wave["route"], shelves) for wave in waves),
+    }
+
+
+def main(args):
+    for zones in args.zones:
+        lines = synthetic_lines(zones, args.shelves, args.orders, args.max_lines)
+        # Baseline: one route per order, i.e. waves of a single order
+        single = measure(lines, 1, 1, args.shelves)
+        print(f"layout {zones}x{args.shelves}: {args.orders} orders, {len(lines)} lines, "
+              f"order by order: stops={single['stops']} walk={single['walk']}")
+        for wave_orders in args.wave_orders:
+            result = measure(lines, wave_orders, args.iterations, args.shelves)
+            print(
+                f"  waves of {wave_orders:<5} plan p50={result['p50_ms']:.1f}ms max={result['max_ms']:.1f}ms "
+                f"waves={result['waves']} largest={result['largest_wave']} lines "
+                f"stops={result['stops']} walk={result['walk']} (x{single['walk'] / result['walk']:.1f} shorter)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--shelves", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--max-lines", type=int, default=8, help="lines per order are uniform in 1..N")
+    parser.add_argument("--wave-orders", type=int, nargs="+", default=[20, 200, 1000])
+    parser.add_argument("--iterations", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+"""
+Benchmark scenarios: each one returns a list of request coroutine factories
+that the harness fires at the in-process app with bounded concurrency.
+"""
+import random
+
+from tortoise import Tortoise
+
+from inventory.model import Location, Product, Supplier
+from user.auth import hash_password
+from user.model import User
+
+BENCH_LOGIN = "bench_user"
+BENCH_PASSWORD = "bench-password"
+AUTH = (BENCH_LOGIN, BENCH_PASSWORD)
+
+LOGS_PER_PRODUCT = 5
+
+
+async def seed(catalog_size: int) -> dict:
+    """Resets the benchmark database and loads a synthetic catalog of `catalog_size` products."""
+    conn = Tortoise.get_connection("default")
+    await conn.execute_script(
+        "TRUNCATE warehouse_logs, products, supplier_valuations, suppliers, locations, users RESTART IDENTITY CASCADE"
+    )
+
+    await User.create(login=BENCH_LOGIN, password=await hash_password(BENCH_PASSWORD), is_admin=True)
+    await Supplier.bulk_create([
+        Supplier(name=f"Supplier {i:04}", contact_email=f"s{i}@example.com")
+        for i in range(max(1, catalog_size // 100))
+    ])
+    await Location.bulk_create([
+        Location(zone_name=f"Z{zone:02}", shelf_number=shelf)
+        for zone in range(10) for shelf in range(1, 51)
+    ])
+    supplier_ids = [s.id for s in await Supplier.all().only("id")]
+    location_ids = [l.id for l in await Location.all().only("id")]
+
+    rng = random.Random(catalog_size)
+    await Product.bulk_create([
+        Product(
+            name=f"Product {i:07}", sku=f"SKU-{i:07}",
+            price=rng.randint(100, 100000) / 100, stock_quantity=rng.randint(0, 500),
+            supplier_id=rng.choice(supplier_ids), location_id=rng.choice(location_ids),
+        )
+        for i in range(catalog_size)
+    ], batch_size=5000)
+
+    # A movement history for the report scenario, generated server-side
+    await conn.execute_script(f"""
+        INSERT INTO warehouse_logs (action_type, quantity_change, created_at, user_id, product_id)
+        SELECT 'IN', 1 + (g % 10), now() - (g || ' minutes')::interval, u.id, p.id
+        FROM products p
+        CROSS JOIN generate_series(1, {LOGS_PER_PRODUCT}) g
+        CROSS JOIN (SELECT id FROM users WHERE login = '{BENCH_LOGIN}') u
+    """)
+
+    hot = await Product.filter(sku="SKU-0000000").first()
+    hot.stock_quantity = 1_000_000
+    await hot.save()
+    return {"hot_product_id": hot.id}
+
+
+def adjust_contention(client, context: dict, requests: int):
+    product_id = context["hot_product_id"]
+    actions = ["IN", "OUT"]
+    return [
+        (lambda action=actions[i % 2]: client.post(
+            f"/inventory/products/{product_id}/adjust",
+            params={"amount": 1, "action": action}, auth=AUTH
+        ))
+        for i in range(requests)
+    ]
+
+
+def list_products(client, context: dict, requests: int):
+    return [lambda: client.get("/inventory/products", params={"limit": 100}, auth=AUTH) for _ in range(requests)]
+
+
+def inventory_report(client, context: dict, requests: int):
+    # Full streamed report: the slowest endpoint, so it gets a tenth of the request budget
+    return [
+        lambda: client.get("/inventory/reports/inventory", params={"format": "ndjson"}, auth=AUTH)
+        for _ in range(max(1, requests // 10))
+    ]
+
+
+def valuation_report(client, context: dict, requests: int):
+    return [lambda: client.get("/inventory/reports/valuation", auth=AUTH) for _ in range(requests)]
+
+
+def users_me(client, context: dict, requests: int):
+    return [lambda: client.get("/users/me", auth=AUTH) for _ in range(requests)]
+
+
+SCENARIOS = {
+    "adjust_contention": adjust_contention,
+    "list_products": list_products,
+    "inventory_report": inventory_report,
+    "valuation_report": valuation_report,
+    "users_me": users_me,
+}
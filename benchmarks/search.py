@@ -0,0 +1,118 @@
+"""
+Product search: pg_trgm in SQL vs the in-process n-gram index.
+
+Seeds --catalog-size products named from a small vocabulary, then runs the same
+misspelt queries through both paths of inventory/search.py and prints per-query
+latency and how far their top results agree:
+
+  sql      word_similarity over the trigram GIN indexes (needs pg_trgm on the server)
+  ngram    NGramIndex postings in this process; "load" is the one-off catalog read
+
+    python -m benchmarks.search --catalog-size 10000 100000 --limit 20
+
+The database named by --database is TRUNCATEd and seeded: never point it at real data.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from tortoise import Tortoise
+
+from db import tortoise_config
+from inventory.ddl import apply_schema_extensions
+from inventory.search import NGramIndex, search_products, trigram_search_available
+from settings import Settings, settings
+
+from .scenarios import seed
+
+WORDS = [
+    "steel", "screw", "bolt", "washer", "hammer", "drill", "driver", "pallet", "bracket", "hinge",
+    "cable", "socket", "wrench", "clamp", "anchor", "rivet", "spring", "gasket", "filter", "valve",
+]
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """Drops one letter, the typo the search is meant to forgive."""
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+
+def queries(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [f"{misspell(rng.choice(WORDS), rng)} {rng.choice(WORDS)}" for _ in range(count)]
+
+
+async def rename_catalog() -> None:
+    """Two vocabulary words and a size per product, so queries match many rows with varied scores."""
+    words = ", ".join(f"'{word}'" for word in WORDS)
+    await Tortoise.get_connection("default").execute_script(f"""
+        UPDATE products SET name = initcap(
+            (ARRAY[{words}])[1 + id % {len(WORDS)}] || ' '
+            || (ARRAY[{words}])[1 + (id / {len(WORDS)}) % {len(WORDS)}] || ' M' || (id % 97)
+        );
+        ANALYZE products;
+    """)
+
+
+async def measure(run, texts: list[str], limit: int) -> tuple[dict, list[list[int]]]:
+    await run(texts[0], limit)  # warm-up
+    latencies = []
+    top = []
+    for text in texts:
+        started = time.perf_counter()
+        ranked = await run(text, limit)
+        latencies.append(time.perf_counter() - started)
+        top.append([product_id for product_id, _ in ranked])
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+    }, top
+
+
+async def main(args):
+    config = Settings(db_name=args.database, db_pool_min_size=1, db_pool_max_size=4)
+    await Tortoise.init(config=tortoise_config(config))
+    try:
+        await Tortoise.generate_schemas()
+        await apply_schema_extensions()
+        texts = queries(args.queries)
+        sql_available = await trigram_search_available()
+        if not sql_available:
+            print("pg_trgm is not installed on this server: only the in-process path is measured")
+
+        for catalog_size in args.catalog_size:
+            await seed(catalog_size)
+            await rename_catalog()
+
+            index = NGramIndex()
+            started = time.perf_counter()
+            await index.ensure_loaded()
+            load_ms = (time.perf_counter() - started) * 1000
+
+            async def ngram(text: str, limit: int):
+                return index.search(text, settings.search_similarity_threshold, limit)
+
+            result, ngram_top = await measure(ngram, texts, args.limit)
+            print(f"catalog={catalog_size:<7} ngram  p50={result['p50_ms']:.2f}ms "
+                  f"p99={result['p99_ms']:.2f}ms load={load_ms:.0f}ms")
+
+            if sql_available:
+                result, sql_top = await measure(search_products, texts, args.limit)
+                # Scores are computed the same way, so the first hit should mostly agree
+                agreement = sum(a[:1] == b[:1] for a, b in zip(sql_top, ngram_top)) / len(texts)
+                print(f"catalog={catalog_size:<7} sql    p50={result['p50_ms']:.2f}ms "
+                      f"p99={result['p99_ms']:.2f}ms top hit agrees on {agreement:.0%} of queries")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="warehouse_bench", help="scratch database (will be truncated)")
+    parser.add_argument("--catalog-size", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+ORM vs projection serialisation of product list pages.
+
+Both paths produce the same JSON bytes for GET /inventory/products; this compares
+per-page latency and peak Python memory allocated (tracemalloc) by:
+
+  orm         Tortoise Product + Supplier + Location objects -> ProductResponse -> JSON
+  projection  joined records -> dicts -> pydantic_core.to_json (inventory/projections.py)
+
+    python -m benchmarks.serialization --catalog-size 20000 --page-size 100 1000
+
+The database named by --database is TRUNCATEd and seeded: never point it at real data.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from pydantic import TypeAdapter
+from tortoise import Tortoise
+
+from db import tortoise_config
+from inventory.ddl import apply_schema_extensions
+from inventory.model import Product
+from inventory.projections import encode_product_rows, fetch_product_page
+from inventory.schemas import ProductResponse
+from settings import Settings
+
+from .scenarios import seed
+
+PRODUCT_LIST = TypeAdapter(list[ProductResponse])
+
+
+async def orm_page(limit: int) -> bytes:
+    rows = await Product.all().select_related("supplier", "location").order_by("id").limit(limit)
+    return PRODUCT_LIST.dump_json(PRODUCT_LIST.validate_python(rows, from_attributes=True))
+
+
+async def projection_page(limit: int) -> bytes:
+    return encode_product_rows(await fetch_product_page(limit))
+
+
+async def measure(render, limit: int, iterations: int) -> dict:
+    await render(limit)  # warm-up: prepared statements, adapters
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await render(limit)
+        latencies.append(time.perf_counter() - started)
+
+    # Memory is traced on a separate run: tracemalloc itself slows the code down
+    tracemalloc.start()
+    await render(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+async def main(args):
+    config = Settings(db_name=args.database, db_pool_min_size=1, db_pool_max_size=4)
+    await Tortoise.init(config=tortoise_config(config))
+    try:
+        await Tortoise.generate_schemas()
+        await apply_schema_extensions()
+        await seed(args.catalog_size)
+
+        for limit in args.page_size:
+            assert await orm_page(limit) == await projection_page(limit), "paths disagree"
+            results = {
+                "orm": await measure(orm_page, limit, args.iterations),
+                "projection": await measure(projection_page, limit, args.iterations),
+            }
+            for name, result in results.items():
+                print(
+                    f"page={limit:<6} {name:<11} p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                    f"peak allocated={result['peak_kib']:.0f}KiB"
+                )
+            speedup = results["orm"]["p50_ms"] / results["projection"]["p50_ms"]
+            memory = results["orm"]["peak_kib"] / results["projection"]["peak_kib"]
+            print(f"page={limit:<6} projection is x{speedup:.1f} faster with x{memory:.1f} lower peak memory")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="warehouse_bench", help="scratch database (will be truncated)")
+    parser.add_argument("--catalog-size", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--iterations", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
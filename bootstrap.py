@@ -0,0 +1,102 @@
+"""
+One-time startup work: database schema setup and the default admin account.
+
+WMS_STARTUP_TASKS selects who does it:
+
+  lock  (default) every worker runs it at start, one at a time under a PostgreSQL
+        advisory lock. The first one applies the schema; the others find it current and
+        only top up log partitions and check the admin account.
+  skip  workers do nothing. Run the step once per deploy, before starting them:
+
+    python -m bootstrap
+
+The applied schema is recorded by fingerprint in schema_setup. The fingerprint covers the
+ORM's CREATE statements plus inventory/ddl.py's extensions, so restarts skip schema setup
+until the code changes it.
+"""
+import asyncio
+import hashlib
+
+from tortoise import Tortoise
+from tortoise.utils import get_schema_sql
+
+import db
+from inventory.ddl import SCHEMA_EXTENSIONS, apply_schema_extensions
+from inventory.partitions import ensure_log_partitions
+from settings import Settings, settings
+from user.auth import hash_password
+from user.model import User
+
+# Any constant works, as long as every WMS process uses the same one
+ADVISORY_LOCK_KEY = 0x574D53
+
+SCHEMA_SETUP_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_setup (
+        fingerprint TEXT PRIMARY KEY,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def schema_fingerprint() -> str:
+    source = get_schema_sql(Tortoise.get_connection("default"), safe=True) + "\n".join(SCHEMA_EXTENSIONS)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+async def setup_schema(conn, config: Settings = settings) -> bool:
+    """Creates tables and database objects unless this schema is already recorded; True if it ran."""
+    await conn.execute(SCHEMA_SETUP_SQL)
+    fingerprint = schema_fingerprint()
+    if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM schema_setup WHERE fingerprint = $1)", fingerprint):
+        # Log partitions roll with the calendar, not with the code
+        await ensure_log_partitions(config.log_partitions_ahead)
+        return False
+    await Tortoise.generate_schemas(safe=True)
+    await apply_schema_extensions()
+    await conn.execute("INSERT INTO schema_setup (fingerprint) VALUES ($1) ON CONFLICT DO NOTHING", fingerprint)
+    return True
+
+
+async def seed_default_admin():
+    admin_exists = await User.filter(login="admin").exists()
+    if not admin_exists:
+        hashed_password = await hash_password("admin123")
+        await User.create(
+            login="admin",
+            password=hashed_password,
+            is_admin=True
+        )
+        print("Default admin account initialized.")
+    else:
+        print("Admin account verification complete.")
+
+
+async def run_startup_tasks(config: Settings = settings, force: bool = False) -> str:
+    """
+    Schema setup and admin seeding for one process; returns "applied", "current" or "skipped".
+    Needs two pool connections: the lock is held on one while setup uses the pool.
+    """
+    if config.startup_tasks == "skip" and not force:
+        return "skipped"
+    async with db.acquire() as conn:
+        # Waits while another worker is setting up; session level, so released on disconnect too
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        try:
+            status = "applied" if await setup_schema(conn, config) else "current"
+            await seed_default_admin()
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+    return status
+
+
+async def main():
+    await Tortoise.init(config=db.tortoise_config())
+    try:
+        status = await run_startup_tasks(force=True)
+    finally:
+        await Tortoise.close_connections()
+    print(f"Schema {status}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
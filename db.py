@@ -1,46 +1,168 @@
-import asyncpg
-import bcrypt
+import asyncio
+import time
+from typing import Optional
 
-# Private global variable to store the active database connection
-_connection = None
+from tortoise import Tortoise
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
 
-# Database connection details
-DB_CONFIG = {
-    "user": "baltazar",
-    "password": "admin",
-    "database": "myproject",
-    "host": "127.0.0.1"
-}
+from metrics import Gauge, instrument_connection, registry
+from settings import Settings, settings
 
-async def connect():
+MODULES = {"models": ["user.model", "inventory.model"]}
+
+
+class InstrumentedPool:
     """
-    Initializes the database connection using the singleton pattern.
-    Stores the connection in the global _connection variable.
+    Thin wrapper around asyncpg.Pool that applies the acquire timeout and tracks
+    waiters and acquire latency. Everything else is delegated to the real pool.
     """
-    global _connection
-    if _connection is None or _connection.is_closed():
-        _connection = await asyncpg.connect(**DB_CONFIG)
-        print("Database: Connected successfully.")
 
-async def disconnect():
+    def __init__(self, pool, acquire_timeout: Optional[float]):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.waiters = 0
+        self.acquired_total = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+        self.timeouts_total = 0
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout: Optional[float] = None):
+        return _AcquireContext(self, timeout if timeout is not None else self.acquire_timeout)
+
+    async def _acquire(self, timeout: Optional[float]):
+        self.waiters += 1
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts_total += 1
+            raise
+        finally:
+            self.waiters -= 1
+        elapsed = time.perf_counter() - started
+        self.acquired_total += 1
+        self.acquire_seconds_total += elapsed
+        self.acquire_seconds_max = max(self.acquire_seconds_max, elapsed)
+        return connection
+
+    async def release(self, connection, *, timeout: Optional[float] = None):
+        await self._pool.release(connection, timeout=timeout)
+
+    def stats(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self.waiters,
+            "acquired_total": self.acquired_total,
+            "acquire_timeouts_total": self.timeouts_total,
+            "acquire_seconds_avg": self.acquire_seconds_total / self.acquired_total if self.acquired_total else 0.0,
+            "acquire_seconds_max": self.acquire_seconds_max,
+        }
+
+
+class _AcquireContext:
+    """Supports both `await pool.acquire()` (Tortoise) and `async with pool.acquire()`."""
+
+    __slots__ = ("pool", "timeout", "connection")
+
+    def __init__(self, pool: InstrumentedPool, timeout: Optional[float]):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    def __await__(self):
+        return self.pool._acquire(self.timeout).__await__()
+
+    async def __aenter__(self):
+        self.connection = await self.pool._acquire(self.timeout)
+        return self.connection
+
+    async def __aexit__(self, *exc):
+        await self.pool.release(self.connection)
+
+
+class InstrumentedAsyncpgClient(AsyncpgDBClient):
+    """Tortoise asyncpg client whose pool is an InstrumentedPool."""
+
+    async def create_pool(self, **kwargs):
+        acquire_timeout = kwargs.pop("acquire_timeout", None)
+        # Every pooled connection reports query timings to the metrics module
+        kwargs.setdefault("init", instrument_connection)
+        return InstrumentedPool(await super().create_pool(**kwargs), acquire_timeout)
+
+
+# Lets Tortoise load this module as a database engine ("engine": "db")
+client_class = InstrumentedAsyncpgClient
+
+
+def tortoise_config(config: Settings = settings) -> dict:
     """
-    Closes the database connection if it exists and resets the global variable.
+    Tortoise configuration for the single shared pool of this worker.
+    The ORM and every raw asyncpg path (cursors, COPY, ...) draw from this pool.
     """
-    global _connection
-    if _connection:
-        await _connection.close()
-        _connection = None
-        print("Database: Connection closed.")
+    return {
+        "connections": {
+            "default": {
+                "engine": "db",
+                "credentials": {
+                    "host": config.db_host,
+                    "port": config.db_port,
+                    "user": config.db_user,
+                    "password": config.db_password,
+                    "database": config.db_name,
+                    "minsize": config.worker_pool_min_size,
+                    "maxsize": config.worker_pool_max_size,
+                    "statement_cache_size": config.db_statement_cache_size,
+                    "max_inactive_connection_lifetime": config.db_pool_idle_timeout,
+                    "acquire_timeout": config.db_acquire_timeout,
+                },
+            }
+        },
+        "apps": {"models": {"models": MODULES["models"], "default_connection": "default"}},
+    }
 
-async def get_connection():
+
+def get_pool():
+    """Returns the pool behind the default Tortoise connection (None before first use)."""
+    return Tortoise.get_connection("default")._pool
+
+
+def acquire():
     """
-    Returns the active connection object.
-    Raises an exception if the connection has not been initialized.
+    Acquires a raw asyncpg connection from the shared pool:
+        async with db.acquire() as conn: ...
     """
-    if _connection is None or _connection.is_closed():
-        raise Exception("Database connection not initialized! Call connect() first.")
-    return _connection
+    return Tortoise.get_connection("default").acquire_connection()
+
+
+def pool_stats() -> dict:
+    """Live pool statistics: sizes, in-use and idle connections, waiters, acquire latency."""
+    pool = get_pool()
+    if pool is None:
+        return {"size": 0, "in_use": 0, "idle": 0, "waiters": 0}
+    if isinstance(pool, InstrumentedPool):
+        return pool.stats()
+    size, idle = pool.get_size(), pool.get_idle_size()
+    return {"size": size, "in_use": size - idle, "idle": idle}
+
+
+def _pool_gauge_values() -> dict:
+    stats = pool_stats()
+    return {(state,): stats.get(state, 0) for state in ("in_use", "idle", "waiters")}
 
 
-if __name__ == "__main__":
-   pass 
+registry.register(Gauge(
+    "db_pool_connections", "Connections of the shared pool by state", ("state",), collect=_pool_gauge_values
+))
+registry.register(Gauge(
+    "db_pool_acquire_seconds_max", "Slowest pool acquire observed",
+    collect=lambda: {(): pool_stats().get("acquire_seconds_max", 0.0)}
+))
@@ -0,0 +1,254 @@
+"""
+Bulk product import: streamed CSV/NDJSON -> Pydantic validation in chunks ->
+COPY into a temporary staging table -> one upsert into products keyed on SKU.
+
+    python -m inventory.bulk catalog.csv
+    python -m inventory.bulk catalog.ndjson --format ndjson
+
+CSV input needs a header row and one record per line. Rows reference suppliers by
+supplier_id or supplier_name and locations by location_id or zone_name + shelf_number.
+Invalid rows are reported with their line number and skipped; every other row is
+loaded. Existing SKUs get their catalog data (name, price, supplier, location)
+updated; their stock is left alone because stock only changes through logged
+adjustments.
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Optional
+
+import asyncpg
+from pydantic import ValidationError
+from tortoise import Tortoise
+
+import db
+from .model import Location, Supplier
+from .schemas import ProductCreate, ProductImportRow
+from .sku_index import sku_index
+
+IMPORT_CHUNK_SIZE = 2000
+# Error details kept in the summary; the total count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+STAGING_COLUMNS = ("sku", "name", "price", "stock_quantity", "supplier_id", "location_id", "reorder_level")
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS product_import_staging (
+        sku VARCHAR(50) NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        price NUMERIC(10, 2) NOT NULL,
+        stock_quantity INT NOT NULL,
+        supplier_id INT,
+        location_id INT,
+        reorder_level INT
+    ) ON COMMIT DELETE ROWS
+"""
+
+MERGE_SQL = """
+    INSERT INTO products (sku, name, price, stock_quantity, supplier_id, location_id, reorder_level)
+    SELECT sku, name, price, stock_quantity, supplier_id, location_id, reorder_level
+    FROM product_import_staging
+    ON CONFLICT (sku) DO UPDATE
+    SET name = EXCLUDED.name,
+        price = EXCLUDED.price,
+        supplier_id = EXCLUDED.supplier_id,
+        location_id = EXCLUDED.location_id,
+        reorder_level = COALESCE(EXCLUDED.reorder_level, products.reorder_level)
+    RETURNING (xmax = 0) AS inserted, id, sku
+"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Splits a stream of byte chunks into decoded text lines without buffering the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[tuple[int, object]]:
+    """Yields (line number, parsed row) pairs; unparsable lines yield the exception instead."""
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Empty CSV cells mean "not provided"
+        yield line_no, {column: value for column, value in zip(header, values) if value != ""}
+
+
+class ReferenceMaps:
+    """Supplier and location lookups loaded once per import instead of per row."""
+
+    def __init__(self, suppliers: list, locations: list):
+        self.supplier_ids = {s.id for s in suppliers}
+        self.supplier_by_name = {s.name: s.id for s in suppliers}
+        self.location_ids = {l.id for l in locations}
+        self.location_by_slot = {(l.zone_name, l.shelf_number): l.id for l in locations}
+
+    @classmethod
+    async def load(cls) -> "ReferenceMaps":
+        return cls(await Supplier.all(), await Location.all())
+
+    def resolve(self, row: dict) -> dict:
+        """Turns name-based references into ids; raises ValueError for unknown ones."""
+        row = dict(row)
+        supplier_name = row.pop("supplier_name", None)
+        if supplier_name is not None and row.get("supplier_id") is None:
+            if supplier_name not in self.supplier_by_name:
+                raise ValueError(f"Unknown supplier '{supplier_name}'")
+            row["supplier_id"] = self.supplier_by_name[supplier_name]
+
+        zone_name, shelf_number = row.pop("zone_name", None), row.pop("shelf_number", None)
+        if zone_name is not None and row.get("location_id") is None:
+            slot = (zone_name, int(shelf_number) if shelf_number is not None else None)
+            if slot not in self.location_by_slot:
+                raise ValueError(f"Unknown location {zone_name}/{shelf_number}")
+            row["location_id"] = self.location_by_slot[slot]
+        return row
+
+    def check(self, product: ProductCreate) -> None:
+        if product.supplier_id is not None and product.supplier_id not in self.supplier_ids:
+            raise ValueError("Supplier not found")
+        if product.location_id is not None and product.location_id not in self.location_ids:
+            raise ValueError("Location not found")
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+async def _load_chunk(rows: list[tuple]) -> tuple[int, int]:
+    """COPYs one validated chunk into staging and merges it; returns (inserted, updated)."""
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(STAGING_TABLE_SQL)
+            await conn.copy_records_to_table("product_import_staging", records=rows, columns=STAGING_COLUMNS)
+            merged = await conn.fetch(MERGE_SQL)
+    sku_index.update((row["sku"], row["id"]) for row in merged)
+    inserted = sum(1 for row in merged if row["inserted"])
+    return inserted, len(merged) - inserted
+
+
+async def import_products(records: AsyncIterator[tuple[int, object]], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Validates and loads products chunk by chunk.
+    Returns a summary with per-row errors; valid rows are loaded even when others fail.
+    """
+    refs = await ReferenceMaps.load()
+    summary = {"received": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    seen_skus: dict[str, int] = {}
+    chunk: list[tuple] = []
+    chunk_lines: list[int] = []
+
+    def fail(line_no: int, message: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_no, "error": message})
+
+    async def flush():
+        try:
+            inserted, updated = await _load_chunk(chunk)
+        except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError):
+            # Something validation could not foresee (e.g. a supplier deleted mid-import):
+            # load the chunk row by row so only the offending rows fail
+            inserted = updated = 0
+            for line_no, row in zip(chunk_lines, chunk):
+                try:
+                    row_inserted, row_updated = await _load_chunk([row])
+                except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+                    fail(line_no, str(e))
+                    continue
+                inserted += row_inserted
+                updated += row_updated
+        summary["inserted"] += inserted
+        summary["updated"] += updated
+        chunk.clear()
+        chunk_lines.clear()
+
+    async for line_no, row in records:
+        summary["received"] += 1
+        if isinstance(row, Exception):
+            fail(line_no, _error_message(row))
+            continue
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Each record must be an object")
+            product = ProductImportRow.model_validate(refs.resolve(row))
+            refs.check(product)
+        except (ValidationError, ValueError) as e:
+            fail(line_no, _error_message(e))
+            continue
+
+        # The upsert cannot touch the same SKU twice in one statement; the first occurrence wins
+        if product.sku in seen_skus:
+            fail(line_no, f"Duplicate SKU '{product.sku}' (first seen on line {seen_skus[product.sku]})")
+            continue
+        seen_skus[product.sku] = line_no
+
+        chunk.append((
+            product.sku, product.name, product.price, product.stock_quantity,
+            product.supplier_id, product.location_id, product.reorder_level,
+        ))
+        chunk_lines.append(line_no)
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    if chunk:
+        await flush()
+    return summary
+
+
+async def _file_chunks(path: str, size: int = 1 << 16):
+    with open(path, "rb") as handle:
+        while chunk := handle.read(size):
+            yield chunk
+
+
+async def main(path: str, fmt: str):
+    await Tortoise.init(config=db.tortoise_config())
+    try:
+        summary = await import_products(iter_records(iter_lines(_file_chunks(path)), fmt))
+    finally:
+        await Tortoise.close_connections()
+
+    for error in summary["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    print(
+        f"received={summary['received']} inserted={summary['inserted']} "
+        f"updated={summary['updated']} failed={summary['failed']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="default: from file extension")
+    args = parser.parse_args()
+    fmt: Optional[str] = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    asyncio.run(main(args.path, fmt))
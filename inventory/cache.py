@@ -0,0 +1,92 @@
+import hashlib
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from pagination import NEXT_CURSOR_HEADER
+
+
+class CachedPayload:
+    __slots__ = ("body", "etag", "headers", "expires_at")
+
+    def __init__(self, body: bytes, headers: dict, ttl: float):
+        self.body = body
+        # Content-based, so workers with different cache fills never hand out a wrong 304
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.headers = {**headers, "ETag": self.etag}
+        self.expires_at = time.monotonic() + ttl
+
+
+class ReferenceCache:
+    """
+    In-process cache of serialised list responses for rarely changing reference data.
+    Mutations call bump(); the version counter also discards fills that raced with one.
+    The TTL bounds how long other workers may serve data changed elsewhere.
+    """
+
+    def __init__(self, name: str, ttl: float = 30.0, maxsize: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.version = 0
+        self._entries: dict[str, CachedPayload] = {}
+
+    def get(self, key: str) -> Optional[CachedPayload]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def put(self, key: str, entry: CachedPayload, version: int) -> None:
+        if version != self.version:
+            return
+        if len(self._entries) >= self.maxsize:
+            self._entries.clear()
+        self._entries[key] = entry
+
+    def bump(self) -> None:
+        self.version += 1
+        self._entries.clear()
+
+
+supplier_cache = ReferenceCache("suppliers")
+location_cache = ReferenceCache("locations")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+async def cached_list_response(
+    cache: ReferenceCache,
+    request: Request,
+    adapter: TypeAdapter,
+    load: Callable[[Response], Awaitable[list]],
+) -> Response:
+    """
+    Serves a list endpoint from the cache, answering 304 when the client's ETag still matches.
+    On a miss, load() queries the page (setting pagination headers on the given response).
+    """
+    key = str(sorted(request.query_params.multi_items()))
+    entry = cache.get(key)
+    if entry is None:
+        version = cache.version
+        page_response = Response()
+        rows = await load(page_response)
+        body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+        headers = {}
+        if NEXT_CURSOR_HEADER in page_response.headers:
+            headers[NEXT_CURSOR_HEADER] = page_response.headers[NEXT_CURSOR_HEADER]
+        entry = CachedPayload(body, headers, cache.ttl)
+        cache.put(key, entry, version)
+
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=entry.headers)
+    return Response(content=entry.body, media_type="application/json", headers=entry.headers)
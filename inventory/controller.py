@@ -1,27 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from pydantic import TypeAdapter
 
 from .model import Product, Supplier, Location, WarehouseLog
 from .schemas import (
-    ProductCreate, ProductUpdate, ProductResponse,
+    ProductCreate, ProductUpdate, ProductResponse, ProductSearchResult,
     SupplierCreate, SupplierResponse,
     LocationCreate, LocationResponse,
-    WarehouseLogResponse
+    WarehouseLogResponse,
+    ActionType, StockAdjustmentBatch, StockAdjustmentBatchResponse,
+    ProductBulkUpdate, ProductBulkUpdateResponse,
+    ReservationCreate, ReservationResponse, LowStockAlertResponse,
+    PickWaveRequest, PickWavePlan
 )
 
+from pagination import NEXT_CURSOR_HEADER, PageParams, decode_cursor, encode_cursor, paginate
+
 # Importy z modułu user (tylko to, co dotyczy użytkownika i sesji)
 from user.model import User
 from user.auth import get_admin_user, get_current_user
 
-from .service import WarehouseService
+from .service import WarehouseService, BatchAdjustmentError, BulkUpdateError
+from .streaming import MEDIA_TYPES, StreamFormat, encode_rows
+from .cache import cached_list_response, location_cache, supplier_cache
+from .bulk import import_products, iter_lines, iter_records
+from .export import export_logs, export_products
+from .snapshots import take_stock_snapshot
+from .sku_index import sku_index
+from .search import MAX_SEARCH_RESULTS, ngram_index, search_products
+from .projections import encode_product_rows, fetch_product_page
+from .events import change_feed, feed_supported, sse_events
+from .picking import plan_pick_waves
+from .reservations import (
+    ReservationForbidden, commit_reservation, get_reservation, release_reservation, reserve_stock,
+)
+from settings import settings
 from datetime import datetime
-from enum import Enum
 
 router = APIRouter()
 
-class ActionType(str, Enum):
-    IN = "IN"
-    OUT = "OUT"
+REPORT_FIELDS = ["date", "user", "product", "change", "type"]
+STOCK_AS_OF_FIELDS = ["product_id", "sku", "name", "stock_quantity", "snapshot_at"]
+SUPPLIER_LIST = TypeAdapter(list[SupplierResponse])
+LOCATION_LIST = TypeAdapter(list[LocationResponse])
 
 # ----------------------------------------------------------------------------------
 #                                 OPERATIONS
@@ -47,12 +69,126 @@ async def adjust_product_stock(
         )
         return {
             "message": "Stock updated successfully", 
-            "new_quantity": updated_product.stock_quantity
+            "new_quantity": updated_product["stock_quantity"]
         }
     except Exception as e:
         # Return error details if stock adjustment fails
         raise HTTPException(status_code=400, detail=str(e))
 
+# Same adjustment addressed by a scanned SKU / barcode
+@router.post("/products/by-sku/{sku}/adjust", tags=["Inventory: Operations"])
+async def adjust_product_stock_by_sku(
+    sku: str,
+    amount: int,
+    action: ActionType,
+    current_user: User = Depends(get_current_user)):
+    """
+    Update stock levels for the product with this SKU.
+    The SKU is resolved through the in-process SKU index, not a catalog query.
+    """
+    try:
+        updated_product = await WarehouseService.adjust_stock_by_sku(
+            sku=sku, user=current_user, amount=amount, action=action.value
+        )
+        return {
+            "message": "Stock updated successfully",
+            "product_id": updated_product["id"],
+            "new_quantity": updated_product["stock_quantity"]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Apply a multi-line receipt or shipment in one transaction
+@router.post("/products/adjust-batch", response_model=StockAdjustmentBatchResponse, tags=["Inventory: Operations"])
+async def adjust_stock_batch(
+    batch: StockAdjustmentBatch,
+    current_user: User = Depends(get_current_user)):
+    """
+    Apply many stock adjustments (by product id or SKU) in a single transaction.
+    With atomic=true any failing line rejects the whole batch (409 with per-line results);
+    with atomic=false valid lines are applied and failures are reported per line.
+    """
+    try:
+        results = await WarehouseService.adjust_stock_batch(batch.lines, user=current_user, atomic=batch.atomic)
+    except BatchAdjustmentError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "results": e.results})
+
+    applied = sum(1 for result in results if result["success"])
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
+# Hold stock for an order until it is shipped, released or expires
+@router.post("/reservations", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED,
+             tags=["Inventory: Operations"])
+async def create_reservation(
+    data: ReservationCreate,
+    current_user: User = Depends(get_current_user)):
+    """
+    Reserve units of a product. Fails with 400 when fewer units are available
+    (stock minus active reservations) than requested.
+    """
+    ttl = data.ttl_seconds or settings.reservation_ttl
+    if ttl > settings.reservation_max_ttl:
+        raise HTTPException(status_code=400, detail=f"ttl_seconds may not exceed {settings.reservation_max_ttl}")
+    try:
+        return await reserve_stock(data.product_id, data.quantity, current_user.id, ttl, data.reference)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/reservations/{reservation_id}", response_model=ReservationResponse, tags=["Inventory: Operations"])
+async def read_reservation(reservation_id: int, current_user: User = Depends(get_current_user)):
+    reservation = await get_reservation(reservation_id)
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+# Ship the reserved units: stock goes down and an OUT log entry is written
+# Commit and release are open to the user who reserved and to admins
+@router.post("/reservations/{reservation_id}/commit", tags=["Inventory: Operations"])
+async def commit_stock_reservation(reservation_id: int, current_user: User = Depends(get_current_user)):
+    owner_id = None if current_user.is_admin else current_user.id
+    try:
+        committed = await commit_reservation(reservation_id, current_user.id, owner_id)
+    except ReservationForbidden as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": "Reservation committed",
+        "product_id": committed["product_id"],
+        "new_quantity": committed["stock_quantity"]
+    }
+
+@router.post("/reservations/{reservation_id}/release", tags=["Inventory: Operations"])
+async def release_stock_reservation(reservation_id: int, current_user: User = Depends(get_current_user)):
+    owner_id = None if current_user.is_admin else current_user.id
+    try:
+        released = await release_reservation(reservation_id, owner_id)
+    except ReservationForbidden as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Reservation released", "product_id": released["product_id"]}
+
+@router.get("/products/{product_id}/availability", tags=["Inventory: Operations"])
+async def read_product_availability(product_id: int, current_user: User = Depends(get_current_user)):
+    row = await Product.filter(id=product_id).values("stock_quantity", "reserved_quantity")
+    if not row:
+        raise HTTPException(status_code=404, detail="Product not found")
+    stock, reserved = row[0]["stock_quantity"], row[0]["reserved_quantity"]
+    return {"product_id": product_id, "stock_quantity": stock, "reserved_quantity": reserved, "available": stock - reserved}
+
+# Batch orders into pick waves with one walking route each
+@router.post("/picking/waves", response_model=PickWavePlan, tags=["Inventory: Operations"])
+async def plan_picking_waves(
+    request: PickWaveRequest,
+    current_user: User = Depends(get_current_user)):
+    """
+    Group order lines into waves. Each wave lists its stops in walking order: zones by
+    name, shelves serpentine, one stop per location with quantities summed over orders.
+    Lines for unknown or unlocated products are reported under "unplanned".
+    """
+    return await plan_pick_waves(request.lines, request.max_orders_per_wave, request.max_lines_per_wave)
+
 # ----------------------------------------------------------------------------------
 #                                  REPORTS
 # ----------------------------------------------------------------------------------
@@ -60,20 +196,36 @@ async def adjust_product_stock(
 # -- ADMIN --
 # Generate comprehensive inventory report using DB cursors
 @router.get("/reports/inventory", tags=["Inventory: Reports"])
-async def get_full_report(admin: User = Depends(get_admin_user)):
-    report = []
-    
-    # Use iterator to go over the record 
-    async for entry in WarehouseService.get_inventory_report():
-        report.append({
-            "date": entry["created_at"],
-            "user": entry["user_login"],
-            "product": entry["product_name"],
-            "change": entry["quantity_change"],
-            "type": entry["action_type"]
-        })
-    
-    return report
+async def get_full_report(
+    format: StreamFormat = StreamFormat.JSON,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    prefetch: int = Query(500, ge=1, le=10000),
+    admin: User = Depends(get_admin_user)):
+    """
+    Streams the warehouse log as a JSON array, NDJSON or CSV while the cursor is read.
+    Filters are applied in SQL; `prefetch` sets how many rows each cursor fetch returns.
+    """
+    async def report_rows():
+        # Use iterator to go over the record 
+        async for entry in WarehouseService.get_inventory_report(
+            date_from=date_from, date_to=date_to,
+            product_id=product_id, user_id=user_id, prefetch=prefetch
+        ):
+            yield {
+                "date": entry["created_at"],
+                "user": entry["user_login"],
+                "product": entry["product_name"],
+                "change": entry["quantity_change"],
+                "type": entry["action_type"]
+            }
+
+    return StreamingResponse(
+        encode_rows(report_rows(), format, REPORT_FIELDS, chunk_rows=prefetch),
+        media_type=MEDIA_TYPES[format.value]
+    )
 
 # Generate financial stock valuation grouped by supplier via raw SQL
 @router.get("/reports/valuation", tags=["Inventory: Reports"])
@@ -100,6 +252,102 @@ async def get_valuation_report(admin: User = Depends(get_admin_user)):
             detail=f"Error generating valuation report: {str(e)}"
         )
 
+# Stock of one product or the whole warehouse at a past moment
+@router.get("/reports/stock-as-of", tags=["Inventory: Reports"])
+async def get_stock_as_of(
+    at: datetime,
+    product_id: Optional[int] = None,
+    sku: Optional[str] = None,
+    format: StreamFormat = StreamFormat.JSON,
+    admin: User = Depends(get_admin_user)):
+    """
+    Answers "what was the stock at `at`?" from the nearest stock snapshot and the
+    logged changes between the two, so the cost is bounded by the snapshot interval.
+    """
+    if product_id is not None or sku is not None:
+        rows = [dict(r) async for r in WarehouseService.get_stock_as_of(at, product_id=product_id, sku=sku)]
+        if not rows:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return rows[0]
+
+    async def stock_rows():
+        async for record in WarehouseService.get_stock_as_of(at):
+            yield dict(record)
+
+    return StreamingResponse(
+        encode_rows(stock_rows(), format, STOCK_AS_OF_FIELDS),
+        media_type=MEDIA_TYPES[format.value]
+    )
+
+# Record the current stock of every product now instead of waiting for the scheduler
+@router.post("/reports/stock-snapshots", status_code=status.HTTP_201_CREATED, tags=["Inventory: Reports"])
+async def create_stock_snapshot(admin: User = Depends(get_admin_user)):
+    return await take_stock_snapshot()
+
+# ----------------------------------------------------------------------------------
+#                                  ALERTS
+# ----------------------------------------------------------------------------------
+
+# -- USER --
+# Products to reorder, without downloading the catalog
+@router.get("/alerts/low-stock", response_model=list[LowStockAlertResponse], tags=["Inventory: Alerts"])
+async def get_low_stock_alerts(current_user: User = Depends(get_current_user)):
+    """
+    Products whose stock is at or below their reorder_level.
+    Alerts are raised and cleared as stock changes, so this only reads the current alerts.
+    """
+    return await WarehouseService.get_low_stock_alerts()
+
+# ----------------------------------------------------------------------------------
+#                                  LIVE FEED
+# ----------------------------------------------------------------------------------
+
+# -- USER --
+# Live stock levels for dashboards and floor displays, instead of polling the product list
+@router.get("/stream", tags=["Inventory: Live Feed"])
+async def stream_product_changes(current_user: User = Depends(get_current_user)):
+    """
+    Server-Sent Events: a "product" event (op, id, sku, name, stock_quantity,
+    reserved_quantity) for every committed product change, and a "resync" event when
+    the client fell behind or the feed reconnected and it should reload its data.
+    """
+    if not feed_supported():
+        raise HTTPException(status_code=503, detail="The live feed needs PostgreSQL LISTEN/NOTIFY")
+    return StreamingResponse(
+        sse_events(change_feed, settings.stream_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ----------------------------------------------------------------------------------
+#                                  EXPORTS
+# ----------------------------------------------------------------------------------
+
+def _download(chunks, filename: str, gzip: bool) -> StreamingResponse:
+    if gzip:
+        filename += ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# -- ADMIN --
+# Full catalog (joined with supplier and location) streamed straight from COPY TO STDOUT
+@router.get("/exports/products.csv", tags=["Inventory: Exports"])
+async def export_product_catalog(gzip: bool = False, admin: User = Depends(get_admin_user)):
+    return _download(export_products(compress=gzip), "products.csv", gzip)
+
+# Warehouse log for a time range [date_from, date_to), e.g. the previous day for the ERP
+@router.get("/exports/logs.csv", tags=["Inventory: Exports"])
+async def export_warehouse_logs(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    gzip: bool = False,
+    admin: User = Depends(get_admin_user)
+):
+    return _download(export_logs(date_from, date_to, compress=gzip), "warehouse_logs.csv", gzip)
+
 # ----------------------------------------------------------------------------------
 #                                 SUPPLIERS
 # ----------------------------------------------------------------------------------
@@ -108,13 +356,28 @@ async def get_valuation_report(admin: User = Depends(get_admin_user)):
 @router.post("/suppliers", response_model=SupplierResponse, status_code=201, tags=["Inventory: Suppliers"])
 async def create_supplier(data: SupplierCreate, admin: User = Depends(get_admin_user)):
     """Add a new supplier to the system."""
-    return await Supplier.create(**data.model_dump())
+    supplier = await Supplier.create(**data.model_dump())
+    supplier_cache.bump()
+    return supplier
 
 # -- USER --
 @router.get("/suppliers", response_model=list[SupplierResponse], tags=["Inventory: Suppliers"])
-async def list_suppliers(current_user: User = Depends(get_current_user)):
-    """List all suppliers (Available to all logged-in users)."""
-    return await Supplier.all()
+async def list_suppliers(
+    request: Request,
+    name_prefix: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: User = Depends(get_current_user)):
+    """
+    List suppliers page by page (Available to all logged-in users).
+    Served from the reference cache; clients sending If-None-Match get 304 without a DB query.
+    """
+    async def load(response: Response):
+        query = Supplier.all()
+        if name_prefix:
+            query = query.filter(name__startswith=name_prefix)
+        return await paginate(query, page, response)
+
+    return await cached_list_response(supplier_cache, request, SUPPLIER_LIST, load)
 
 # ----------------------------------------------------------------------------------
 #                                 LOCATIONS
@@ -130,13 +393,25 @@ async def create_location(data: LocationCreate, admin: User = Depends(get_admin_
         raise HTTPException(status_code=400, detail="Location already exists")
     
     # Create the location record
-    return await Location.create(**data.model_dump())
+    location = await Location.create(**data.model_dump())
+    location_cache.bump()
+    return location
 
 # -- USER --
 @router.get("/locations", response_model=list[LocationResponse], tags=["Inventory: Locations"])
-async def list_locations(user: User = Depends(get_current_user)):
-    """Returns a list of all warehouse locations."""
-    return await Location.all()
+async def list_locations(
+    request: Request,
+    zone: Optional[str] = None,
+    page: PageParams = Depends(),
+    user: User = Depends(get_current_user)):
+    """Returns a page of warehouse locations (cached, ETag aware), optionally limited to one zone."""
+    async def load(response: Response):
+        query = Location.all()
+        if zone:
+            query = query.filter(zone_name=zone)
+        return await paginate(query, page, response)
+
+    return await cached_list_response(location_cache, request, LOCATION_LIST, load)
 
 # ----------------------------------------------------------------------------------
 #                                 PRODUCTS
@@ -152,11 +427,52 @@ async def create_product(data: ProductCreate, admin: User = Depends(get_admin_us
         raise HTTPException(status_code=404, detail="Location not found")
     
     product = await Product.create(**data.model_dump())
+    sku_index.add(product.sku, product.id)
+    ngram_index.add(product.id, product.name, product.sku)
 
     # 🔑 fetch related so response_model can serialize correctly
     await product.fetch_related("supplier", "location")
     return product
 
+@router.post("/products/import", tags=["Inventory: Products"])
+async def bulk_import_products(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Stream a catalog upload (CSV with header row, or NDJSON) as the raw request body.
+    Rows are validated in chunks, COPYed into staging and upserted by SKU.
+    Invalid rows are reported per line without aborting the load.
+    The format defaults from the Content-Type header (application/x-ndjson or text/csv).
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    summary = await import_products(iter_records(iter_lines(request.stream()), format))
+    # The in-process search index (no pg_trgm) is rebuilt on the next search
+    ngram_index.clear()
+    return summary
+
+# Declared before /products/{product_id} so "bulk" is not parsed as an id
+@router.patch("/products/bulk", response_model=ProductBulkUpdateResponse, tags=["Inventory: Products"])
+async def bulk_update_products(
+    data: ProductBulkUpdate,
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Apply many partial product updates (price lists, relocations) in one transaction.
+    References and SKU uniqueness are validated with a few set-based queries.
+    With atomic=true any invalid item rejects the request (409 with per-item results).
+    """
+    try:
+        results = await WarehouseService.bulk_update_products(data.items, atomic=data.atomic)
+    except BulkUpdateError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "results": e.results})
+
+    updated = sum(1 for result in results if result["success"])
+    return {"updated": updated, "failed": len(results) - updated, "results": results}
+
 @router.patch("/products/{product_id}", tags=["Inventory: Products"])
 async def update_product_details(
     product_id: int, 
@@ -169,6 +485,7 @@ async def update_product_details(
     
     update_data = data.model_dump(exclude_unset=True)
 
+    previous_sku = product.sku
     if "sku" in update_data:
         new_sku = update_data["sku"]
         if new_sku != product.sku and await Product.exists(sku=new_sku):
@@ -189,8 +506,15 @@ async def update_product_details(
         product.name = update_data["name"]
     if "price" in update_data:
         product.price = update_data["price"]
+    if "reorder_level" in update_data:
+        product.reorder_level = update_data["reorder_level"]
         
-    await product.save()
+    # Only the editable columns: stock and reservation counters may have moved since the read
+    await product.save(update_fields=["name", "price", "sku", "supplier_id", "location_id", "reorder_level"])
+    if product.sku != previous_sku:
+        sku_index.discard(previous_sku)
+        sku_index.add(product.sku, product.id)
+    ngram_index.add(product.id, product.name, product.sku)
     return product
 
 @router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Inventory: Products"])
@@ -207,15 +531,79 @@ async def delete_product(
         raise HTTPException(status_code=404, detail="Product not found")
     
     await product.delete()
+    sku_index.discard(product.sku)
+    ngram_index.remove(product.id)
     
     # Return a empty response not a dict
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 # -- USER --
+# Barcode scan: one product by SKU, resolved through the in-process SKU index
+@router.get("/products/by-sku/{sku}", response_model=ProductResponse, tags=["Inventory: Products"])
+async def get_product_by_sku(sku: str, user: User = Depends(get_current_user)):
+    product_id = await sku_index.resolve(sku)
+    product = None
+    if product_id is not None:
+        product = await Product.filter(id=product_id).select_related("supplier", "location").first()
+    if product is None or product.sku != sku:
+        # The index entry was stale (SKU changed or product deleted by another worker)
+        product_id = await sku_index.refresh(sku)
+        product = product_id and await Product.filter(id=product_id).select_related("supplier", "location").first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+# Typo-tolerant search over name and SKU, best matches first
+@router.get("/products/search", response_model=list[ProductSearchResult], tags=["Inventory: Products"])
+async def search_product_catalog(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    user: User = Depends(get_current_user)):
+    """
+    Ranks products by trigram similarity of `q` to their name or SKU, so partial and
+    misspelt terms still match. Pages follow the X-Next-Cursor header like other lists.
+    """
+    offset = decode_cursor(after, kind="offset") if after else 0
+    limit = max(0, min(limit, MAX_SEARCH_RESULTS - offset))
+    ranked = await search_products(q, limit + 1, offset) if limit else []
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit, kind="offset")
+
+    products = await Product.filter(id__in=[product_id for product_id, _ in ranked]).select_related("supplier", "location")
+    by_id = {product.id: product for product in products}
+    results = []
+    for product_id, score in ranked:
+        if product_id in by_id:
+            by_id[product_id].score = round(score, 4)
+            results.append(by_id[product_id])
+    return results
+
 @router.get("/products", response_model=list[ProductResponse], tags=["Inventory: Products"])
-async def list_products(user: User = Depends(get_current_user)):
+async def list_products(
+    supplier_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    zone: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_stock: Optional[int] = None,
+    max_stock: Optional[int] = None,
+    page: PageParams = Depends(),
+    user: User = Depends(get_current_user)):
     """
-    Returns a list of products with nested supplier and location data.
-    FastAPI handles the dictionary conversion automatically.
+    Returns a page of products with nested supplier and location data.
+    Filters are evaluated in SQL; supplier and location are joined in the same query.
+    The next page is requested with the token from the X-Next-Cursor header.
     """
-    return await Product.all().prefetch_related("supplier", "location")
+    # Projection fast path: records are encoded straight to JSON (response_model documents the shape)
+    rows = await fetch_product_page(
+        page.limit + 1, after_id=page.after_id,
+        supplier_id=supplier_id, location_id=location_id, zone=zone,
+        name_prefix=name_prefix, min_stock=min_stock, max_stock=max_stock,
+    )
+    headers = {}
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["id"])
+    return Response(content=encode_product_rows(rows), media_type="application/json", headers=headers)
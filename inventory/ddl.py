@@ -0,0 +1,202 @@
+from tortoise import Tortoise
+
+from settings import settings
+from .partitions import ensure_partitioned_logs
+
+# Keeps supplier_valuations in step with every write to products, in the writer's transaction.
+# Statement-level: each statement's changes are summed per supplier and the valuation rows are
+# locked in supplier_id order, whatever order the writer touched products in, so concurrent
+# batches cannot deadlock on them. Statements that leave every aggregate unchanged (renames,
+# reservations) do not touch supplier_valuations at all.
+# A supplier's row is only inserted when it gains products: one that only lost products may be
+# in the middle of a cascading delete, where the insert would fail.
+SUPPLIER_VALUATION_TRIGGER = """
+CREATE OR REPLACE FUNCTION supplier_valuation_apply(
+    changed_suppliers int[], changed_products int[], changed_units bigint[], changed_valuations numeric[]
+) RETURNS void AS $$
+DECLARE
+    ids int[];
+    product_deltas int[];
+    unit_deltas bigint[];
+    valuation_deltas numeric[];
+BEGIN
+    SELECT array_agg(c.supplier_id ORDER BY c.supplier_id), array_agg(c.products ORDER BY c.supplier_id),
+           array_agg(c.units ORDER BY c.supplier_id), array_agg(c.valuation ORDER BY c.supplier_id)
+    INTO ids, product_deltas, unit_deltas, valuation_deltas
+    FROM (
+        SELECT supplier_id, SUM(products) AS products, SUM(units) AS units, SUM(valuation) AS valuation
+        FROM unnest(changed_suppliers, changed_products, changed_units, changed_valuations)
+            AS c(supplier_id, products, units, valuation)
+        WHERE supplier_id IS NOT NULL
+        GROUP BY supplier_id
+        HAVING SUM(products) <> 0 OR SUM(units) <> 0 OR SUM(valuation) <> 0
+    ) AS c;
+    IF ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM supplier_valuations WHERE supplier_id = ANY(ids) ORDER BY supplier_id FOR UPDATE;
+
+    UPDATE supplier_valuations v
+    SET unique_products = v.unique_products + d.products,
+        total_units = v.total_units + d.units,
+        total_valuation = v.total_valuation + d.valuation
+    FROM unnest(ids, product_deltas, unit_deltas, valuation_deltas) AS d(supplier_id, products, units, valuation)
+    WHERE v.supplier_id = d.supplier_id;
+
+    INSERT INTO supplier_valuations AS v (supplier_id, unique_products, total_units, total_valuation)
+    SELECT d.supplier_id, d.products, d.units, d.valuation
+    FROM unnest(ids, product_deltas, unit_deltas, valuation_deltas) AS d(supplier_id, products, units, valuation)
+    WHERE d.products > 0 AND NOT EXISTS (SELECT 1 FROM supplier_valuations s WHERE s.supplier_id = d.supplier_id)
+    ORDER BY d.supplier_id
+    ON CONFLICT (supplier_id) DO UPDATE
+    SET unique_products = v.unique_products + EXCLUDED.unique_products,
+        total_units = v.total_units + EXCLUDED.total_units,
+        total_valuation = v.total_valuation + EXCLUDED.total_valuation;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION supplier_valuation_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM supplier_valuation_apply(
+            array_agg(supplier_id), array_agg(1), array_agg(stock_quantity::bigint), array_agg(price * stock_quantity)
+        ) FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM supplier_valuation_apply(
+            array_agg(supplier_id), array_agg(-1), array_agg(-stock_quantity::bigint), array_agg(-price * stock_quantity)
+        ) FROM old_rows;
+    ELSE
+        PERFORM supplier_valuation_apply(
+            array_agg(c.supplier_id), array_agg(c.products), array_agg(c.units), array_agg(c.valuation)
+        ) FROM (
+            SELECT supplier_id, 1, stock_quantity::bigint, price * stock_quantity FROM new_rows
+            UNION ALL
+            SELECT supplier_id, -1, -stock_quantity::bigint, -price * stock_quantity FROM old_rows
+        ) AS c(supplier_id, products, units, valuation);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_supplier_valuation ON products;
+CREATE OR REPLACE TRIGGER trg_products_supplier_valuation_insert
+AFTER INSERT ON products REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION supplier_valuation_sync();
+CREATE OR REPLACE TRIGGER trg_products_supplier_valuation_update
+AFTER UPDATE ON products REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION supplier_valuation_sync();
+CREATE OR REPLACE TRIGGER trg_products_supplier_valuation_delete
+AFTER DELETE ON products REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION supplier_valuation_sync();
+
+-- First start on an existing catalog: build the aggregates once (no-op when already populated)
+INSERT INTO supplier_valuations (supplier_id, unique_products, total_units, total_valuation)
+SELECT supplier_id, COUNT(*), SUM(stock_quantity), SUM(price * stock_quantity)
+FROM products
+WHERE supplier_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM supplier_valuations)
+GROUP BY supplier_id;
+"""
+
+# Trigram GIN indexes behind /products/search. pg_trgm ships with PostgreSQL contrib but may
+# be missing or need privileges; search then falls back to inventory/search.py's in-process index.
+PRODUCT_SEARCH_INDEXES = """
+DO $$
+BEGIN
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE 'pg_trgm not available (%), product search uses the in-process index', SQLERRM;
+    END;
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING gin (name gin_trgm_ops)';
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_products_sku_trgm ON products USING gin (sku gin_trgm_ops)';
+    END IF;
+END $$;
+"""
+
+# Last line of defence behind the reservation and adjustment guards
+RESERVED_WITHIN_STOCK = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'products_reserved_within_stock') THEN
+        ALTER TABLE products ADD CONSTRAINT products_reserved_within_stock
+            CHECK (reserved_quantity >= 0 AND reserved_quantity <= stock_quantity);
+    END IF;
+END $$;
+"""
+
+# Raises and clears low_stock_alerts rows as products cross their reorder level, in the
+# writer's transaction. Only crossings write to the alert table; NULL reorder levels never alert.
+LOW_STOCK_TRIGGER = """
+CREATE OR REPLACE FUNCTION low_stock_sync() RETURNS trigger AS $$
+DECLARE
+    was_low boolean := TG_OP = 'UPDATE' AND COALESCE(OLD.stock_quantity <= OLD.reorder_level, false);
+    is_low boolean := COALESCE(NEW.stock_quantity <= NEW.reorder_level, false);
+BEGIN
+    IF is_low AND NOT was_low THEN
+        INSERT INTO low_stock_alerts (product_id, raised_at)
+        VALUES (NEW.id, clock_timestamp())
+        ON CONFLICT (product_id) DO NOTHING;
+    ELSIF was_low AND NOT is_low THEN
+        DELETE FROM low_stock_alerts WHERE product_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_products_low_stock
+AFTER INSERT OR UPDATE OF stock_quantity, reorder_level ON products
+FOR EACH ROW EXECUTE FUNCTION low_stock_sync();
+"""
+
+# Publishes every product change on the channel inventory/events.py listens to.
+# NOTIFY is delivered on commit, so rolled back writes never reach subscribers.
+PRODUCT_CHANGE_NOTIFY = """
+CREATE OR REPLACE FUNCTION product_change_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('wms_product_changes', json_build_object('op', 'delete', 'id', OLD.id, 'sku', OLD.sku)::text);
+    ELSIF TG_OP = 'INSERT' OR OLD IS DISTINCT FROM NEW THEN
+        PERFORM pg_notify('wms_product_changes', json_build_object(
+            'op', lower(TG_OP), 'id', NEW.id, 'sku', NEW.sku, 'name', NEW.name,
+            'stock_quantity', NEW.stock_quantity, 'reserved_quantity', NEW.reserved_quantity
+        )::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_products_change_notify
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE FUNCTION product_change_notify();
+"""
+
+# Database objects that generate_schemas cannot express (operator classes, triggers, ...).
+# Every statement is idempotent and is applied at startup once the ORM tables exist.
+SCHEMA_EXTENSIONS = [
+    # Columns added after the tables were first created (generate_schemas only creates missing tables)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INT NOT NULL DEFAULT 0",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS reserved_quantity INT NOT NULL DEFAULT 0",
+    # Tables created by generate_schemas have no database default; raw INSERTs rely on one
+    "ALTER TABLE products ALTER COLUMN reserved_quantity SET DEFAULT 0",
+    RESERVED_WITHIN_STOCK,
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS reorder_level INT",
+    LOW_STOCK_TRIGGER,
+    PRODUCT_CHANGE_NOTIFY,
+    # The expiry scheduler reads ACTIVE reservations in expires_at order, never the closed ones
+    'CREATE INDEX IF NOT EXISTS "idx_stock_reservations_active_expiry" '
+    """ON "stock_reservations" ("expires_at") WHERE status = 'ACTIVE'""",
+    # Prefix filters (name LIKE 'abc%') can use a btree index whatever the database collation
+    'CREATE INDEX IF NOT EXISTS "idx_products_name_prefix" ON "products" ("name" varchar_pattern_ops)',
+    SUPPLIER_VALUATION_TRIGGER,
+    PRODUCT_SEARCH_INDEXES,
+]
+
+
+async def apply_schema_extensions():
+    """Runs every SCHEMA_EXTENSIONS statement on the default connection, then partitions warehouse_logs."""
+    conn = Tortoise.get_connection("default")
+    for statement in SCHEMA_EXTENSIONS:
+        await conn.execute_script(statement)
+    await ensure_partitioned_logs(settings.log_partitions_ahead)
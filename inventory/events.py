@@ -0,0 +1,163 @@
+"""
+Live product change feed: PostgreSQL NOTIFY -> one listener per worker -> SSE clients.
+
+A trigger on products (see inventory/ddl.py) sends a small JSON event on the
+"wms_product_changes" channel for every inserted, changed or deleted product, so
+adjust_stock, batches, reservations, imports and catalog edits all publish without
+extra code, and only once their transaction has committed.
+
+Each worker holds one dedicated LISTEN connection, outside the shared pool, and hands
+the events to the in-process ChangeBroadcaster, which fans them out to subscribers.
+No write path calls publish() itself; the trigger is the only source of events, so the
+feed needs PostgreSQL: on any other database /inventory/stream answers 503 instead of
+streaming nothing. publish() is public for the listener and for tests that drive the
+broadcaster without a database.
+
+Every subscriber has a bounded buffer. A consumer that falls behind never holds the
+others up: its buffer is dropped and it gets a single "resync" event, after which it
+should reload what it displays (e.g. GET /inventory/products). Events carry absolute
+quantities, so replaying ones already reflected in the reload is harmless.
+"""
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import asyncpg
+from tortoise import Tortoise
+
+from settings import settings
+
+CHANNEL = "wms_product_changes"
+RESYNC = {"op": "resync"}
+
+
+def feed_supported() -> bool:
+    """True when the database can deliver change events (PostgreSQL LISTEN/NOTIFY)."""
+    return Tortoise.get_connection("default").capabilities.dialect == "postgres"
+
+
+class Subscription:
+    """One consumer's bounded event buffer; use as a context manager to unsubscribe."""
+
+    def __init__(self, broadcaster: "ChangeBroadcaster", buffer_size: int):
+        self._broadcaster = broadcaster
+        self._buffer_size = buffer_size
+        self._events: deque = deque()
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def _push(self, item: tuple[int, dict]) -> None:
+        if len(self._events) >= self._buffer_size:
+            # Too slow: what is buffered is no longer worth delivering
+            self.dropped += len(self._events)
+            self._events.clear()
+            self._events.append((item[0], RESYNC))
+        else:
+            self._events.append(item)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[tuple[int, dict]]:
+        """Next (sequence, event) pair, or None if `timeout` seconds pass first."""
+        while not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+    def close(self) -> None:
+        self._broadcaster._subscribers.discard(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ChangeBroadcaster:
+
+    def __init__(self, buffer_size: int = 1000):
+        self.buffer_size = buffer_size
+        self._subscribers: set[Subscription] = set()
+        self.sequence = 0
+        self.connection = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, buffer_size: Optional[int] = None) -> Subscription:
+        subscription = Subscription(self, buffer_size or self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def publish(self, event: dict) -> None:
+        """Hands one event to every subscriber; never blocks on a slow one."""
+        self.sequence += 1
+        item = (self.sequence, event)
+        for subscription in self._subscribers:
+            subscription._push(item)
+
+    def resync_all(self) -> None:
+        """Tells every subscriber that events may have been missed."""
+        self.publish(RESYNC)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self.publish(json.loads(payload))
+        except ValueError:
+            print(f"Ignoring malformed change event: {payload!r}")
+
+    async def listen(self, reconnect_delay: float = 5.0):
+        """
+        Background loop started by the app: LISTENs on a dedicated connection and
+        republishes every notification, reconnecting when the connection drops.
+        Returns straight away on databases without LISTEN/NOTIFY.
+        """
+        if not feed_supported():
+            return
+        client = Tortoise.get_connection("default")
+        while True:
+            try:
+                self.connection = await asyncpg.connect(
+                    host=client.host, port=client.port, user=client.user,
+                    password=client.password, database=client.database,
+                )
+                lost = asyncio.Event()
+                self.connection.add_termination_listener(lambda connection: lost.set())
+                await self.connection.add_listener(CHANNEL, self._on_notify)
+                # Changes made while we were not listening are unknown to subscribers
+                self.resync_all()
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change feed listener failed: {e}")
+            finally:
+                if self.connection is not None and not self.connection.is_closed():
+                    await self.connection.close()
+                self.connection = None
+            await asyncio.sleep(reconnect_delay)
+
+
+async def sse_events(broadcaster: ChangeBroadcaster, heartbeat: float) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one client: "product" events with the change as JSON data and
+    "resync" events; a comment line every `heartbeat` seconds keeps idle proxies open.
+    """
+    with broadcaster.subscribe() as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            item = await subscription.get(timeout=heartbeat)
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            sequence, event = item
+            kind = "resync" if event is RESYNC else "product"
+            yield f"id: {sequence}\nevent: {kind}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+change_feed = ChangeBroadcaster(settings.stream_buffer_size)
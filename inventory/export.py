@@ -0,0 +1,87 @@
+import asyncio
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import db
+
+# Chunks buffered between the COPY reader and the HTTP writer; a slow client stalls
+# the COPY (and the server) instead of growing memory
+EXPORT_QUEUE_CHUNKS = 16
+
+PRODUCTS_EXPORT_SQL = """
+    SELECT p.id, p.sku, p.name, p.price, p.stock_quantity,
+           p.supplier_id, s.name AS supplier_name,
+           p.location_id, l.zone_name, l.shelf_number
+    FROM products p
+    LEFT JOIN suppliers s ON s.id = p.supplier_id
+    LEFT JOIN locations l ON l.id = p.location_id
+    ORDER BY p.id
+"""
+
+LOGS_EXPORT_SQL = """
+    SELECT l.id, l.created_at, l.action_type, l.quantity_change,
+           l.product_id, p.sku, l.user_id, u.login AS user_login
+    FROM warehouse_logs l
+    JOIN products p ON p.id = l.product_id
+    JOIN users u ON u.id = l.user_id
+    {where}
+    ORDER BY l.created_at, l.id
+"""
+
+_DONE = object()
+
+
+async def stream_copy(query: str, *args, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Streams `COPY (query) TO STDOUT WITH CSV HEADER` output chunk by chunk, optionally gzipped.
+    Rows never become Python objects: asyncpg hands over the raw CSV bytes.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+
+    async def sink(chunk):
+        # asyncpg may hand over a reusable buffer, so take a copy
+        await queue.put(bytes(chunk))
+
+    async def produce():
+        try:
+            async with db.acquire() as conn:
+                await conn.copy_from_query(query, *args, output=sink, format="csv", header=True)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    try:
+        while (chunk := await queue.get()) is not _DONE:
+            if isinstance(chunk, Exception):
+                raise chunk
+            if compressor:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        # Client went away (or COPY failed): stop reading and give the connection back
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def export_products(compress: bool = False) -> AsyncIterator[bytes]:
+    return stream_copy(PRODUCTS_EXPORT_SQL, compress=compress)
+
+
+def export_logs(date_from: Optional[datetime], date_to: Optional[datetime], compress: bool = False) -> AsyncIterator[bytes]:
+    """Warehouse log rows with created_at in [date_from, date_to); either bound may be omitted."""
+    conditions, params = [], []
+    for clause, value in (("l.created_at >= ${}", date_from), ("l.created_at < ${}", date_to)):
+        if value is not None:
+            params.append(value)
+            conditions.append(clause.format(len(params)))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return stream_copy(LOGS_EXPORT_SQL.format(where=where), *params, compress=compress)
@@ -0,0 +1,145 @@
+"""
+Group commit for single stock adjustments (WMS_ADJUST_COMMIT_MODE=group).
+
+Concurrent adjust_stock calls are queued in process and written together: one
+transaction locks the touched products, applies the adjustments in arrival order
+and writes all their log rows with one multi-row insert. A batch is flushed when
+it reaches max_batch entries or max_delay seconds after its first entry arrived,
+and every caller is answered only after its batch has committed.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from tortoise.transactions import in_transaction
+
+from settings import settings
+
+_STOP = object()
+
+
+@dataclass
+class PendingAdjustment:
+    product_id: int
+    user_id: int
+    change: int
+    action: str
+    sku: Optional[str]
+    future: asyncio.Future = field(repr=False)
+
+
+class GroupCommitter:
+
+    def __init__(self, max_batch: int = 256, max_delay: float = 0.002):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = None
+        self._full = None
+        self._worker = None
+        self.batches = 0
+        self.adjustments = 0
+
+    def _ensure_worker(self):
+        # The queue belongs to the running loop; a new loop (tests, reload) gets a new worker
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, product_id: int, user_id: int, change: int, action: str, sku: Optional[str] = None) -> dict:
+        """
+        Queues one adjustment and waits until its batch is committed; returns {id, stock_quantity}.
+        With `sku`, the product must still carry that SKU, as in WarehouseService.adjust_stock.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(PendingAdjustment(product_id, user_id, change, action, sku, future))
+        if self._queue.qsize() >= self.max_batch - 1:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            # Give concurrent callers max_delay to join, unless the batch fills up first
+            if self._queue.qsize() < self.max_batch - 1:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[PendingAdjustment]):
+        try:
+            results = await self._apply(batch)
+        except Exception as e:
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.adjustments += len(batch)
+        for entry, result in zip(batch, results):
+            if entry.future.done():
+                continue
+            if isinstance(result, Exception):
+                entry.future.set_exception(result)
+            else:
+                entry.future.set_result(result)
+
+    @staticmethod
+    async def _apply(batch: list[PendingAdjustment]) -> list:
+        """One transaction for the whole batch; a failing entry only fails its own caller."""
+        from .service import WarehouseService
+
+        async with in_transaction() as conn:
+            locked = await conn.execute_query_dict(
+                "SELECT id, sku, stock_quantity, reserved_quantity FROM products WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE",
+                [list({entry.product_id for entry in batch})]
+            )
+            stock = {row["id"]: row["stock_quantity"] for row in locked}
+            reserved = {row["id"]: row["reserved_quantity"] for row in locked}
+            skus = {row["id"]: row["sku"] for row in locked}
+
+            results = []
+            actions, changes, products, users = [], [], [], []
+            for entry in batch:
+                if entry.product_id not in stock or entry.sku not in (None, skus[entry.product_id]):
+                    results.append(Exception("Product not found"))
+                    continue
+                if stock[entry.product_id] - reserved[entry.product_id] + entry.change < 0:
+                    results.append(Exception("Not enough stock available"))
+                    continue
+                stock[entry.product_id] += entry.change
+                results.append({"id": entry.product_id, "stock_quantity": stock[entry.product_id]})
+                actions.append(entry.action)
+                changes.append(entry.change)
+                products.append(entry.product_id)
+                users.append(entry.user_id)
+
+            if products:
+                await WarehouseService._write_adjustments(conn, stock, actions, changes, products, users)
+        return results
+
+    async def drain(self):
+        """Writes everything queued so far, then stops the worker (app shutdown)."""
+        if self._worker is None or self._worker.done():
+            return
+        await self._queue.put(_STOP)
+        await asyncio.gather(self._worker, return_exceptions=True)
+
+
+group_committer = GroupCommitter(settings.group_commit_max_batch, settings.group_commit_max_delay_ms / 1000)
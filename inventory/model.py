@@ -23,6 +23,10 @@ class Product(models.Model):
     sku = fields.CharField(max_length=50, unique=True)
     price = fields.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     stock_quantity = fields.IntField(default=0)
+    # Units held by ACTIVE stock reservations; available stock is stock_quantity - reserved_quantity
+    reserved_quantity = fields.IntField(default=0)
+    # Reorder point: the product is reported as low once stock_quantity falls to it (None: never)
+    reorder_level = fields.IntField(null=True)
     
     # Relationships
     supplier = fields.ForeignKeyField("models.Supplier", related_name="products", null=True)
@@ -30,6 +34,73 @@ class Product(models.Model):
 
     class Meta:
         table = "products"
+        # Composite keys let filtered list queries walk the index in id (cursor) order
+        indexes = (
+            ("supplier_id", "id"),
+            ("location_id", "id"),
+            ("stock_quantity", "id"),
+        )
+
+class SupplierValuation(models.Model):
+    """
+    Running per-supplier stock aggregates.
+    Maintained by a trigger on products (see inventory/ddl.py), never written by the ORM.
+    """
+    supplier = fields.OneToOneField("models.Supplier", related_name="valuation", primary_key=True)
+    unique_products = fields.IntField(default=0)
+    total_units = fields.BigIntField(default=0)
+    total_valuation = fields.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        table = "supplier_valuations"
+
+class LowStockAlert(models.Model):
+    """
+    Products currently at or below their reorder level, with the time they got there.
+    Maintained by a trigger on products (see inventory/ddl.py), never written by the ORM.
+    """
+    product = fields.OneToOneField("models.Product", related_name="low_stock_alert", primary_key=True)
+    raised_at = fields.DatetimeField()
+
+    class Meta:
+        table = "low_stock_alerts"
+
+class StockSnapshot(models.Model):
+    """
+    stock_quantity of every product at taken_at, written by the snapshot job
+    (see inventory/snapshots.py). Point-in-time stock is the nearest snapshot
+    plus or minus the warehouse_logs deltas between it and the requested time.
+    """
+    id = fields.BigIntField(primary_key=True)
+    taken_at = fields.DatetimeField()
+    stock_quantity = fields.IntField()
+
+    product = fields.ForeignKeyField("models.Product", related_name="snapshots")
+
+    class Meta:
+        table = "stock_snapshots"
+        indexes = (("product_id", "taken_at"), ("taken_at",))
+
+class StockReservation(models.Model):
+    """
+    Quantity of a product held for an order (see inventory/reservations.py).
+    While ACTIVE it is counted in products.reserved_quantity; it ends COMMITTED
+    (shipped), RELEASED or EXPIRED.
+    """
+    id = fields.BigIntField(primary_key=True)
+    quantity = fields.IntField()
+    status = fields.CharField(max_length=10, default="ACTIVE")
+    reference = fields.CharField(max_length=100, null=True)
+    created_at = fields.DatetimeField()
+    expires_at = fields.DatetimeField()
+    closed_at = fields.DatetimeField(null=True)
+
+    product = fields.ForeignKeyField("models.Product", related_name="reservations")
+    user = fields.ForeignKeyField("models.User", related_name="reservations", null=True, on_delete=fields.SET_NULL)
+
+    class Meta:
+        table = "stock_reservations"
+        indexes = (("product_id", "status"),)
 
 class WarehouseLog(models.Model):
     id = fields.IntField(primary_key=True)
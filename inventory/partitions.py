@@ -0,0 +1,228 @@
+"""
+Monthly range partitioning of warehouse_logs.
+
+The ORM creates warehouse_logs as a plain table; on startup it is converted (once)
+into a table partitioned by month on created_at. Maintenance keeps partitions for
+the coming months in place and archives old ones by detaching them, so reports
+prune partitions and old data never has to be removed with a large DELETE.
+
+    python -m inventory.partitions rotate
+    python -m inventory.partitions archive --older-than-months 24 --export-dir /srv/archive
+"""
+import argparse
+import asyncio
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from tortoise import Tortoise
+
+import db
+
+PARENT = "warehouse_logs"
+DEFAULT_PARTITION = "warehouse_logs_default"
+PARTITION_NAME = re.compile(r"^warehouse_logs_y(\d{4})m(\d{2})$")
+
+# Run on every start; all statements are idempotent on an already partitioned table
+LOG_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_warehouse_logs_created_at ON warehouse_logs (created_at);
+    CREATE INDEX IF NOT EXISTS idx_warehouse_logs_product_created ON warehouse_logs (product_id, created_at);
+"""
+
+CONVERT_SQL = """
+    LOCK TABLE warehouse_logs IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE warehouse_logs RENAME TO warehouse_logs_unpartitioned;
+    ALTER TABLE warehouse_logs_unpartitioned RENAME CONSTRAINT warehouse_logs_pkey TO warehouse_logs_unpartitioned_pkey;
+
+    CREATE TABLE warehouse_logs (
+        id INT NOT NULL DEFAULT nextval('warehouse_logs_id_seq'),
+        action_type VARCHAR(20) NOT NULL,
+        quantity_change INT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        product_id INT NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+        user_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE warehouse_logs_id_seq OWNED BY warehouse_logs.id;
+
+    -- Safety net for rows outside every monthly partition (kept empty by rotation)
+    CREATE TABLE warehouse_logs_default PARTITION OF warehouse_logs DEFAULT;
+"""
+
+COPY_BACK_SQL = """
+    INSERT INTO warehouse_logs (id, action_type, quantity_change, created_at, product_id, user_id)
+    SELECT id, action_type, quantity_change, created_at, product_id, user_id FROM warehouse_logs_unpartitioned;
+    DROP TABLE warehouse_logs_unpartitioned;
+"""
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+
+async def _create_month(conn, month: date, move_default_rows: bool = True) -> None:
+    """
+    Creates the partition for one month (UTC bounds). Rows that already landed in the
+    default partition for that month are moved into it, otherwise PostgreSQL refuses
+    to create it. Must run inside a transaction.
+    """
+    lower = f"'{month.isoformat()} 00:00:00+00'"
+    upper = f"'{add_months(month, 1).isoformat()} 00:00:00+00'"
+    create = f"CREATE TABLE {partition_name(month)} PARTITION OF {PARENT} FOR VALUES FROM ({lower}) TO ({upper})"
+    if not move_default_rows:
+        await conn.execute(create)
+        return
+    await conn.execute(f"""
+        CREATE TEMP TABLE _moved_logs ON COMMIT DROP AS
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= {lower} AND created_at < {upper}
+            RETURNING *
+        )
+        SELECT * FROM moved;
+        {create};
+        INSERT INTO {PARENT} SELECT * FROM _moved_logs;
+    """)
+
+
+async def list_partitions(conn) -> list[tuple[date, str]]:
+    """Monthly partitions currently attached to warehouse_logs, oldest first."""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'warehouse_logs'::regclass
+        """
+    )
+    months = []
+    for row in rows:
+        match = PARTITION_NAME.match(row["relname"])
+        if match:
+            months.append((date(int(match[1]), int(match[2]), 1), row["relname"]))
+    return sorted(months)
+
+
+async def ensure_log_partitions(months_ahead: int = 3, today: Optional[date] = None) -> list[str]:
+    """Creates any missing partition from the current month up to `months_ahead` months later."""
+    current = month_start(today or datetime.now(timezone.utc).date())
+    created = []
+    async with db.acquire() as conn:
+        existing = {month for month, _ in await list_partitions(conn)}
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month in existing:
+                continue
+            async with conn.transaction():
+                await _create_month(conn, month)
+            created.append(partition_name(month))
+    return created
+
+
+async def ensure_partitioned_logs(months_ahead: int = 3) -> None:
+    """Converts warehouse_logs to a partitioned table if the ORM created a plain one."""
+    async with db.acquire() as conn:
+        kind = await conn.fetchval("SELECT relkind::text FROM pg_class WHERE oid = 'warehouse_logs'::regclass")
+        if kind == "r":
+            async with conn.transaction():
+                oldest = await conn.fetchval("SELECT min(created_at) FROM warehouse_logs")
+                await conn.execute(CONVERT_SQL)
+                # The new default partition is still empty, nothing to move
+                now = month_start(datetime.now(timezone.utc).date())
+                month = month_start(oldest.astimezone(timezone.utc).date()) if oldest else now
+                while month <= now:
+                    await _create_month(conn, month, move_default_rows=False)
+                    month = add_months(month, 1)
+                await conn.execute(COPY_BACK_SQL)
+        await conn.execute(LOG_INDEXES_SQL)
+    await ensure_log_partitions(months_ahead)
+
+
+async def archive_log_partitions(
+    older_than_months: int,
+    export_dir: Optional[str] = None,
+    keep_detached: bool = False,
+    today: Optional[date] = None,
+) -> list[str]:
+    """
+    Detaches every monthly partition that ended more than `older_than_months` months ago.
+    With export_dir, each one is first written there as <partition>.csv.gz via COPY.
+    Detached partitions are dropped unless keep_detached is set.
+    """
+    from .export import stream_copy
+
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc).date()), -older_than_months)
+    async with db.acquire() as conn:
+        partitions = [name for month, name in await list_partitions(conn) if add_months(month, 1) <= cutoff]
+
+    archived = []
+    for name in partitions:
+        if export_dir:
+            path = os.path.join(export_dir, f"{name}.csv.gz")
+            with open(path + ".part", "wb") as handle:
+                async for chunk in stream_copy(f"SELECT * FROM {name} ORDER BY created_at, id", compress=True):
+                    handle.write(chunk)
+            os.replace(path + ".part", path)
+
+        async with db.acquire() as conn:
+            await conn.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+            if not keep_detached:
+                await conn.execute(f"DROP TABLE {name}")
+        archived.append(name)
+    return archived
+
+
+async def run_log_maintenance(interval: float, months_ahead: int, retention_months: int, archive_dir: Optional[str]):
+    """
+    Background loop started by the app: keeps future partitions in place and, when
+    retention_months is set, archives partitions older than that.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await ensure_log_partitions(months_ahead)
+            if retention_months:
+                await archive_log_partitions(retention_months, archive_dir)
+        except Exception as e:
+            # Next round retries; a missed rotation only sends rows to the default partition
+            print(f"Log partition maintenance failed: {e}")
+
+
+async def main(args):
+    await Tortoise.init(config=db.tortoise_config())
+    try:
+        if args.command == "rotate":
+            await ensure_partitioned_logs(args.months_ahead)
+            for month, name in await _attached():
+                print(name)
+        else:
+            for name in await archive_log_partitions(args.older_than_months, args.export_dir, args.keep_detached):
+                print(f"archived {name}")
+    finally:
+        await Tortoise.close_connections()
+
+
+async def _attached():
+    async with db.acquire() as conn:
+        return await list_partitions(conn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rotate = commands.add_parser("rotate", help="create partitions for the coming months")
+    rotate.add_argument("--months-ahead", type=int, default=3)
+    archive = commands.add_parser("archive", help="export and detach old partitions")
+    archive.add_argument("--older-than-months", type=int, required=True)
+    archive.add_argument("--export-dir")
+    archive.add_argument("--keep-detached", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+"""
+Wave picking: turns order lines into pick waves with one walking route each.
+
+Orders are kept whole and grouped into waves of at most `max_orders` orders and
+`max_lines` lines, orders that start in the same part of the floor going together.
+Inside a wave the lines are aggregated per product, so every location is a single
+stop whatever the number of orders needing it. The route visits zones in name order
+and walks them serpentine: shelves ascending in the first zone visited, descending
+in the next, and so on, so the picker never walks an aisle twice.
+
+plan_waves() is pure and O(n log n) in the number of lines; plan_pick_waves()
+resolves products and their locations with one query first.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from tortoise import Tortoise
+
+
+@dataclass
+class PickLine:
+    order_id: str
+    product_id: int
+    sku: str
+    quantity: int
+    location_id: int
+    zone_name: str
+    shelf_number: int
+
+
+def _order_start(lines: list[PickLine]) -> tuple:
+    """Where an order's picking happens: its busiest zone, then its lowest shelf there."""
+    zones = Counter(line.zone_name for line in lines)
+    zone = min(zones, key=lambda name: (-zones[name], name))
+    return zone, min(line.shelf_number for line in lines if line.zone_name == zone)
+
+
+def _route(lines: list[PickLine]) -> list[dict]:
+    """Serpentine route through the wave's locations, one stop per location."""
+    stops: dict[int, dict] = {}
+    picks: dict[tuple[int, int], dict] = {}
+    for line in lines:
+        stop = stops.get(line.location_id)
+        if stop is None:
+            stop = stops[line.location_id] = {
+                "location_id": line.location_id,
+                "zone_name": line.zone_name,
+                "shelf_number": line.shelf_number,
+                "picks": [],
+            }
+        pick = picks.get((line.location_id, line.product_id))
+        if pick is None:
+            pick = picks[(line.location_id, line.product_id)] = {
+                "product_id": line.product_id, "sku": line.sku, "quantity": 0, "orders": defaultdict(int),
+            }
+            stop["picks"].append(pick)
+        pick["quantity"] += line.quantity
+        pick["orders"][line.order_id] += line.quantity
+
+    zone_rank = {zone: rank for rank, zone in enumerate(sorted({stop["zone_name"] for stop in stops.values()}))}
+
+    def walk_order(stop: dict) -> tuple:
+        rank = zone_rank[stop["zone_name"]]
+        # Odd zones are walked back down, so each aisle starts where the last one ended
+        return rank, stop["shelf_number"] if rank % 2 == 0 else -stop["shelf_number"], stop["location_id"]
+
+    route = sorted(stops.values(), key=walk_order)
+    for step, stop in enumerate(route, start=1):
+        stop["step"] = step
+        for pick in stop["picks"]:
+            pick["orders"] = dict(pick["orders"])
+    return route
+
+
+def plan_waves(lines: list[PickLine], max_orders: int, max_lines: Optional[int] = None) -> list[dict]:
+    """Groups located order lines into waves, each with its aggregated serpentine route."""
+    by_order: dict[str, list[PickLine]] = defaultdict(list)
+    for line in lines:
+        by_order[line.order_id].append(line)
+
+    waves, current, current_lines = [], [], 0
+    for order_id in sorted(by_order, key=lambda order_id: (_order_start(by_order[order_id]), order_id)):
+        size = len(by_order[order_id])
+        # An order larger than max_lines still gets a wave of its own
+        if current and (len(current) >= max_orders or (max_lines and current_lines + size > max_lines)):
+            waves.append(current)
+            current, current_lines = [], 0
+        current.append(order_id)
+        current_lines += size
+    if current:
+        waves.append(current)
+
+    planned = []
+    for number, orders in enumerate(waves, start=1):
+        wave_lines = [line for order_id in orders for line in by_order[order_id]]
+        planned.append({
+            "wave": number,
+            "orders": orders,
+            "lines": len(wave_lines),
+            "units": sum(line.quantity for line in wave_lines),
+            "route": _route(wave_lines),
+        })
+    return planned
+
+
+async def plan_pick_waves(order_lines: list, max_orders: int, max_lines: Optional[int] = None) -> dict:
+    """
+    Plans waves for request lines (order_id, product_id or sku, quantity).
+    Lines whose product is unknown or has no location are returned as unplanned.
+    """
+    product_ids = list({line.product_id for line in order_lines if line.product_id is not None})
+    skus = list({line.sku for line in order_lines if line.sku is not None})
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        """
+        SELECT p.id, p.sku, p.location_id, l.zone_name, l.shelf_number
+        FROM products p
+        LEFT JOIN locations l ON l.id = p.location_id
+        WHERE p.id = ANY($1::int[]) OR p.sku = ANY($2::text[])
+        """,
+        [product_ids, skus]
+    )
+    by_id = {row["id"]: row for row in rows}
+    by_sku = {row["sku"]: row for row in rows}
+
+    located, unplanned = [], []
+    for index, line in enumerate(order_lines):
+        product = by_id.get(line.product_id) if line.product_id is not None else by_sku.get(line.sku)
+        if product is None:
+            unplanned.append({"line": index, "order_id": line.order_id, "error": "Product not found"})
+        elif product["location_id"] is None:
+            unplanned.append({"line": index, "order_id": line.order_id, "error": "Product has no location"})
+        else:
+            located.append(PickLine(
+                line.order_id, product["id"], product["sku"], line.quantity,
+                product["location_id"], product["zone_name"], product["shelf_number"],
+            ))
+    return {"waves": plan_waves(located, max_orders, max_lines), "unplanned": unplanned}
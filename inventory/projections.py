@@ -0,0 +1,85 @@
+"""
+Zero-ORM read path for large product lists.
+
+The page is fetched as plain records with supplier and location joined in SQL,
+shaped into dicts matching ProductResponse field for field, and encoded with
+pydantic_core.to_json. No Tortoise or Pydantic model is instantiated per row.
+"""
+from typing import Optional
+
+from pydantic_core import to_json
+from tortoise import Tortoise
+
+PRODUCT_PAGE_SQL = """
+    SELECT p.id, p.name, p.sku, p.price, p.stock_quantity, p.reorder_level,
+           s.id AS supplier_id, s.name AS supplier_name, s.contact_email AS supplier_email,
+           l.id AS location_id, l.zone_name, l.shelf_number
+    FROM products p
+    LEFT JOIN suppliers s ON s.id = p.supplier_id
+    LEFT JOIN locations l ON l.id = p.location_id
+    {where}
+    ORDER BY p.id
+    LIMIT ${limit}
+"""
+
+
+def _like_prefix(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+async def fetch_product_page(
+    limit: int,
+    after_id: Optional[int] = None,
+    supplier_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    zone: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_stock: Optional[int] = None,
+    max_stock: Optional[int] = None,
+) -> list:
+    """One keyset page of products as raw records (at most `limit` rows), filters applied in SQL."""
+    conditions, params = [], []
+    for clause, value in (
+        ("p.id > ${}", after_id),
+        ("p.supplier_id = ${}", supplier_id),
+        ("p.location_id = ${}", location_id),
+        ("l.zone_name = ${}", zone),
+        ("p.name LIKE ${}", _like_prefix(name_prefix) if name_prefix is not None else None),
+        ("p.stock_quantity >= ${}", min_stock),
+        ("p.stock_quantity <= ${}", max_stock),
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(clause.format(len(params)))
+    params.append(limit)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = PRODUCT_PAGE_SQL.format(where=where, limit=len(params))
+
+    conn = Tortoise.get_connection("default")
+    async with conn.acquire_connection() as raw_conn:
+        return await raw_conn.fetch(query, *params)
+
+
+def encode_product_rows(rows) -> bytes:
+    """JSON for a list of ProductResponse, built from records without model instances."""
+    return to_json([
+        {
+            "name": row["name"],
+            "sku": row["sku"],
+            "price": row["price"],
+            "stock_quantity": row["stock_quantity"],
+            "reorder_level": row["reorder_level"],
+            "id": row["id"],
+            "supplier": None if row["supplier_id"] is None else {
+                "name": row["supplier_name"],
+                "contact_email": row["supplier_email"],
+                "id": row["supplier_id"],
+            },
+            "location": None if row["location_id"] is None else {
+                "zone_name": row["zone_name"],
+                "shelf_number": row["shelf_number"],
+                "id": row["location_id"],
+            },
+        }
+        for row in rows
+    ])
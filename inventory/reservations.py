@@ -0,0 +1,219 @@
+"""
+Stock reservations: quantity held for an order until it is committed, released or expires.
+
+products.reserved_quantity is the running total of the product's ACTIVE reservations, so
+available stock (stock_quantity - reserved_quantity) is checked and taken by one conditional
+UPDATE, the same way adjust_stock guards against overselling. OUT adjustments only draw
+on available stock; committing a reservation ships the reserved units.
+
+Expiry: ACTIVE reservations are indexed by expires_at (a partial index, see inventory/ddl.py).
+The scheduler claims the earliest due rows, at most `batch_size` per transaction, with
+FOR UPDATE SKIP LOCKED, so it only ever reads due rows and several workers can run it side
+by side. Between rounds it sleeps until the next expiry, capped at `poll_interval` since
+other workers may create reservations that expire sooner.
+
+    python -m inventory.reservations [--batch-size N]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from tortoise import Tortoise
+
+import db
+
+
+class ReservationForbidden(Exception):
+    """Raised when a user other than the one who reserved tries to commit or release."""
+
+# The reservation row is only inserted when the guarded UPDATE matched the product
+RESERVE_SQL = """
+    WITH held AS (
+        UPDATE products
+        SET reserved_quantity = reserved_quantity + $2
+        WHERE id = $1 AND stock_quantity - reserved_quantity >= $2
+        RETURNING id, stock_quantity - reserved_quantity AS available
+    )
+    INSERT INTO stock_reservations (product_id, user_id, quantity, status, reference, created_at, expires_at)
+    SELECT id, $3, $2, 'ACTIVE', $4, clock_timestamp(), clock_timestamp() + make_interval(secs => $5)
+    FROM held
+    RETURNING id, product_id, quantity, status, reference, created_at, expires_at,
+              (SELECT available FROM held) AS available
+"""
+
+# Closing a reservation locks its row first; an ACTIVE row past expires_at can no longer be
+# committed or released by hand, the scheduler will expire it. A NULL $3 (admins) skips the owner check
+CLOSE_SQL = """
+    UPDATE stock_reservations
+    SET status = $2, closed_at = clock_timestamp()
+    WHERE id = $1 AND status = 'ACTIVE' AND expires_at > clock_timestamp()
+      AND ($3::int IS NULL OR user_id = $3)
+    RETURNING id, product_id, quantity, status, reference, created_at, expires_at
+"""
+
+# Logged like an OUT adjustment, stamped after the products row lock is held
+COMMIT_STOCK_SQL = """
+    WITH updated AS (
+        UPDATE products
+        SET stock_quantity = stock_quantity - $2, reserved_quantity = reserved_quantity - $2
+        WHERE id = $1
+        RETURNING id, stock_quantity
+    ), logged AS (
+        INSERT INTO warehouse_logs (action_type, quantity_change, created_at, user_id, product_id)
+        SELECT 'OUT', -$2::int, clock_timestamp(), $3, id FROM updated
+    )
+    SELECT stock_quantity FROM updated
+"""
+
+CLAIM_DUE_SQL = """
+    WITH due AS (
+        SELECT id FROM stock_reservations
+        WHERE status = 'ACTIVE' AND expires_at <= clock_timestamp()
+        ORDER BY expires_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE stock_reservations r
+    SET status = 'EXPIRED', closed_at = clock_timestamp()
+    FROM due
+    WHERE r.id = due.id
+    RETURNING r.product_id, r.quantity
+"""
+
+
+async def reserve_stock(product_id: int, quantity: int, user_id: Optional[int],
+                        ttl: float, reference: Optional[str] = None) -> dict:
+    """Holds `quantity` units for `ttl` seconds; returns the reservation with the product's remaining available stock."""
+    if quantity <= 0:
+        raise Exception("Quantity must be a positive number")
+    async with db.acquire() as conn:
+        row = await conn.fetchrow(RESERVE_SQL, product_id, quantity, user_id, reference, float(ttl))
+        if row is not None:
+            return dict(row)
+        if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM products WHERE id = $1)", product_id):
+            raise Exception("Product not found")
+    raise Exception("Not enough stock available")
+
+
+async def _close(conn, reservation_id: int, status: str, owner_id: Optional[int]):
+    row = await conn.fetchrow(CLOSE_SQL, reservation_id, status, owner_id)
+    if row is not None:
+        return row
+    reservation = await conn.fetchrow("SELECT status, user_id FROM stock_reservations WHERE id = $1", reservation_id)
+    if reservation is None:
+        raise Exception("Reservation not found")
+    if owner_id is not None and reservation["user_id"] != owner_id:
+        raise ReservationForbidden("Reservation belongs to another user")
+    current = reservation["status"]
+    if current == "ACTIVE":
+        raise Exception("Reservation has expired")
+    raise Exception(f"Reservation is already {current.lower()}")
+
+
+async def commit_reservation(reservation_id: int, user_id: int, owner_id: Optional[int]) -> dict:
+    """
+    Ships the reserved units: stock and reserved quantity drop together and an OUT log row is written.
+    Only the reservation's owner may commit it; `owner_id` None (admins) commits anyone's.
+    """
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            row = await _close(conn, reservation_id, "COMMITTED", owner_id)
+            stock = await conn.fetchval(COMMIT_STOCK_SQL, row["product_id"], row["quantity"], user_id)
+    return {**dict(row), "stock_quantity": stock}
+
+
+async def release_reservation(reservation_id: int, owner_id: Optional[int]) -> dict:
+    """Returns the reserved units to available stock; ownership is checked as in commit_reservation."""
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            row = await _close(conn, reservation_id, "RELEASED", owner_id)
+            await conn.execute(
+                "UPDATE products SET reserved_quantity = reserved_quantity - $2 WHERE id = $1",
+                row["product_id"], row["quantity"]
+            )
+    return dict(row)
+
+
+async def get_reservation(reservation_id: int) -> Optional[dict]:
+    async with db.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT id, product_id, quantity, status, reference, created_at, expires_at
+            FROM stock_reservations WHERE id = $1
+            """,
+            reservation_id
+        )
+    return dict(row) if row is not None else None
+
+
+async def expire_due_reservations(batch_size: int = 500) -> int:
+    """
+    Expires up to `batch_size` of the earliest due reservations in one transaction and
+    returns how many were expired. Products are unlocked in id order, like stock batches.
+    """
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            claimed = await conn.fetch(CLAIM_DUE_SQL, batch_size)
+            if not claimed:
+                return 0
+            released = defaultdict(int)
+            for row in claimed:
+                released[row["product_id"]] += row["quantity"]
+            product_ids = sorted(released)
+            await conn.execute(
+                "SELECT id FROM products WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE", product_ids
+            )
+            await conn.execute(
+                """
+                UPDATE products p
+                SET reserved_quantity = p.reserved_quantity - v.quantity
+                FROM unnest($1::int[], $2::int[]) AS v(id, quantity)
+                WHERE p.id = v.id
+                """,
+                product_ids, [released[product_id] for product_id in product_ids]
+            )
+    return len(claimed)
+
+
+async def next_expiry() -> Optional[datetime]:
+    async with db.acquire() as conn:
+        return await conn.fetchval("SELECT min(expires_at) FROM stock_reservations WHERE status = 'ACTIVE'")
+
+
+async def run_reservation_expiry(batch_size: int, poll_interval: float):
+    """Background loop started by the app: expires due reservations batch by batch."""
+    while True:
+        try:
+            # A full batch means more rows are probably due: go again straight away
+            if await expire_due_reservations(batch_size) == batch_size:
+                await asyncio.sleep(0)
+                continue
+            delay = poll_interval
+            upcoming = await next_expiry()
+            if upcoming is not None:
+                delay = min(delay, max((upcoming - datetime.now(timezone.utc)).total_seconds(), 0.0))
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Reservation expiry failed: {e}")
+            await asyncio.sleep(poll_interval)
+
+
+async def main(args):
+    await Tortoise.init(config=db.tortoise_config())
+    try:
+        total = 0
+        while (expired := await expire_due_reservations(args.batch_size)):
+            total += expired
+    finally:
+        await Tortoise.close_connections()
+    print(f"{total} reservations expired")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
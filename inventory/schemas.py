@@ -1,7 +1,8 @@
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
+from enum import Enum
 
 # --- SUPPLIER SCHEMAS ---
 
@@ -36,17 +37,51 @@ class ProductBase(BaseModel):
     sku: str = Field(..., min_length=3)
     price: Decimal = Field(Decimal("0.00"), ge=0)
     stock_quantity: int = Field(0, ge=0)
+    # Reported under /alerts/low-stock once stock falls to this level
+    reorder_level: Optional[int] = Field(None, ge=0)
 
 class ProductCreate(ProductBase):
     supplier_id: Optional[int] = None
     location_id: Optional[int] = None
 
+# Largest value of a PostgreSQL INT column
+INT_MAX = 2**31 - 1
+
+class ProductImportRow(ProductCreate):
+    # Bulk import rows go to the database unchecked by the ORM, so they carry the column limits
+    name: str = Field(..., min_length=1, max_length=100)
+    sku: str = Field(..., min_length=3, max_length=50)
+    price: Decimal = Field(Decimal("0.00"), ge=0, max_digits=10, decimal_places=2)
+    stock_quantity: int = Field(0, ge=0, le=INT_MAX)
+    reorder_level: Optional[int] = Field(None, ge=0, le=INT_MAX)
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1)
     price: Optional[Decimal] = Field(None, ge=0)
     sku: Optional[str] = Field(None, min_length=3)
     supplier_id: Optional[int] = None
     location_id: Optional[int] = None
+    reorder_level: Optional[int] = Field(None, ge=0)
+
+class ProductBulkUpdateItem(ProductUpdate):
+    # Fields left out keep their current value, as do null ones except reorder_level, which null clears
+    product_id: int
+
+class ProductBulkUpdate(BaseModel):
+    items: list[ProductBulkUpdateItem] = Field(..., min_length=1, max_length=5000)
+    # True: the whole request is rejected if any item fails. False: valid items are applied.
+    atomic: bool = True
+
+class ProductBulkUpdateItemResult(BaseModel):
+    line: int
+    product_id: int
+    success: bool
+    error: Optional[str] = None
+
+class ProductBulkUpdateResponse(BaseModel):
+    updated: int
+    failed: int
+    results: list[ProductBulkUpdateItemResult]
 
 class ProductResponse(ProductBase):
     id: int
@@ -54,6 +89,19 @@ class ProductResponse(ProductBase):
     location: Optional[LocationResponse] = None
     model_config = ConfigDict(from_attributes=True)
 
+class ProductSearchResult(ProductResponse):
+    # Trigram similarity to the query, 0..1 (1 = exact word match)
+    score: float
+
+class LowStockAlertResponse(BaseModel):
+    product_id: int
+    sku: str
+    name: str
+    stock_quantity: int
+    reorder_level: int
+    # When the product fell to its reorder level
+    raised_at: datetime
+
 # --- WAREHOUSE LOG SCHEMAS ---
 
 class WarehouseLogResponse(BaseModel):
@@ -65,3 +113,114 @@ class WarehouseLogResponse(BaseModel):
     user_id: int
     
     model_config = ConfigDict(from_attributes=True)
+
+# --- STOCK ADJUSTMENT SCHEMAS ---
+
+class ActionType(str, Enum):
+    IN = "IN"
+    OUT = "OUT"
+
+class StockAdjustmentLine(BaseModel):
+    product_id: Optional[int] = None
+    sku: Optional[str] = Field(None, min_length=3)
+    amount: int = Field(..., gt=0)
+    action: ActionType
+
+    @model_validator(mode="after")
+    def check_product_reference(self):
+        if (self.product_id is None) == (self.sku is None):
+            raise ValueError("Provide exactly one of product_id or sku")
+        return self
+
+class StockAdjustmentBatch(BaseModel):
+    lines: list[StockAdjustmentLine] = Field(..., min_length=1, max_length=5000)
+    # True: the whole batch is rejected if any line fails. False: valid lines are applied.
+    atomic: bool = True
+
+class StockAdjustmentLineResult(BaseModel):
+    line: int
+    product_id: Optional[int] = None
+    success: bool
+    new_quantity: Optional[int] = None
+    error: Optional[str] = None
+
+class StockAdjustmentBatchResponse(BaseModel):
+    applied: int
+    failed: int
+    results: list[StockAdjustmentLineResult]
+
+# --- RESERVATION SCHEMAS ---
+
+class ReservationStatus(str, Enum):
+    ACTIVE = "ACTIVE"
+    COMMITTED = "COMMITTED"
+    RELEASED = "RELEASED"
+    EXPIRED = "EXPIRED"
+
+class ReservationCreate(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+    # Seconds the units are held; defaults to WMS_RESERVATION_TTL
+    ttl_seconds: Optional[int] = Field(None, gt=0)
+    reference: Optional[str] = Field(None, max_length=100, description="Order or pick list the units are held for")
+
+class ReservationResponse(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    status: ReservationStatus
+    reference: Optional[str] = None
+    created_at: datetime
+    expires_at: datetime
+    # Product stock left for other orders right after the reservation was made
+    available: Optional[int] = None
+
+# --- PICKING SCHEMAS ---
+
+class PickOrderLine(BaseModel):
+    order_id: str = Field(..., min_length=1, max_length=100)
+    product_id: Optional[int] = None
+    sku: Optional[str] = Field(None, min_length=3)
+    quantity: int = Field(..., gt=0)
+
+    @model_validator(mode="after")
+    def check_product_reference(self):
+        if (self.product_id is None) == (self.sku is None):
+            raise ValueError("Provide exactly one of product_id or sku")
+        return self
+
+class PickWaveRequest(BaseModel):
+    lines: list[PickOrderLine] = Field(..., min_length=1, max_length=50000)
+    # Orders are never split across waves; a wave closes at whichever limit is hit first
+    max_orders_per_wave: int = Field(20, ge=1, le=1000)
+    max_lines_per_wave: Optional[int] = Field(None, ge=1)
+
+class PickItem(BaseModel):
+    product_id: int
+    sku: str
+    quantity: int
+    # Units of this pick going to each order, for sorting at the pack station
+    orders: dict[str, int]
+
+class PickStop(BaseModel):
+    step: int
+    location_id: int
+    zone_name: str
+    shelf_number: int
+    picks: list[PickItem]
+
+class PickWave(BaseModel):
+    wave: int
+    orders: list[str]
+    lines: int
+    units: int
+    route: list[PickStop]
+
+class UnplannedPickLine(BaseModel):
+    line: int
+    order_id: str
+    error: str
+
+class PickWavePlan(BaseModel):
+    waves: list[PickWave]
+    unplanned: list[UnplannedPickLine]
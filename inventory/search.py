@@ -0,0 +1,153 @@
+"""
+Typo-tolerant, ranked product search over name and SKU.
+
+On PostgreSQL with pg_trgm, matching runs in SQL through the trigram GIN indexes
+created in inventory/ddl.py (word_similarity, so a partial or misspelt word still
+matches a longer name). Without pg_trgm (SQLite, or a server lacking the contrib
+extension) the same trigram scoring runs on an in-process n-gram index.
+"""
+import asyncio
+import heapq
+import re
+import time
+from collections import Counter
+from typing import Optional
+
+from tortoise import Tortoise
+
+from settings import settings
+
+# Deepest result reachable through pagination; ranked search is for finding, not exporting
+MAX_SEARCH_RESULTS = 1000
+
+TRIGRAM_SEARCH_SQL = """
+    SELECT id, greatest(word_similarity($1, name), word_similarity($1, sku)) AS score
+    FROM products
+    WHERE $1 <% name OR $1 <% sku
+    ORDER BY score DESC, id
+    LIMIT $2 OFFSET $3
+"""
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams the way pg_trgm builds them: lower-cased words padded with two spaces before, one after."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NGramIndex:
+    """
+    In-process trigram postings for product name and SKU, used when pg_trgm is not available.
+    Scores approximate pg_trgm word_similarity: the share of the query's trigrams found in the field.
+    Kept current by this worker's product writes and rebuilt after `ttl` seconds to pick up others'.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._postings: dict[str, dict[str, set[int]]] = {"name": {}, "sku": {}}
+        self._documents: dict[int, dict[str, set[str]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self) -> None:
+        rows = await Tortoise.get_connection("default").execute_query_dict("SELECT id, name, sku FROM products")
+        self._postings = {"name": {}, "sku": {}}
+        self._documents = {}
+        for row in rows:
+            self._add(row["id"], row["name"], row["sku"])
+        self._loaded_at = time.monotonic()
+
+    async def ensure_loaded(self) -> None:
+        """Loads the catalog unless a fresh copy is in memory; concurrent callers share one load."""
+        if self.loaded:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another caller may have finished loading while this one waited
+            if not self.loaded:
+                await self.load()
+
+    def _add(self, product_id: int, name: str, sku: str) -> None:
+        document = {"name": trigrams(name), "sku": trigrams(sku)}
+        self._documents[product_id] = document
+        for field, grams in document.items():
+            postings = self._postings[field]
+            for gram in grams:
+                postings.setdefault(gram, set()).add(product_id)
+
+    def add(self, product_id: int, name: str, sku: str) -> None:
+        if self._loaded_at is not None:
+            self.remove(product_id)
+            self._add(product_id, name, sku)
+
+    def remove(self, product_id: int) -> None:
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for field, grams in document.items():
+            for gram in grams:
+                self._postings[field][gram].discard(product_id)
+
+    def clear(self) -> None:
+        self._loaded_at = None
+        self._postings = {"name": {}, "sku": {}}
+        self._documents = {}
+
+    def search(self, query: str, threshold: float, limit: int) -> list[tuple[int, float]]:
+        """The best `limit` (id, score) pairs scoring at least `threshold`, best first."""
+        wanted = trigrams(query)
+        if not wanted:
+            return []
+        scores: dict[int, float] = {}
+        for field, postings in self._postings.items():
+            hits = Counter()
+            for gram in wanted:
+                hits.update(postings.get(gram, ()))
+            for product_id, count in hits.items():
+                score = count / len(wanted)
+                if score >= threshold and score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+ngram_index = NGramIndex()
+_trigram_support: dict[str, bool] = {}
+
+
+async def trigram_search_available() -> bool:
+    """True when the database can rank matches itself (PostgreSQL with pg_trgm installed)."""
+    conn = Tortoise.get_connection("default")
+    dialect = conn.capabilities.dialect
+    if dialect not in _trigram_support:
+        available = False
+        if dialect == "postgres":
+            rows = await conn.execute_query_dict("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            available = bool(rows)
+        _trigram_support[dialect] = available
+    return _trigram_support[dialect]
+
+
+async def search_products(query: str, limit: int, offset: int = 0) -> list[tuple[int, float]]:
+    """Ranked (product id, score) pairs for one page of results."""
+    threshold = settings.search_similarity_threshold
+    if await trigram_search_available():
+        conn = Tortoise.get_connection("default")
+        async with conn.acquire_connection() as raw_conn:
+            async with raw_conn.transaction():
+                # <% filters with this threshold; SET LOCAL ends with the transaction
+                await raw_conn.execute(f"SET LOCAL pg_trgm.word_similarity_threshold = {float(threshold)}")
+                rows = await raw_conn.fetch(TRIGRAM_SEARCH_SQL, query, limit, offset)
+        return [(row["id"], row["score"]) for row in rows]
+
+    await ngram_index.ensure_loaded()
+    return ngram_index.search(query, threshold, offset + limit)[offset:]
@@ -1,54 +1,308 @@
+from datetime import datetime
+from typing import Optional
+
 from tortoise import Tortoise
 from tortoise.transactions import in_transaction
-from .model import Product, WarehouseLog
+from .model import Product
+from .group_commit import group_committer
+from .sku_index import sku_index
+from .search import ngram_index
+from settings import settings
 from user.model import User
 
+class BatchAdjustmentError(Exception):
+    """Raised by an all-or-nothing batch when at least one line cannot be applied."""
+
+    def __init__(self, results: list[dict]):
+        super().__init__("Batch rejected: one or more lines failed")
+        self.results = results
+
+
+class BulkUpdateError(Exception):
+    """Raised by an all-or-nothing bulk product update when at least one item is invalid."""
+
+    def __init__(self, results: list[dict]):
+        super().__init__("Bulk update rejected: one or more items failed")
+        self.results = results
+
+
 class WarehouseService:
 
-    staticmethod
-    async def adjust_stock(product_id: int, user: User, amount: int, action: str):
+    # Stock change and audit row are written by one statement: the conditional UPDATE
+    # is the row lock and the oversell guard, the INSERT only sees rows it returned.
+    # OUT only draws on available stock: units held by reservations stay put.
+    # Log rows are stamped with clock_timestamp() (taken after the products lock is held,
+    # unlike now()) so they order correctly against stock snapshots, see inventory/snapshots.py.
+    ADJUST_STOCK_SQL = """
+        WITH updated AS (
+            UPDATE products
+            SET stock_quantity = stock_quantity + $1
+            WHERE id = $2 AND stock_quantity - reserved_quantity + $1 >= 0 AND ($5::text IS NULL OR sku = $5)
+            RETURNING id, stock_quantity
+        ), logged AS (
+            INSERT INTO warehouse_logs (action_type, quantity_change, created_at, user_id, product_id)
+            SELECT $3, $1, clock_timestamp(), $4, id FROM updated
+        )
+        SELECT id, stock_quantity FROM updated
+    """
+
+    @staticmethod
+    async def adjust_stock(product_id: int, user: User, amount: int, action: str, sku: Optional[str] = None):
+        """
+        Handles stock level updates and logging within a single atomic statement.
+        The update is conditional, so concurrent OUT requests can never oversell.
+        With `sku`, the product must still carry that SKU (guards ids taken from the SKU index).
+        Returns a dict with the product id and its new stock_quantity.
+        In group commit mode the adjustment is queued and written together with concurrent
+        ones in a separate transaction, so it does not join an outer in_transaction().
+        """
+        action = action.upper()
+        if amount <= 0:
+            raise Exception("Amount must be a positive number")
+        quantity_change = amount if action == "IN" else -amount
+
+        if settings.adjust_commit_mode == "group":
+            return await group_committer.submit(product_id, user.id, quantity_change, action, sku)
+
+        # A single statement is atomic on its own, so no BEGIN/COMMIT round trips are needed.
+        # Inside an outer in_transaction() this resolves to the transaction's connection.
+        conn = Tortoise.get_connection("default")
+        rows = await conn.execute_query_dict(
+            WarehouseService.ADJUST_STOCK_SQL,
+            [quantity_change, product_id, action, user.id, sku]
+        )
+        if rows:
+            return rows[0]
+
+        # Nothing was updated: tell a missing product apart from a stock shortage
+        filters = {"id": product_id} if sku is None else {"id": product_id, "sku": sku}
+        if not await Product.filter(**filters).using_db(conn).exists():
+            raise Exception("Product not found")
+        raise Exception("Not enough stock available")
+
+    @staticmethod
+    async def adjust_stock_by_sku(sku: str, user: User, amount: int, action: str):
+        """
+        adjust_stock for a scanned SKU, resolved through the in-process SKU index.
+        A stale index entry (SKU moved or deleted by another worker) is refreshed and retried once.
+        """
+        product_id = await sku_index.resolve(sku)
+        if product_id is None:
+            raise Exception("Product not found")
+        try:
+            return await WarehouseService.adjust_stock(product_id, user, amount, action, sku=sku)
+        except Exception as e:
+            if str(e) != "Product not found":
+                raise
+            fresh_id = await sku_index.refresh(sku)
+            if fresh_id is None or fresh_id == product_id:
+                raise
+            return await WarehouseService.adjust_stock(fresh_id, user, amount, action, sku=sku)
+
+    @staticmethod
+    async def _write_adjustments(conn, stock: dict, actions: list, changes: list, products: list, users: list):
+        """
+        Writes already validated adjustments with two set-based statements: the final
+        quantity of each touched product, then one log row per adjustment.
+        The caller holds the row locks and owns the transaction.
+        """
+        touched = sorted(set(products))
+        await conn.execute_query(
+            """
+            UPDATE products p
+            SET stock_quantity = v.stock_quantity
+            FROM unnest($1::int[], $2::int[]) AS v(id, stock_quantity)
+            WHERE p.id = v.id
+            """,
+            [touched, [stock[product_id] for product_id in touched]]
+        )
+        await conn.execute_query(
+            """
+            INSERT INTO warehouse_logs (action_type, quantity_change, created_at, user_id, product_id)
+            SELECT v.action_type, v.quantity_change, clock_timestamp(), v.user_id, v.product_id
+            FROM unnest($1::text[], $2::int[], $3::int[], $4::int[]) AS v(action_type, quantity_change, product_id, user_id)
+            """,
+            [actions, changes, products, users]
+        )
+
+    @staticmethod
+    async def adjust_stock_batch(lines: list, user: User, atomic: bool = True):
+        """
+        Applies many stock adjustments in one transaction with set-based statements.
+        Rows are locked in id order, so concurrent batches cannot deadlock each other.
+        Lines are evaluated in request order against the locked quantities.
+        Returns one result dict per line; raises BatchAdjustmentError in atomic mode.
+        """
+        product_ids = list({line.product_id for line in lines if line.product_id is not None})
+        skus = list({line.sku for line in lines if line.sku is not None})
+
+        async with in_transaction() as conn:
+            locked = await conn.execute_query_dict(
+                """
+                SELECT id, sku, stock_quantity, reserved_quantity
+                FROM products
+                WHERE id = ANY($1::int[]) OR sku = ANY($2::text[])
+                ORDER BY id
+                FOR UPDATE
+                """,
+                [product_ids, skus]
+            )
+            stock = {row["id"]: row["stock_quantity"] for row in locked}
+            reserved = {row["id"]: row["reserved_quantity"] for row in locked}
+            id_by_sku = {row["sku"]: row["id"] for row in locked}
+
+            results = []
+            log_actions, log_changes, log_products = [], [], []
+            for index, line in enumerate(lines):
+                product_id = line.product_id if line.product_id is not None else id_by_sku.get(line.sku)
+                result = {"line": index, "product_id": product_id, "success": False}
+                results.append(result)
+
+                if product_id not in stock:
+                    result["error"] = "Product not found"
+                    continue
+
+                change = line.amount if line.action.value == "IN" else -line.amount
+                if stock[product_id] - reserved[product_id] + change < 0:
+                    result["error"] = "Not enough stock available"
+                    continue
+
+                stock[product_id] += change
+                result["success"] = True
+                result["new_quantity"] = stock[product_id]
+                log_actions.append(line.action.value)
+                log_changes.append(change)
+                log_products.append(product_id)
+
+            if atomic and len(log_products) != len(lines):
+                raise BatchAdjustmentError(results)
+
+            if log_products:
+                await WarehouseService._write_adjustments(
+                    conn, stock, log_actions, log_changes, log_products, [user.id] * len(log_products)
+                )
+
+        return results
+
+    @staticmethod
+    async def bulk_update_products(items: list, atomic: bool = True):
         """
-        Handles stock level updates and logging within a single atomic transaction.
-        The using_db(conn) calls ensure all operations stay within the transaction context.
+        Applies many partial product updates in one transaction.
+        Referenced suppliers, locations and new SKUs are checked with one query each, then
+        every valid item is written by a single UPDATE ... FROM unnest(...).
+        Returns one result dict per item; raises BulkUpdateError in atomic mode.
         """
+        product_ids = list({item.product_id for item in items})
+        supplier_ids = list({item.supplier_id for item in items if item.supplier_id is not None})
+        location_ids = list({item.location_id for item in items if item.location_id is not None})
+        new_skus = list({item.sku for item in items if item.sku is not None})
+
         async with in_transaction() as conn:
-            # Fetch product instance using the active transaction connection
-            product = await Product.get(id=product_id).using_db(conn)
-            
-            # Update quantity based on action type
-            if action.upper() == "OUT":
-                if product.stock_quantity < amount:
-                    raise Exception("Not enough stock available")
-                product.stock_quantity -= amount
-            else:
-                product.stock_quantity += amount
-
-            # Persist changes to the product table
-            await product.save(using_db=conn)
-            
-            # Create an audit log entry linked to the user and product
-            await WarehouseLog.create(
-                action_type=action.upper(),
-                quantity_change=amount if action.upper() == "IN" else -amount,
-                product=product,
-                user=user,
-                using_db=conn
+            locked = await conn.execute_query_dict(
+                "SELECT id, sku FROM products WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE",
+                [product_ids]
             )
-            return product
+            current_sku = {row["id"]: row["sku"] for row in locked}
+            suppliers = {row["id"] for row in await conn.execute_query_dict(
+                "SELECT id FROM suppliers WHERE id = ANY($1::int[])", [supplier_ids]
+            )}
+            locations = {row["id"] for row in await conn.execute_query_dict(
+                "SELECT id FROM locations WHERE id = ANY($1::int[])", [location_ids]
+            )}
+            sku_owner = {row["sku"]: row["id"] for row in await conn.execute_query_dict(
+                "SELECT id, sku FROM products WHERE sku = ANY($1::text[])", [new_skus]
+            )}
+
+            results = []
+            valid = []
+            seen_products = set()
+            for index, item in enumerate(items):
+                result = {"line": index, "product_id": item.product_id, "success": False}
+                results.append(result)
+
+                if item.product_id not in current_sku:
+                    result["error"] = "Product not found"
+                elif item.product_id in seen_products:
+                    result["error"] = "Product appears more than once in the request"
+                elif item.supplier_id is not None and item.supplier_id not in suppliers:
+                    result["error"] = "Supplier not found"
+                elif item.location_id is not None and item.location_id not in locations:
+                    result["error"] = "Location not found"
+                elif item.sku is not None and sku_owner.get(item.sku, item.product_id) != item.product_id:
+                    result["error"] = "SKU already in use"
+                else:
+                    result["success"] = True
+                    seen_products.add(item.product_id)
+                    if item.sku is not None:
+                        # Later items in the request may not take this SKU either
+                        sku_owner[item.sku] = item.product_id
+                    valid.append(item)
+
+            if atomic and len(valid) != len(items):
+                raise BulkUpdateError(results)
+
+            updated = []
+            if valid:
+                columns = ("product_id", "name", "price", "sku", "supplier_id", "location_id", "reorder_level")
+                # reorder_level is nullable: an explicit null clears it, as in the single PATCH
+                reorder_level_set = ["reorder_level" in item.model_fields_set for item in valid]
+                updated = await conn.execute_query_dict(
+                    """
+                    UPDATE products p
+                    SET name = COALESCE(v.name, p.name),
+                        price = COALESCE(v.price, p.price),
+                        sku = COALESCE(v.sku, p.sku),
+                        supplier_id = COALESCE(v.supplier_id, p.supplier_id),
+                        location_id = COALESCE(v.location_id, p.location_id),
+                        reorder_level = CASE WHEN v.reorder_level_set THEN v.reorder_level ELSE p.reorder_level END
+                    FROM unnest($1::int[], $2::text[], $3::numeric[], $4::text[], $5::int[], $6::int[], $7::int[], $8::bool[])
+                        AS v(id, name, price, sku, supplier_id, location_id, reorder_level, reorder_level_set)
+                    WHERE p.id = v.id
+                    RETURNING p.id, p.name, p.sku
+                    """,
+                    [[getattr(item, column) for item in valid] for column in columns] + [reorder_level_set]
+                )
+
+        # Only after commit: keep this worker's lookup indexes in step with the new names and SKUs
+        for row in updated:
+            if row["sku"] != current_sku[row["id"]]:
+                sku_index.discard(current_sku[row["id"]])
+                sku_index.add(row["sku"], row["id"])
+            ngram_index.add(row["id"], row["name"], row["sku"])
+        return results
 
     @staticmethod
-    async def get_inventory_report():
+    async def get_inventory_report(
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        product_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        prefetch: int = 500
+    ):
         """
         Server-side cursor implementation using raw asyncpg.
-        This streams rows one by one from PostgreSQL.
+        This streams rows from PostgreSQL, `prefetch` rows per network round trip.
+        Filters are pushed into the SQL so only matching log rows leave the database.
         """
+        conditions, params = [], []
+        for clause, value in (
+            ("l.created_at >= ${}", date_from),
+            ("l.created_at < ${}", date_to),
+            ("l.product_id = ${}", product_id),
+            ("l.user_id = ${}", user_id),
+        ):
+            if value is not None:
+                params.append(value)
+                conditions.append(clause.format(len(params)))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
         conn = Tortoise.get_connection("default")
         
         # raw asyncpg connection 
         async with conn.acquire_connection() as raw_conn:
             async with raw_conn.transaction():
                 # define serwer iterator
-                query = """
+                query = f"""
                     SELECT 
                         l.created_at, 
                         l.quantity_change, 
@@ -58,30 +312,107 @@ class WarehouseService:
                     FROM warehouse_logs l
                     JOIN products p ON l.product_id = p.id
                     JOIN users u ON l.user_id = u.id
+                    {where}
                     ORDER BY l.created_at DESC
                 """
-                async for record in raw_conn.cursor(query):
+                async for record in raw_conn.cursor(query, *params, prefetch=prefetch):
+                    yield record
+
+    # Per product: start from the latest snapshot at or before the requested time and add
+    # the logged changes since, or else from the next snapshot (or the live stock) and
+    # subtract the changes in between. Either way only one snapshot interval of log rows
+    # is read, through the (product_id, created_at) index.
+    STOCK_AS_OF_SQL = """
+        SELECT p.id AS product_id, p.sku, p.name,
+               CASE WHEN before.taken_at IS NOT NULL THEN
+                   before.stock_quantity + COALESCE((
+                       SELECT sum(l.quantity_change) FROM warehouse_logs l
+                       WHERE l.product_id = p.id AND l.created_at >= before.taken_at AND l.created_at <= $1
+                   ), 0)
+               ELSE
+                   COALESCE(after.stock_quantity, p.stock_quantity) - COALESCE((
+                       SELECT sum(l.quantity_change) FROM warehouse_logs l
+                       WHERE l.product_id = p.id AND l.created_at > $1
+                         AND (after.taken_at IS NULL OR l.created_at < after.taken_at)
+                   ), 0)
+               END AS stock_quantity,
+               COALESCE(before.taken_at, after.taken_at) AS snapshot_at
+        FROM products p
+        LEFT JOIN LATERAL (
+            SELECT s.taken_at, s.stock_quantity FROM stock_snapshots s
+            WHERE s.product_id = p.id AND s.taken_at <= $1
+            ORDER BY s.taken_at DESC LIMIT 1
+        ) before ON true
+        LEFT JOIN LATERAL (
+            SELECT s.taken_at, s.stock_quantity FROM stock_snapshots s
+            WHERE s.product_id = p.id AND s.taken_at > $1 AND before.taken_at IS NULL
+            ORDER BY s.taken_at LIMIT 1
+        ) after ON true
+        {where}
+        ORDER BY p.id
+    """
+
+    @staticmethod
+    async def get_stock_as_of(
+        at: datetime,
+        product_id: Optional[int] = None,
+        sku: Optional[str] = None,
+        prefetch: int = 500
+    ):
+        """
+        Streams the stock of every product (or the one matching product_id / sku) as it was at `at`.
+        snapshot_at is the snapshot the value was derived from; None means the live stock.
+        Products carry no creation time, so one created after `at` shows its initial stock.
+        """
+        conditions, params = [], [at]
+        for clause, value in (("p.id = ${}", product_id), ("p.sku = ${}", sku)):
+            if value is not None:
+                params.append(value)
+                conditions.append(clause.format(len(params)))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = WarehouseService.STOCK_AS_OF_SQL.format(where=where)
+
+        conn = Tortoise.get_connection("default")
+        async with conn.acquire_connection() as raw_conn:
+            async with raw_conn.transaction():
+                async for record in raw_conn.cursor(query, *params, prefetch=prefetch):
                     yield record
 
     @staticmethod
     async def get_supplier_valuation_report():
         """
-        Executes a raw SQL query to perform server-side data aggregation.
-        Calculates total stock value by joining products and suppliers with GROUP BY.
+        Reads the per-supplier aggregates kept up to date by the products trigger.
+        Costs O(suppliers) instead of a full scan and GROUP BY over products.
         """
         connection = Tortoise.get_connection("default")
         
         sql_query = """
             SELECT s.name AS supplier_name, 
-                   COUNT(p.id) AS unique_products, 
-                   SUM(p.stock_quantity) AS total_units,
-                   SUM(p.price * p.stock_quantity) AS total_valuation
-            FROM suppliers s
-            LEFT JOIN products p ON s.id = p.supplier_id
-            GROUP BY s.name
-            HAVING SUM(p.stock_quantity) > 0
-            ORDER BY total_valuation DESC
+                   v.unique_products, 
+                   v.total_units,
+                   v.total_valuation
+            FROM supplier_valuations v
+            JOIN suppliers s ON s.id = v.supplier_id
+            WHERE v.total_units > 0
+            ORDER BY v.total_valuation DESC
         """
         
         # Returns raw query results as a list of dictionaries
         return await connection.execute_query_dict(sql_query)
+
+    @staticmethod
+    async def get_low_stock_alerts():
+        """
+        Products at or below their reorder level, oldest alert first.
+        Reads the alert rows kept by the products trigger and joins their products by
+        primary key, so the cost is O(alerts) whatever the catalog size.
+        """
+        connection = Tortoise.get_connection("default")
+        return await connection.execute_query_dict(
+            """
+            SELECT p.id AS product_id, p.sku, p.name, p.stock_quantity, p.reorder_level, a.raised_at
+            FROM low_stock_alerts a
+            JOIN products p ON p.id = a.product_id
+            ORDER BY a.raised_at, p.id
+            """
+        )
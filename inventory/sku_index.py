@@ -0,0 +1,70 @@
+import asyncio
+from typing import Iterable, Optional
+
+from tortoise import Tortoise
+
+
+class SkuIndex:
+    """
+    In-process SKU -> product id map, so a barcode scan resolves without a catalog query.
+    Loaded lazily with one query and kept in step by the product write paths of this
+    worker. Writes made by other workers are not seen, so callers must treat an id as
+    a hint: readers check the SKU of the row they fetch and refresh() on a mismatch.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._loaded = False
+        self._lock = None
+
+    async def _load(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._loaded:
+                return
+            rows = await Tortoise.get_connection("default").execute_query_dict("SELECT id, sku FROM products")
+            self._ids = {row["sku"]: row["id"] for row in rows}
+            self._loaded = True
+
+    async def resolve(self, sku: str) -> Optional[int]:
+        """Product id for `sku`; unknown SKUs fall back to the database (created by another worker)."""
+        if not self._loaded:
+            await self._load()
+        product_id = self._ids.get(sku)
+        if product_id is None:
+            product_id = await self.refresh(sku)
+        return product_id
+
+    async def refresh(self, sku: str) -> Optional[int]:
+        """Re-reads one SKU from the database and fixes the index entry."""
+        rows = await Tortoise.get_connection("default").execute_query_dict(
+            "SELECT id FROM products WHERE sku = $1", [sku]
+        )
+        if not rows:
+            self._ids.pop(sku, None)
+            return None
+        self._ids[sku] = rows[0]["id"]
+        return rows[0]["id"]
+
+    def add(self, sku: str, product_id: int) -> None:
+        if self._loaded:
+            self._ids[sku] = product_id
+
+    def update(self, pairs: Iterable[tuple[str, int]]) -> None:
+        if self._loaded:
+            self._ids.update(pairs)
+
+    def discard(self, sku: str) -> None:
+        self._ids.pop(sku, None)
+
+    def clear(self) -> None:
+        """Drops the index; the next lookup reloads it."""
+        self._ids = {}
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+sku_index = SkuIndex()
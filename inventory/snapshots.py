@@ -0,0 +1,103 @@
+"""
+Periodic stock snapshots for point-in-time stock queries.
+
+A snapshot copies stock_quantity of every product into stock_snapshots under one
+timestamp. "Stock of X at D" is then the nearest snapshot plus the warehouse_logs
+deltas between the two, so a query reads at most one snapshot interval of log rows.
+Snapshots older than WMS_STOCK_SNAPSHOT_RETENTION_DAYS are pruned by the scheduler.
+
+    python -m inventory.snapshots
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from tortoise import Tortoise
+
+import db
+
+SNAPSHOT_SQL = """
+    INSERT INTO stock_snapshots (taken_at, product_id, stock_quantity)
+    SELECT $1, id, stock_quantity FROM products
+"""
+
+
+async def take_stock_snapshot() -> dict:
+    """Records the current stock of every product; returns the snapshot time and row count."""
+    async with db.acquire() as fence, db.acquire() as conn:
+        copy = conn.transaction(isolation="repeatable_read")
+        async with fence.transaction(isolation="repeatable_read"):
+            # SHARE mode waits for in-flight stock writers to commit, so every log row stamped
+            # before taken_at is in the MVCC snapshot taken right after and every later one is
+            # not. New writers are only held back until the copy has imported that snapshot,
+            # not while it reads the whole catalog.
+            await fence.execute("LOCK TABLE products IN SHARE MODE")
+            taken_at = await fence.fetchval("SELECT clock_timestamp()")
+            snapshot_id = await fence.fetchval("SELECT pg_export_snapshot()")
+            await copy.start()
+            await conn.execute(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+        try:
+            status = await conn.execute(SNAPSHOT_SQL, taken_at)
+        except BaseException:
+            await copy.rollback()
+            raise
+        await copy.commit()
+    return {"taken_at": taken_at, "products": int(status.split()[-1])}
+
+
+async def last_snapshot_at() -> Optional[datetime]:
+    async with db.acquire() as conn:
+        return await conn.fetchval("SELECT max(taken_at) FROM stock_snapshots")
+
+
+async def prune_stock_snapshots(older_than: datetime) -> int:
+    """
+    Deletes snapshots taken before `older_than`, always keeping the newest one before
+    it so queries for older dates still start from a nearby snapshot.
+    """
+    async with db.acquire() as conn:
+        status = await conn.execute(
+            """
+            DELETE FROM stock_snapshots
+            WHERE taken_at < (SELECT max(taken_at) FROM stock_snapshots WHERE taken_at < $1)
+            """,
+            older_than,
+        )
+    return int(status.split()[-1])
+
+
+async def run_snapshot_scheduler(interval: float, retention_days: int = 0):
+    """
+    Background loop started by the app: takes a snapshot every `interval` seconds,
+    counted from the last snapshot in the database so restarts keep the cadence.
+    """
+    taken_at = None
+    while True:
+        try:
+            # An empty catalog leaves no rows behind: fall back to our own last snapshot time
+            last = await last_snapshot_at() or taken_at
+            if last is not None:
+                elapsed = (datetime.now(timezone.utc) - last).total_seconds()
+                if elapsed < interval:
+                    await asyncio.sleep(interval - elapsed)
+            taken_at = (await take_stock_snapshot())["taken_at"]
+            if retention_days:
+                await prune_stock_snapshots(datetime.now(timezone.utc) - timedelta(days=retention_days))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Stock snapshot failed: {e}")
+            await asyncio.sleep(min(interval, 60))
+
+
+async def main():
+    await Tortoise.init(config=db.tortoise_config())
+    try:
+        snapshot = await take_stock_snapshot()
+    finally:
+        await Tortoise.close_connections()
+    print(f"snapshot of {snapshot['products']} products taken at {snapshot['taken_at'].isoformat()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+# How many rows are encoded together before a chunk is handed to the HTTP response
+CHUNK_ROWS = 500
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class StreamFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+async def encode_rows(rows, fmt: StreamFormat, fields: list[str], chunk_rows: int = CHUNK_ROWS):
+    """
+    Encodes an async iterator of dicts as JSON array, NDJSON or CSV chunks.
+    Only one chunk is held in memory at a time, whatever the number of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == StreamFormat.CSV else None
+    if writer:
+        writer.writerow(fields)
+    elif fmt == StreamFormat.JSON:
+        buffer.write("[")
+
+    pending = 0
+    first = True
+    async for row in rows:
+        if writer:
+            writer.writerow([_cell(row[field]) for field in fields])
+        elif fmt == StreamFormat.NDJSON:
+            buffer.write(json.dumps(row, default=_default))
+            buffer.write("\n")
+        else:
+            if not first:
+                buffer.write(",")
+            buffer.write(json.dumps(row, default=_default))
+        first = False
+
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if fmt == StreamFormat.JSON:
+        buffer.write("]")
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,86 @@
+"""
+Consistency check for the supplier_valuations aggregate store.
+
+    python -m inventory.valuation            # report drift, exit 1 if any
+    python -m inventory.valuation --repair   # rebuild the store from products
+"""
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from db import tortoise_config
+
+# Aggregates recomputed from scratch, compared with what the trigger maintained
+DRIFT_SQL = """
+    WITH actual AS (
+        SELECT supplier_id,
+               COUNT(*) AS unique_products,
+               SUM(stock_quantity) AS total_units,
+               SUM(price * stock_quantity) AS total_valuation
+        FROM products
+        WHERE supplier_id IS NOT NULL
+        GROUP BY supplier_id
+    )
+    SELECT COALESCE(a.supplier_id, v.supplier_id) AS supplier_id,
+           v.unique_products AS stored_products, COALESCE(a.unique_products, 0) AS actual_products,
+           v.total_units AS stored_units, COALESCE(a.total_units, 0) AS actual_units,
+           v.total_valuation AS stored_valuation, COALESCE(a.total_valuation, 0) AS actual_valuation
+    FROM actual a
+    FULL OUTER JOIN supplier_valuations v ON v.supplier_id = a.supplier_id
+    WHERE (v.unique_products, v.total_units, v.total_valuation) IS DISTINCT FROM
+          (COALESCE(a.unique_products, 0), COALESCE(a.total_units, 0), COALESCE(a.total_valuation, 0))
+    ORDER BY 1
+"""
+
+REBUILD_SQL = """
+    DELETE FROM supplier_valuations;
+    INSERT INTO supplier_valuations (supplier_id, unique_products, total_units, total_valuation)
+    SELECT supplier_id, COUNT(*), SUM(stock_quantity), SUM(price * stock_quantity)
+    FROM products
+    WHERE supplier_id IS NOT NULL
+    GROUP BY supplier_id;
+"""
+
+
+async def check_supplier_valuations(repair: bool = False) -> list[dict]:
+    """
+    Returns every supplier whose stored aggregates differ from a full recount.
+    With repair=True, product writes are blocked while the store is rebuilt.
+    """
+    async with in_transaction() as conn:
+        if repair:
+            # SHARE mode waits for in-flight product writes and holds off new ones
+            await conn.execute_script("LOCK TABLE products IN SHARE MODE")
+        drift = await conn.execute_query_dict(DRIFT_SQL)
+        if repair and drift:
+            await conn.execute_script(REBUILD_SQL)
+    return drift
+
+
+async def main(repair: bool):
+    await Tortoise.init(config=tortoise_config())
+    try:
+        drift = await check_supplier_valuations(repair=repair)
+    finally:
+        await Tortoise.close_connections()
+
+    for row in drift:
+        print(
+            f"supplier {row['supplier_id']}: "
+            f"products {row['stored_products']} -> {row['actual_products']}, "
+            f"units {row['stored_units']} -> {row['actual_units']}, "
+            f"valuation {row['stored_valuation']} -> {row['actual_valuation']}"
+        )
+    if not drift:
+        print("Supplier valuations are consistent.")
+    elif repair:
+        print(f"Rebuilt supplier valuations ({len(drift)} suppliers drifted).")
+    raise SystemExit(1 if drift and not repair else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="rebuild the store when drift is found")
+    asyncio.run(main(parser.parse_args().repair))
@@ -0,0 +1,55 @@
+"""
+Background jobs that must run in only one process of the deployment at a time.
+
+Log partition archiving and stock snapshots would trip over each other if every worker
+ran them: concurrent archives of the same partition, one full-catalog snapshot per
+worker. Every worker calls run_as_leader(); the one holding the PostgreSQL advisory
+lock BACKGROUND_JOBS_LOCK_KEY runs the jobs, the others retry every `retry_interval`
+seconds. The lock is a session lock on a dedicated connection outside the shared pool,
+so it is released when the leader exits or its connection drops, and another worker
+takes over on its next try.
+"""
+import asyncio
+from typing import Awaitable, Callable
+
+import asyncpg
+from tortoise import Tortoise
+
+# Not bootstrap.ADVISORY_LOCK_KEY: startup tasks must not wait for a running leader
+BACKGROUND_JOBS_LOCK_KEY = 0x574D54
+
+
+async def run_as_leader(jobs: list[Callable[[], Awaitable]], retry_interval: float = 30.0,
+                        key: int = BACKGROUND_JOBS_LOCK_KEY):
+    """
+    Background loop started by the app: waits until this process holds the lock, then runs
+    every job as a task until the lock connection is lost. Cancelling it stops the jobs.
+    """
+    client = Tortoise.get_connection("default")
+    while True:
+        connection = None
+        tasks = []
+        try:
+            connection = await asyncpg.connect(
+                host=client.host, port=client.port, user=client.user,
+                password=client.password, database=client.database,
+            )
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda connection: lost.set())
+            while not await connection.fetchval("SELECT pg_try_advisory_lock($1)", key):
+                await asyncio.sleep(retry_interval)
+            tasks = [asyncio.create_task(job()) for job in jobs]
+            await lost.wait()
+            print("Background jobs lock connection lost, stopping the jobs")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Background jobs election failed: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Closing the session releases the lock for the other workers
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(retry_interval)
@@ -0,0 +1,290 @@
+"""
+Minimal in-process Prometheus instrumentation.
+
+Request latency per route, in-flight requests and database query timings are
+collected with plain dicts and bisect (no locks: everything runs on the event loop)
+and rendered in the Prometheus text exposition format at GET /metrics.
+
+With several workers a scrape reaches only one of them, so each worker also writes a
+snapshot of its metrics to WMS_METRICS_DIR every few seconds (python application.py
+sets up a temporary one). Whichever worker is scraped renders all snapshots: counters
+and histograms summed over the workers, gauges per worker under a "worker" label.
+"""
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> dict:
+        return dict(self._values)
+
+    def merge(self, samples: dict, labels: tuple, value) -> None:
+        samples[labels] = samples.get(labels, 0) + value
+
+    def render(self, samples: Optional[dict] = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in (self._values if samples is None else samples).items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), collect: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # Optional callback returning {labels: value}, evaluated at scrape time
+        self.collect = collect
+        self._values: dict[tuple, float] = {} if labelnames else {(): 0}
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self._values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self) -> dict:
+        return dict(self.collect() if self.collect else self._values)
+
+    def merge(self, samples: dict, labels: tuple, value) -> None:
+        # Merged samples carry the worker as their last label (see Registry.render_merged)
+        samples[labels] = value
+
+    def render(self, samples: Optional[dict] = None) -> list[str]:
+        labelnames = self.labelnames
+        if samples is None:
+            samples = self.samples()
+        else:
+            labelnames += ("worker",)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in samples.items():
+            lines.append(f"{self.name}{_format_labels(labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> dict:
+        return {labels: [list(counts), total] for labels, (counts, total) in self._series.items()}
+
+    def merge(self, samples: dict, labels: tuple, value) -> None:
+        series = samples.get(labels)
+        if series is None:
+            samples[labels] = [list(value[0]), value[1]]
+        else:
+            series[0] = [mine + theirs for mine, theirs in zip(series[0], value[0])]
+            series[1] += value[1]
+
+    def render(self, samples: Optional[dict] = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in (self._series if samples is None else samples).items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, gauges: bool = True) -> dict:
+        """Every metric's samples as JSON-ready [labels, value] pairs, keyed by metric name."""
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+            for metric in self.metrics
+            if gauges or not isinstance(metric, Gauge)
+        }
+
+    def render_merged(self, snapshots: dict[str, dict]) -> str:
+        """Renders the snapshots of several workers, keyed by worker id, as one exposition."""
+        lines = []
+        for metric in self.metrics:
+            merged = {}
+            for worker, snapshot in snapshots.items():
+                for labels, value in snapshot.get(metric.name, ()):
+                    labels = tuple(labels) + ((worker,) if isinstance(metric, Gauge) else ())
+                    metric.merge(merged, labels, value)
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+REQUEST_QUERIES = registry.register(Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request", ("method", "route"), COUNT_BUCKETS
+))
+REQUEST_DB_TIME = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in database queries per HTTP request", ("method", "route")
+))
+APP_STARTUP_SECONDS = registry.register(Gauge(
+    "app_startup_seconds", "Time this worker took from app creation until startup finished"
+))
+QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of individual database queries", ("outcome",), QUERY_BUCKETS
+))
+
+# Per-request accumulator: [query count, seconds in queries]
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+
+def record_query(record) -> None:
+    """asyncpg query logger callback (see Connection.add_query_logger)."""
+    QUERY_DURATION.observe(record.elapsed, ("error" if record.exception else "ok",))
+    current = _request_queries.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += record.elapsed
+
+
+async def instrument_connection(connection) -> None:
+    """asyncpg pool `init` hook: times every query run on the connection."""
+    connection.add_query_logger(record_query)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering) recording latency,
+    in-flight requests and per-request query statistics, labelled by route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot explode the series count
+            route_label = route.path if route is not None else "<unmatched>"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, (method, route_label, status[0]))
+            REQUEST_QUERIES.observe(queries[0], (method, route_label))
+            REQUEST_DB_TIME.observe(queries[1], (method, route_label))
+
+
+def write_snapshot(directory: str, final: bool = False) -> None:
+    """
+    Publishes this worker's metrics to `directory` for the other workers, replacing its previous
+    snapshot atomically. The final one, written at shutdown, keeps the counters and histograms
+    of a stopped worker in the totals but drops its gauges, which no longer describe anything.
+    """
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(registry.snapshot(gauges=not final), f)
+    os.replace(path + ".tmp", path)
+
+
+async def run_snapshot_writer(directory: str, interval: float):
+    """Background loop started by the app when metrics are shared between workers."""
+    while True:
+        try:
+            write_snapshot(directory)
+        except OSError as e:
+            print(f"Writing the metrics snapshot failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def render(directory: Optional[str] = None) -> str:
+    """This worker's metrics, or, given the shared directory, those of every worker."""
+    if directory is None:
+        return registry.render()
+    snapshots = {}
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshots[name[:-len(".json")]] = json.load(f)
+            except (OSError, ValueError):
+                continue
+    # Live values for the worker answering the scrape
+    snapshots[str(os.getpid())] = registry.snapshot()
+    return registry.render_merged(snapshots)
@@ -0,0 +1,58 @@
+import base64
+import binascii
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the opaque token of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int, kind: str = "id") -> str:
+    """Packs the last seen primary key (or another position of `kind`) into an opaque, URL-safe token."""
+    return base64.urlsafe_b64encode(f"{kind}:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, kind: str = "id") -> int:
+    """Unpacks a token produced by encode_cursor with the same kind, rejecting anything else with 400."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        prefix, value = raw.split(":", 1)
+        if prefix != kind:
+            raise ValueError(raw)
+        return int(value)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+class PageParams:
+    """Query parameters shared by every keyset-paginated list endpoint."""
+
+    def __init__(
+        self,
+        limit: int = Query(
+            DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE,
+            description="Page size; rows past it are reached by following the X-Next-Cursor header",
+        ),
+        after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    ):
+        self.limit = limit
+        self.after_id = decode_cursor(after) if after else None
+
+
+async def paginate(query, page: PageParams, response: Response) -> list:
+    """
+    Applies keyset pagination on the primary key to a Tortoise queryset.
+    One extra row is fetched to learn whether a next page exists.
+    """
+    if page.after_id is not None:
+        query = query.filter(id__gt=page.after_id)
+    rows = await query.order_by("id").limit(page.limit + 1)
+
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
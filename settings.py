@@ -0,0 +1,119 @@
+from typing import Literal, Optional
+
+from pydantic import model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Application configuration, read from WMS_* environment variables or a .env file.
+    Example: WMS_DB_HOST=db.internal WMS_DB_POOL_MAX_SIZE=40 uvicorn main:app
+    """
+    model_config = SettingsConfigDict(env_prefix="WMS_", env_file=".env", extra="ignore")
+
+    # Serving: `python application.py` starts this many uvicorn worker processes
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    # "lock": each worker runs schema setup and admin seeding in turn under an advisory lock;
+    # "skip": workers leave it to a separate `python -m bootstrap` deploy step
+    startup_tasks: Literal["lock", "skip"] = "lock"
+
+    # Database connection details
+    db_host: str = "127.0.0.1"
+    db_port: int = 5432
+    db_user: str = "baltazar"
+    db_password: str = "admin"
+    db_name: str = "myproject"
+
+    # Connection pool shared by Tortoise and the raw asyncpg paths
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 20
+    # Connections the whole deployment may open, split between the workers (unset: each
+    # worker gets db_pool_max_size). Every worker also keeps two connections outside its pool:
+    # the change-feed LISTEN connection and the background jobs lock connection (see jobs.py).
+    db_max_connections: Optional[int] = None
+    db_statement_cache_size: int = 1024
+    # Seconds an idle connection may stay open before it is closed (0 disables)
+    db_pool_idle_timeout: float = 300.0
+    # Seconds a request may wait for a free connection before failing
+    db_acquire_timeout: float = 10.0
+
+    # HMAC key for access tokens, shared by all workers; required with workers > 1 (unset: random per process)
+    auth_token_secret: Optional[str] = None
+    # Lifetime of an access token issued by POST /users/login, in seconds
+    access_token_ttl: int = 900
+    # Seconds a worker may rely on its cached token versions before re-reading them
+    token_version_refresh: float = 5.0
+
+    # "sync" writes every single stock adjustment in its own statement; "group" batches
+    # concurrent adjustments into shared transactions (see inventory/group_commit.py)
+    adjust_commit_mode: Literal["sync", "group"] = "sync"
+    group_commit_max_batch: int = 256
+    group_commit_max_delay_ms: float = 2.0
+
+    # Minimum trigram word similarity (0..1) for a product search match; lower is more typo-tolerant
+    search_similarity_threshold: float = 0.5
+
+    # Seconds a stock reservation is held unless a different TTL is requested
+    reservation_ttl: int = 900
+    # Longest TTL a client may request, in seconds
+    reservation_max_ttl: int = 86400
+    # Reservations expired per transaction, and the longest pause between expiry rounds in seconds
+    reservation_expiry_batch: int = 500
+    reservation_expiry_poll: float = 1.0
+
+    # Directory where workers share their metrics so any of them can serve /metrics for all
+    # (unset: each worker reports only itself; python application.py sets one up for several workers)
+    metrics_dir: Optional[str] = None
+    # Seconds between a worker's metrics snapshots in metrics_dir
+    metrics_flush_interval: float = 5.0
+
+    # Change events buffered per GET /inventory/stream client before it is told to resync
+    stream_buffer_size: int = 1000
+    # Seconds between keep-alive comments on an idle event stream
+    stream_heartbeat: float = 15.0
+
+    # warehouse_logs partitioning (see inventory/partitions.py)
+    log_partitions_ahead: int = 3
+    # Months of log history kept attached; older partitions are archived (0 keeps everything)
+    log_retention_months: int = 0
+    # Directory old partitions are exported to as CSV.gz before being dropped (unset: just drop)
+    log_archive_dir: Optional[str] = None
+    # Seconds between partition maintenance rounds
+    maintenance_interval: float = 3600.0
+
+    # Seconds between stock snapshots used by point-in-time stock queries (0 disables the job)
+    stock_snapshot_interval: float = 86400.0
+    # Days of snapshots kept (0 keeps everything, one row per product per interval)
+    stock_snapshot_retention_days: int = 90
+
+    # Log maintenance and stock snapshots run in one worker at a time; the others retry
+    # taking them over every this many seconds (see jobs.py)
+    background_jobs_retry: float = 30.0
+
+    @model_validator(mode="after")
+    def require_shared_token_secret(self):
+        # A random per-process secret would make each worker reject the others' tokens
+        if self.workers > 1 and not self.auth_token_secret:
+            raise ValueError("WMS_AUTH_TOKEN_SECRET must be set when running more than one worker")
+        return self
+
+    @property
+    def worker_pool_max_size(self) -> int:
+        """Pool size of one worker; never below 2, which startup tasks need."""
+        if self.db_max_connections is None:
+            return self.db_pool_max_size
+        share = self.db_max_connections // max(1, self.workers) - 2
+        return max(2, min(self.db_pool_max_size, share))
+
+    @property
+    def worker_pool_min_size(self) -> int:
+        return min(self.db_pool_min_size, self.worker_pool_max_size)
+
+    @property
+    def database_url(self) -> str:
+        return f"postgres://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+
+
+settings = Settings()
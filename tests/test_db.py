@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from pydantic import ValidationError
+from tortoise import Tortoise
+
+from bootstrap import ADVISORY_LOCK_KEY, run_startup_tasks
+from db import InstrumentedPool, acquire, get_pool, pool_stats, tortoise_config
+from jobs import run_as_leader
+from settings import Settings
+from user.model import User
+
+
+TEST_SETTINGS = Settings(db_name="warehouse_test", db_pool_min_size=1, db_pool_max_size=2, db_acquire_timeout=0.2)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    await Tortoise.init(config=tortoise_config(TEST_SETTINGS))
+    yield
+    await Tortoise.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_orm_and_raw_sql_share_one_instrumented_pool():
+    await Tortoise.get_connection("default").execute_query("SELECT 1")
+    pool = get_pool()
+    assert isinstance(pool, InstrumentedPool)
+
+    async with acquire() as conn:
+        assert await conn.fetchval("SELECT 1") == 1
+        assert get_pool() is pool
+        assert pool_stats()["in_use"] == 1
+
+    stats = pool_stats()
+    assert stats["max_size"] == 2
+    assert stats["in_use"] == 0
+    assert stats["acquired_total"] >= 2
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_counted_and_acquire_times_out():
+    await Tortoise.get_connection("default").execute_query("SELECT 1")
+    pool = get_pool()
+
+    async with pool.acquire(), pool.acquire():
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0.05)
+        assert pool_stats()["waiters"] == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await waiter
+
+    assert pool_stats()["acquire_timeouts_total"] == 1
+
+
+def test_pool_budget_is_split_between_workers():
+    shared = {"auth_token_secret": "shared-secret"}
+    assert Settings(db_pool_max_size=20).worker_pool_max_size == 20
+    # Two connections per worker are left for its change-feed listener and background jobs lock
+    assert Settings(workers=4, db_max_connections=50, db_pool_max_size=20, **shared).worker_pool_max_size == 10
+    assert Settings(workers=4, db_max_connections=200, db_pool_max_size=20, **shared).worker_pool_max_size == 20
+    tight = Settings(workers=8, db_max_connections=10, db_pool_min_size=4, **shared)
+    assert (tight.worker_pool_min_size, tight.worker_pool_max_size) == (2, 2)
+    assert tortoise_config(tight)["connections"]["default"]["credentials"]["maxsize"] == 2
+
+
+def test_several_workers_require_a_shared_token_secret():
+    with pytest.raises(ValidationError, match="WMS_AUTH_TOKEN_SECRET"):
+        Settings(workers=2)
+    assert Settings(workers=2, auth_token_secret="shared-secret").workers == 2
+
+
+@pytest.mark.asyncio
+async def test_startup_tasks_apply_schema_once_under_advisory_lock():
+    async with acquire() as conn:
+        await conn.execute("DROP TABLE IF EXISTS schema_setup")
+
+    first = await run_startup_tasks(TEST_SETTINGS)
+    async with acquire() as conn:
+        # The lock was released for the next worker
+        assert await conn.fetchval("SELECT pg_try_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+    second = await run_startup_tasks(TEST_SETTINGS)
+    skipped = await run_startup_tasks(Settings(startup_tasks="skip"))
+
+    assert (first, second, skipped) == ("applied", "current", "skipped")
+    assert await User.filter(login="admin", is_admin=True).count() == 1
+    await User.filter(login="admin").delete()
+
+
+@pytest.mark.asyncio
+async def test_background_jobs_run_in_one_worker_and_fail_over():
+    started = []
+
+    async def job(worker):
+        started.append(worker)
+        await asyncio.Event().wait()
+
+    async def settle(condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+
+    first = asyncio.create_task(run_as_leader([lambda: job("first")], retry_interval=0.05))
+    await settle(lambda: started)
+    second = asyncio.create_task(run_as_leader([lambda: job("second")], retry_interval=0.05))
+    await asyncio.sleep(0.3)
+    assert started == ["first"]
+
+    # The leader going away releases the lock and the standby takes the jobs over
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await settle(lambda: len(started) == 2)
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert started == ["first", "second"]
@@ -1,10 +1,31 @@
+import asyncio
+import gzip
+from datetime import date, datetime, timedelta, timezone
+
+import asyncpg
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from main import app
 from tortoise import Tortoise
 
-from inventory.model import Supplier, Location, Product
+import db
+from inventory import search, snapshots
+from inventory.model import Supplier, Location, Product, SupplierValuation, WarehouseLog, LowStockAlert
+from inventory.service import WarehouseService
+from inventory.group_commit import group_committer
+from settings import settings
+from inventory.ddl import apply_schema_extensions
+from inventory.valuation import check_supplier_valuations
+from inventory.partitions import archive_log_partitions, ensure_log_partitions, partition_name
+from inventory.cache import location_cache, supplier_cache
+from inventory.sku_index import sku_index
+from inventory.search import ngram_index
+from inventory.bulk import import_products
+from inventory.reservations import expire_due_reservations, reserve_stock
+from inventory.events import ChangeBroadcaster, change_feed, sse_events
+from inventory.schemas import ProductResponse, StockAdjustmentLine
+from pydantic import TypeAdapter
 from user.auth import get_current_user
 from user.model import User
 
@@ -26,9 +47,14 @@ async def setup_db():
         modules={"models": ["user.model", "inventory.model"]}
     )
     await Tortoise.generate_schemas()
+    await apply_schema_extensions()
     
     # Override autoryzacji
     app.dependency_overrides[get_current_user] = skip_auth
+    supplier_cache.bump()
+    location_cache.bump()
+    sku_index.clear()
+    ngram_index.clear()
 
     yield
 
@@ -88,3 +114,818 @@ async def test_create_product_success():
     assert data["sku"] == "OK-SKU-123"
     assert data["supplier"]["name"] == "Test Supplier"
     assert data["location"]["zone_name"] == "A"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_out_adjustments_never_oversell():
+    user = await User.create(login="scanner", password="-")
+    product = await Product.create(name="Hot Item", sku="HOT-001", stock_quantity=10)
+
+    async def take_one():
+        try:
+            await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=1, action="OUT")
+            return True
+        except Exception:
+            return False
+
+    results = await asyncio.gather(*(take_one() for _ in range(25)))
+
+    await product.refresh_from_db()
+    assert sum(results) == 10
+    assert product.stock_quantity == 0
+    assert await WarehouseLog.filter(product_id=product.id, quantity_change=-1).count() == 10
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_reports_missing_product_and_shortage():
+    user = await User.create(login="scanner", password="-")
+    product = await Product.create(name="Cable", sku="CAB-001", stock_quantity=2)
+
+    result = await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=3, action="IN")
+    assert result["stock_quantity"] == 5
+
+    with pytest.raises(Exception, match="Not enough stock"):
+        await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=6, action="OUT")
+    with pytest.raises(Exception, match="Product not found"):
+        await WarehouseService.adjust_stock(product_id=product.id + 1, user=user, amount=1, action="IN")
+
+
+@pytest.mark.asyncio
+async def test_group_commit_mode_batches_concurrent_adjustments(monkeypatch):
+    monkeypatch.setattr(settings, "adjust_commit_mode", "group")
+    user = await User.create(login="scanner", password="-")
+    product = await Product.create(name="Hot Item", sku="HOT-002", stock_quantity=10)
+    batches_before = group_committer.batches
+
+    async def take_one(product_id):
+        try:
+            await WarehouseService.adjust_stock(product_id=product_id, user=user, amount=1, action="OUT")
+            return True
+        except Exception as e:
+            return str(e)
+
+    results = await asyncio.gather(*(take_one(product.id) for _ in range(25)), take_one(product.id + 1))
+    await group_committer.drain()
+
+    await product.refresh_from_db()
+    assert results.count(True) == 10 and results[-1] == "Product not found"
+    assert set(results[:-1]) == {True, "Not enough stock available"}
+    assert product.stock_quantity == 0
+    assert await WarehouseLog.filter(product_id=product.id, user_id=user.id).count() == 10
+    # Concurrent callers shared transactions
+    assert 0 < group_committer.batches - batches_before < 26
+
+
+@pytest.mark.asyncio
+async def test_reservations_hold_available_stock_and_expire_in_batches():
+    user = await User.create(login="picker", password="-")
+    app.dependency_overrides[get_current_user] = lambda: user
+    product = await Product.create(name="Reserved Item", sku="RES-001", stock_quantity=50)
+
+    async def reserve_one():
+        try:
+            return (await reserve_stock(product.id, 1, user.id, ttl=600))["id"]
+        except Exception as e:
+            return str(e)
+
+    results = await asyncio.gather(*(reserve_one() for _ in range(200)))
+    held = [result for result in results if isinstance(result, int)]
+    assert len(held) == 50 and set(results) - set(held) == {"Not enough stock available"}
+    # Reserved units cannot be shipped by a plain OUT adjustment
+    with pytest.raises(Exception, match="Not enough stock"):
+        await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=1, action="OUT")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        committed = await ac.post(f"/inventory/reservations/{held[0]}/commit")
+        again = await ac.post(f"/inventory/reservations/{held[0]}/commit")
+        released = await ac.post(f"/inventory/reservations/{held[1]}/release")
+        created = await ac.post("/inventory/reservations", json={"product_id": product.id, "quantity": 1, "reference": "SO-1"})
+        too_many = await ac.post("/inventory/reservations", json={"product_id": product.id, "quantity": 1})
+
+        # Everything still active falls due; the scheduler works through it batch by batch
+        conn = Tortoise.get_connection("default")
+        await conn.execute_query(
+            "UPDATE stock_reservations SET expires_at = now() - interval '1 second' WHERE status = 'ACTIVE'"
+        )
+        expired_commit = await ac.post(f"/inventory/reservations/{held[2]}/commit")
+        batches = [await expire_due_reservations(batch_size=20) for _ in range(4)]
+        availability = await ac.get(f"/inventory/products/{product.id}/availability")
+        status = await ac.get(f"/inventory/reservations/{created.json()['id']}")
+
+    assert committed.json()["new_quantity"] == 49
+    assert again.status_code == 400 and again.json()["detail"] == "Reservation is already committed"
+    assert released.status_code == 200
+    assert created.status_code == 201 and created.json()["available"] == 0 and created.json()["reference"] == "SO-1"
+    assert too_many.status_code == 400
+    assert expired_commit.json()["detail"] == "Reservation has expired"
+    assert batches == [20, 20, 9, 0]
+    assert availability.json() == {"product_id": product.id, "stock_quantity": 49, "reserved_quantity": 0, "available": 49}
+    assert status.json()["status"] == "EXPIRED"
+    assert await WarehouseLog.filter(product_id=product.id, action_type="OUT").count() == 1
+
+
+@pytest.mark.asyncio
+async def test_only_the_owner_or_an_admin_closes_a_reservation():
+    owner = await User.create(login="picker", password="-")
+    other = await User.create(login="other-picker", password="-")
+    admin = await User.create(login="supervisor", password="-", is_admin=True)
+    product = await Product.create(name="Owned Item", sku="RES-002", stock_quantity=5)
+    first = (await reserve_stock(product.id, 1, owner.id, ttl=600))["id"]
+    second = (await reserve_stock(product.id, 1, owner.id, ttl=600))["id"]
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        app.dependency_overrides[get_current_user] = lambda: other
+        foreign_commit = await ac.post(f"/inventory/reservations/{first}/commit")
+        foreign_release = await ac.post(f"/inventory/reservations/{first}/release")
+        app.dependency_overrides[get_current_user] = lambda: owner
+        own_release = await ac.post(f"/inventory/reservations/{first}/release")
+        app.dependency_overrides[get_current_user] = lambda: admin
+        admin_commit = await ac.post(f"/inventory/reservations/{second}/commit")
+
+    assert foreign_commit.status_code == 403 and foreign_release.status_code == 403
+    assert own_release.status_code == 200
+    assert admin_commit.status_code == 200 and admin_commit.json()["new_quantity"] == 4
+    await product.refresh_from_db()
+    assert product.reserved_quantity == 0
+
+
+@pytest.mark.asyncio
+async def test_low_stock_alerts_follow_reorder_level_crossings():
+    user = await User.create(login="buyer", password="-", is_admin=True)
+    app.dependency_overrides[get_current_user] = lambda: user
+    screws = await Product.create(name="Screws", sku="LOW-001", stock_quantity=12, reorder_level=10)
+    nuts = await Product.create(name="Nuts", sku="LOW-002", stock_quantity=3, reorder_level=5)
+    bolts = await Product.create(name="Bolts", sku="LOW-003", stock_quantity=1)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        initial = (await ac.get("/inventory/alerts/low-stock")).json()
+
+        await WarehouseService.adjust_stock(product_id=screws.id, user=user, amount=2, action="OUT")
+        await WarehouseService.adjust_stock(product_id=nuts.id, user=user, amount=10, action="IN")
+        crossed = (await ac.get("/inventory/alerts/low-stock")).json()
+
+        await ac.patch(f"/inventory/products/{bolts.id}", json={"reorder_level": 4})
+        await ac.post("/inventory/products/adjust-batch",
+                      json={"lines": [{"product_id": screws.id, "amount": 5, "action": "IN"}]})
+        after_changes = (await ac.get("/inventory/alerts/low-stock")).json()
+        listed = (await ac.get("/inventory/products", params={"name_prefix": "Bolts"})).json()
+
+    assert [alert["sku"] for alert in initial] == ["LOW-002"]
+    assert [(alert["sku"], alert["stock_quantity"], alert["reorder_level"]) for alert in crossed] == [("LOW-001", 10, 10)]
+    assert [alert["product_id"] for alert in after_changes] == [bolts.id]
+    assert listed[0]["reorder_level"] == 4
+
+    await bolts.delete()
+    assert await WarehouseService.get_low_stock_alerts() == []
+
+
+@pytest.mark.asyncio
+async def test_product_changes_are_published_through_notify():
+    user = await User.create(login="display", password="-")
+    product = await Product.create(name="Live Item", sku="LIVE-001", stock_quantity=5)
+    listener = asyncio.create_task(change_feed.listen())
+    try:
+        with change_feed.subscribe() as subscription:
+            # The listener announces every (re)connect with a resync
+            _, first = await subscription.get(timeout=5)
+            await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=2, action="OUT")
+            await product.delete()
+            _, adjusted = await subscription.get(timeout=5)
+            _, deleted = await subscription.get(timeout=5)
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    assert first == {"op": "resync"}
+    assert adjusted == {"op": "update", "id": product.id, "sku": "LIVE-001", "name": "Live Item",
+                        "stock_quantity": 3, "reserved_quantity": 0}
+    assert deleted == {"op": "delete", "id": product.id, "sku": "LIVE-001"}
+
+
+@pytest.mark.asyncio
+async def test_product_writes_through_the_api_reach_stream_subscribers():
+    supplier = await Supplier.create(name="Live Supplier")
+    location = await Location.create(zone_name="L", shelf_number=1)
+    listener = asyncio.create_task(change_feed.listen())
+    transport = ASGITransport(app=app)
+    try:
+        with change_feed.subscribe() as subscription:
+            _, first = await subscription.get(timeout=5)
+            async with AsyncClient(transport=transport, base_url="http://test") as ac:
+                created = await ac.post("/inventory/products", json={
+                    "name": "Live Item", "sku": "LIVE-002", "price": 1.0, "stock_quantity": 4,
+                    "supplier_id": supplier.id, "location_id": location.id,
+                })
+                await ac.patch(f"/inventory/products/{created.json()['id']}", json={"name": "Live Item v2"})
+            _, inserted = await subscription.get(timeout=5)
+            _, renamed = await subscription.get(timeout=5)
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    assert first == {"op": "resync"}
+    assert inserted["op"] == "insert" and inserted["sku"] == "LIVE-002" and inserted["stock_quantity"] == 4
+    assert renamed["op"] == "update" and renamed["name"] == "Live Item v2"
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_consumers_are_dropped_to_resync():
+    feed = ChangeBroadcaster(buffer_size=10)
+    stream = sse_events(feed, heartbeat=0.01)
+    assert await anext(stream) == "retry: 3000\n\n"
+    assert await anext(stream) == ": keep-alive\n\n"
+
+    with feed.subscribe() as fast, feed.subscribe(buffer_size=3) as slow:
+        for stock in range(5):
+            feed.publish({"op": "update", "id": 1, "stock_quantity": stock})
+        received = [await fast.get(timeout=1) for _ in range(5)]
+        lagging = [await slow.get(timeout=1) for _ in range(2)]
+        assert await slow.get(timeout=0.01) is None
+
+    # The fast consumer gets everything; the slow one is told to resync in place of what it missed
+    assert [event["stock_quantity"] for _, event in received] == [0, 1, 2, 3, 4]
+    assert lagging == [(4, {"op": "resync"}), (5, {"op": "update", "id": 1, "stock_quantity": 4})]
+    assert slow.dropped == 3 and feed.subscribers == 1
+
+    feed.publish({"op": "delete", "id": 1, "sku": "A-1"})
+    frames = [await anext(stream) for _ in range(6)]
+    assert frames[0] == 'id: 1\nevent: product\ndata: {"op":"update","id":1,"stock_quantity":0}\n\n'
+    assert frames[-1] == 'id: 6\nevent: product\ndata: {"op":"delete","id":1,"sku":"A-1"}\n\n'
+    await stream.aclose()
+    assert feed.subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_pick_waves_aggregate_per_location_and_walk_serpentine():
+    slots = {}
+    for zone, shelf in [("A", 1), ("A", 7), ("B", 2), ("B", 9), ("C", 4)]:
+        location = await Location.create(zone_name=zone, shelf_number=shelf)
+        slots[(zone, shelf)] = await Product.create(name=f"Item {zone}{shelf}", sku=f"PICK-{zone}{shelf}", location=location)
+    unlocated = await Product.create(name="Floor stock", sku="PICK-NONE")
+
+    lines = [
+        {"order_id": "SO-1", "product_id": slots[("B", 2)].id, "quantity": 1},
+        {"order_id": "SO-1", "product_id": slots[("A", 7)].id, "quantity": 2},
+        {"order_id": "SO-2", "sku": "PICK-B9", "quantity": 1},
+        {"order_id": "SO-2", "product_id": slots[("A", 7)].id, "quantity": 3},
+        {"order_id": "SO-2", "product_id": slots[("C", 4)].id, "quantity": 1},
+        {"order_id": "SO-3", "product_id": slots[("A", 1)].id, "quantity": 5},
+        {"order_id": "SO-3", "product_id": unlocated.id, "quantity": 1},
+        {"order_id": "SO-3", "sku": "PICK-MISSING", "quantity": 1},
+    ]
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        single = (await ac.post("/inventory/picking/waves", json={"lines": lines})).json()
+        split = (await ac.post("/inventory/picking/waves", json={"lines": lines, "max_orders_per_wave": 2})).json()
+
+    wave = single["waves"][0]
+    assert len(single["waves"]) == 1 and wave["lines"] == 6 and wave["units"] == 13
+    # Zone A up, zone B down, zone C up again; A7 is one stop for both orders
+    assert [(stop["zone_name"], stop["shelf_number"]) for stop in wave["route"]] == [
+        ("A", 1), ("A", 7), ("B", 9), ("B", 2), ("C", 4)
+    ]
+    assert wave["route"][1]["picks"] == [
+        {"product_id": slots[("A", 7)].id, "sku": "PICK-A7", "quantity": 5, "orders": {"SO-1": 2, "SO-2": 3}}
+    ]
+    assert [(line["line"], line["error"]) for line in single["unplanned"]] == [
+        (6, "Product has no location"), (7, "Product not found")
+    ]
+    assert [wave["orders"] for wave in split["waves"]] == [["SO-3", "SO-1"], ["SO-2"]]
+
+
+@pytest.mark.asyncio
+async def test_adjust_batch_all_or_nothing_and_partial_modes():
+    user = await User.create(login="dock", password="-")
+    app.dependency_overrides[get_current_user] = lambda: user
+    keyboard = await Product.create(name="Keyboard", sku="KEY-001", stock_quantity=5)
+    mouse = await Product.create(name="Mouse", sku="MOU-001", stock_quantity=1)
+
+    lines = [
+        {"product_id": keyboard.id, "amount": 10, "action": "IN"},
+        {"sku": "MOU-001", "amount": 2, "action": "OUT"},
+        {"sku": "NOPE-404", "amount": 1, "action": "IN"},
+    ]
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        rejected = await ac.post("/inventory/products/adjust-batch", json={"lines": lines})
+        partial = await ac.post("/inventory/products/adjust-batch", json={"lines": lines, "atomic": False})
+
+    assert rejected.status_code == 409
+    assert partial.status_code == 200
+    body = partial.json()
+    assert (body["applied"], body["failed"]) == (1, 2)
+    assert body["results"][0]["new_quantity"] == 15
+    assert body["results"][1]["error"] == "Not enough stock available"
+    assert body["results"][2]["error"] == "Product not found"
+
+    await keyboard.refresh_from_db()
+    await mouse.refresh_from_db()
+    assert (keyboard.stock_quantity, mouse.stock_quantity) == (15, 1)
+    assert await WarehouseLog.all().count() == 1
+
+
+@pytest.mark.asyncio
+async def test_inventory_report_streams_filtered_rows():
+    user = await User.create(login="auditor", password="-")
+    cable = await Product.create(name="Cable", sku="CAB-001", stock_quantity=0)
+    plug = await Product.create(name="Plug", sku="PLG-001", stock_quantity=0)
+    await WarehouseService.adjust_stock(product_id=cable.id, user=user, amount=4, action="IN")
+    await WarehouseService.adjust_stock(product_id=plug.id, user=user, amount=7, action="IN")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        full = await ac.get("/inventory/reports/inventory")
+        ndjson = await ac.get("/inventory/reports/inventory", params={"format": "ndjson", "product_id": plug.id})
+        csv_report = await ac.get("/inventory/reports/inventory", params={"format": "csv", "prefetch": 1})
+
+    assert [row["product"] for row in full.json()] == ["Plug", "Cable"]
+    lines = ndjson.text.splitlines()
+    assert len(lines) == 1 and '"change": 7' in lines[0]
+    assert csv_report.headers["content-type"].startswith("text/csv")
+    assert csv_report.text.splitlines()[0] == "date,user,product,change,type"
+    assert len(csv_report.text.splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_list_products_keyset_pagination_and_filters():
+    supplier = await Supplier.create(name="Paged Supplier")
+    location = await Location.create(zone_name="B", shelf_number=1)
+    for i in range(5):
+        await Product.create(
+            name=f"Widget {i}", sku=f"WID-{i:03}", stock_quantity=i,
+            supplier=supplier if i % 2 == 0 else None, location=location
+        )
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = await ac.get("/inventory/products", params={"limit": 3})
+        second = await ac.get("/inventory/products", params={"limit": 3, "after": first.headers["x-next-cursor"]})
+        filtered = await ac.get("/inventory/products", params={"supplier_id": supplier.id, "min_stock": 1, "zone": "B"})
+        invalid = await ac.get("/inventory/products", params={"after": "not-a-cursor"})
+
+    assert [p["sku"] for p in first.json()] == ["WID-000", "WID-001", "WID-002"]
+    assert [p["sku"] for p in second.json()] == ["WID-003", "WID-004"]
+    assert "x-next-cursor" not in second.headers
+    assert [p["sku"] for p in filtered.json()] == ["WID-002", "WID-004"]
+    assert filtered.json()[0]["supplier"]["name"] == "Paged Supplier"
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_supplier_valuation_store_follows_product_writes():
+    user = await User.create(login="finance", password="-")
+    acme = await Supplier.create(name="Acme")
+    globex = await Supplier.create(name="Globex")
+    bolt = await Product.create(name="Bolt", sku="BLT-001", price=2, stock_quantity=10, supplier=acme)
+    nut = await Product.create(name="Nut", sku="NUT-001", price=1, stock_quantity=5, supplier=acme)
+
+    await WarehouseService.adjust_stock(product_id=bolt.id, user=user, amount=4, action="OUT")
+    nut.price = 3
+    nut.supplier = globex
+    await nut.save()
+    await Product.create(name="Washer", sku="WSH-001", price=1, stock_quantity=7, supplier=globex)
+    await bolt.delete()
+
+    report = await WarehouseService.get_supplier_valuation_report()
+    assert [(r["supplier_name"], r["unique_products"], r["total_units"], r["total_valuation"]) for r in report] == [
+        ("Globex", 2, 12, 22),
+    ]
+    assert await check_supplier_valuations() == []
+
+    await SupplierValuation.filter(supplier_id=globex.id).update(total_units=0)
+    drift = await check_supplier_valuations(repair=True)
+    assert [row["supplier_id"] for row in drift] == [globex.id]
+    assert await check_supplier_valuations() == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_batches_with_crossed_suppliers_do_not_deadlock():
+    user = await User.create(login="finance", password="-")
+    acme = await Supplier.create(name="Acme")
+    globex = await Supplier.create(name="Globex")
+    # In product id order one batch reaches Acme first, the other Globex
+    first = [await Product.create(name=f"A{i}", sku=f"XSP-A{i}", stock_quantity=10, supplier=supplier)
+             for i, supplier in enumerate((acme, globex))]
+    second = [await Product.create(name=f"B{i}", sku=f"XSP-B{i}", stock_quantity=10, supplier=supplier)
+              for i, supplier in enumerate((globex, acme))]
+
+    def batch(products):
+        return [StockAdjustmentLine(product_id=product.id, amount=1, action="OUT") for product in products]
+
+    # Hold Acme's valuation row so that both batches queue up behind it before either finishes
+    blocker = await asyncpg.connect(TEST_DATABASE_URL)
+    transaction = blocker.transaction()
+    await transaction.start()
+    await blocker.execute("SELECT 1 FROM supplier_valuations WHERE supplier_id = $1 FOR UPDATE", acme.id)
+    writers = [
+        asyncio.create_task(WarehouseService.adjust_stock_batch(batch(products), user))
+        for products in (first, second)
+    ]
+    await asyncio.sleep(0.3)
+    await transaction.rollback()
+    await blocker.close()
+
+    results = await asyncio.gather(*writers, return_exceptions=True)
+    assert all(isinstance(result, list) for result in results), results
+    assert await check_supplier_valuations() == []
+
+
+@pytest.mark.asyncio
+async def test_supplier_list_etag_and_invalidation(monkeypatch):
+    await Supplier.create(name="Initech")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = await ac.get("/inventory/suppliers")
+        etag = first.headers["etag"]
+
+        def no_queries():
+            raise AssertionError("cached reference data should not query the database")
+
+        with monkeypatch.context() as patched:
+            patched.setattr(Supplier, "all", no_queries)
+            not_modified = await ac.get("/inventory/suppliers", headers={"If-None-Match": etag})
+            repeated = await ac.get("/inventory/suppliers")
+
+        await ac.post("/inventory/suppliers", json={"name": "Umbrella"})
+        changed = await ac.get("/inventory/suppliers", headers={"If-None-Match": etag})
+
+    assert [s["name"] for s in first.json()] == ["Initech"]
+    assert not_modified.status_code == 304
+    assert repeated.json() == first.json()
+    assert changed.status_code == 200
+    assert [s["name"] for s in changed.json()] == ["Initech", "Umbrella"]
+    assert changed.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_upserts_by_sku_and_reports_bad_rows():
+    supplier = await Supplier.create(name="Bulk Supplier")
+    await Location.create(zone_name="C", shelf_number=3)
+    await Product.create(name="Old Name", sku="IMP-001", price=1, stock_quantity=9)
+
+    body = "\n".join([
+        "sku,name,price,stock_quantity,supplier_name,zone_name,shelf_number",
+        "IMP-001,New Name,2.50,100,Bulk Supplier,C,3",
+        "IMP-002,Fresh Item,4.00,5,,,",
+        "IMP-003,Bad Price,-1,5,,,",
+        "IMP-004,Ghost Supplier,1.00,5,Nobody,,",
+        "IMP-002,Duplicate,1.00,1,,,",
+    ])
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.post(
+            "/inventory/products/import", content=body.encode(), headers={"Content-Type": "text/csv"}
+        )
+
+    summary = response.json()
+    assert (summary["received"], summary["inserted"], summary["updated"], summary["failed"]) == (5, 1, 1, 3)
+    assert [error["line"] for error in summary["errors"]] == [4, 5, 6]
+
+    updated = await Product.get(sku="IMP-001")
+    assert (updated.name, updated.stock_quantity, updated.supplier_id) == ("New Name", 9, supplier.id)
+    assert (await Product.get(sku="IMP-002")).stock_quantity == 5
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_isolates_rows_the_database_rejects():
+    supplier = await Supplier.create(name="Vanishing Supplier")
+
+    async def records():
+        yield 1, {"sku": "LIM-001", "name": "Fine", "price": "1.00"}
+        yield 2, {"sku": "LIM-002", "name": "N" * 101, "price": "1.00"}
+        yield 3, {"sku": "LIM-003", "name": "Huge Stock", "stock_quantity": 2**31}
+        yield 4, {"sku": "LIM-004", "name": "Fine Too", "price": "2.00"}
+        # Passed the reference check when the import started, then disappears
+        await supplier.delete()
+        yield 5, {"sku": "LIM-005", "name": "Orphan", "supplier_id": supplier.id}
+        yield 6, {"sku": "LIM-006", "name": "Last", "price": "3.00"}
+
+    summary = await import_products(records(), chunk_size=2)
+
+    assert (summary["received"], summary["inserted"], summary["failed"]) == (6, 3, 3)
+    assert [error["line"] for error in summary["errors"]] == [2, 3, 5]
+    assert sorted(p.sku for p in await Product.all()) == ["LIM-001", "LIM-004", "LIM-006"]
+
+
+@pytest.mark.asyncio
+async def test_exports_stream_csv_and_gzip():
+    user = await User.create(login="exporter", password="-")
+    supplier = await Supplier.create(name="Export Supplier")
+    product = await Product.create(name="Exported", sku="EXP-001", price=3, stock_quantity=0, supplier=supplier)
+    await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=2, action="IN")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        products_csv = await ac.get("/inventory/exports/products.csv")
+        logs_gz = await ac.get("/inventory/exports/logs.csv", params={"gzip": True})
+        no_logs = await ac.get("/inventory/exports/logs.csv", params={"date_to": "2000-01-01T00:00:00Z"})
+
+    lines = products_csv.text.splitlines()
+    assert lines[0].startswith("id,sku,name,price,stock_quantity,supplier_id,supplier_name")
+    assert "EXP-001,Exported,3.00,2" in lines[1] and "Export Supplier" in lines[1]
+
+    assert logs_gz.headers["content-type"] == "application/gzip"
+    log_lines = gzip.decompress(logs_gz.content).decode().splitlines()
+    assert len(log_lines) == 2 and log_lines[1].endswith(",IN,2,%d,EXP-001,%d,exporter" % (product.id, user.id))
+    assert len(no_logs.text.splitlines()) == 1
+
+
+@pytest.mark.asyncio
+async def test_warehouse_logs_are_partitioned_and_old_months_archive(tmp_path):
+    conn = Tortoise.get_connection("default")
+    info = await conn.execute_query_dict(
+        "SELECT c.relkind::text AS relkind, (SELECT count(*) FROM pg_indexes WHERE tablename = 'warehouse_logs' "
+        "AND indexname IN ('idx_warehouse_logs_created_at', 'idx_warehouse_logs_product_created')) AS indexes "
+        "FROM pg_class c WHERE c.oid = 'warehouse_logs'::regclass"
+    )
+    assert info == [{"relkind": "p", "indexes": 2}]
+
+    user = await User.create(login="archiver", password="-")
+    product = await Product.create(name="Old", sku="OLD-001", price=1, stock_quantity=0)
+    # Lands in the default partition until its month gets one
+    await WarehouseLog.create(
+        action_type="IN", quantity_change=4, user=user, product=product,
+        created_at=datetime(2001, 3, 15, tzinfo=timezone.utc),
+    )
+
+    assert await ensure_log_partitions(months_ahead=0, today=date(2001, 3, 1)) == ["warehouse_logs_y2001m03"]
+    moved = await conn.execute_query_dict("SELECT count(*) AS n FROM warehouse_logs_y2001m03")
+    assert moved == [{"n": 1}]
+
+    archived = await archive_log_partitions(older_than_months=1, export_dir=str(tmp_path))
+    assert partition_name(date(2001, 3, 1)) in archived
+    rows = gzip.decompress((tmp_path / "warehouse_logs_y2001m03.csv.gz").read_bytes()).decode().splitlines()
+    assert len(rows) == 2 and ",IN,4," in rows[1]
+    assert await WarehouseLog.filter(product=product).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_stock_as_of_combines_snapshots_with_log_deltas():
+    user = await User.create(login="auditor", password="-")
+    product = await Product.create(name="Audited", sku="AUD-001", price=1, stock_quantity=10)
+
+    async def moment():
+        await asyncio.sleep(0.01)
+        now = datetime.now(timezone.utc)
+        await asyncio.sleep(0.01)
+        return now
+
+    t0 = await moment()
+    await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=5, action="IN")
+    t1 = await moment()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        snapshot = await ac.post("/inventory/reports/stock-snapshots")
+        t2 = await moment()
+        await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=3, action="OUT")
+        t3 = await moment()
+        late = await Product.create(name="Late", sku="AUD-002", price=1, stock_quantity=7)
+
+        async def stock_at(moment, **params):
+            response = await ac.get("/inventory/reports/stock-as-of", params={"at": moment.isoformat(), **params})
+            return response.json()
+
+        assert snapshot.status_code == 201 and snapshot.json()["products"] == 1
+        # Before the snapshot: walked back from it; after: walked forward
+        assert (await stock_at(t0, product_id=product.id))["stock_quantity"] == 10
+        assert (await stock_at(t1, product_id=product.id))["stock_quantity"] == 15
+        assert (await stock_at(t2, sku="AUD-001"))["stock_quantity"] == 15
+        latest = await stock_at(t3, product_id=product.id)
+        assert latest["stock_quantity"] == 12 and latest["snapshot_at"] is not None
+        # No snapshot at all yet: derived from the live stock
+        assert (await stock_at(t3, product_id=late.id))["snapshot_at"] is None
+
+        whole = await ac.get("/inventory/reports/stock-as-of", params={"at": t1.isoformat(), "format": "csv"})
+        missing = await ac.get("/inventory/reports/stock-as-of", params={"at": t1.isoformat(), "sku": "NOPE"})
+
+    lines = whole.text.splitlines()
+    assert lines[0] == "product_id,sku,name,stock_quantity,snapshot_at"
+    assert len(lines) == 3 and lines[1].startswith(f"{product.id},AUD-001,Audited,15,")
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stock_snapshot_does_not_hold_writers_back_while_copying(monkeypatch):
+    user = await User.create(login="auditor", password="-")
+    product = await Product.create(name="Busy", sku="AUD-101", stock_quantity=10)
+    # A catalog copy that takes a while
+    monkeypatch.setattr(snapshots, "SNAPSHOT_SQL", snapshots.SNAPSHOT_SQL + ", pg_sleep(0.5)")
+
+    snapshot = asyncio.create_task(snapshots.take_stock_snapshot())
+    await asyncio.sleep(0.1)
+    started = asyncio.get_running_loop().time()
+    await WarehouseService.adjust_stock(product_id=product.id, user=user, amount=1, action="OUT")
+    assert asyncio.get_running_loop().time() - started < 0.3
+    assert not snapshot.done()
+
+    # The copy still reads the stock as it was when the snapshot was taken
+    assert (await snapshot)["products"] == 1
+    async with db.acquire() as conn:
+        assert await conn.fetchval("SELECT stock_quantity FROM stock_snapshots WHERE product_id = $1", product.id) == 10
+
+
+@pytest.mark.asyncio
+async def test_prune_keeps_the_newest_snapshot_before_the_cutoff():
+    product = await Product.create(name="Aged", sku="AUD-201", stock_quantity=1)
+    now = datetime.now(timezone.utc)
+    async with db.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO stock_snapshots (taken_at, product_id, stock_quantity) VALUES ($1, $2, 1)",
+            [(now - timedelta(days=days), product.id) for days in (100, 95, 91, 10, 1)],
+        )
+        assert await snapshots.prune_stock_snapshots(now - timedelta(days=90)) == 2
+        kept = await conn.fetch("SELECT taken_at FROM stock_snapshots ORDER BY taken_at")
+    assert [now - row["taken_at"] for row in kept] == [timedelta(days=days) for days in (91, 10, 1)]
+
+
+@pytest.mark.asyncio
+async def test_sku_lookup_and_adjust_follow_catalog_changes():
+    user = await User.create(login="handheld", password="-", is_admin=True)
+    app.dependency_overrides[get_current_user] = lambda: user
+    supplier = await Supplier.create(name="Scan Supplier")
+    location = await Location.create(zone_name="S", shelf_number=1)
+    payload = {"name": "Scanned", "sku": "SCAN-001", "price": 2, "stock_quantity": 4,
+               "supplier_id": supplier.id, "location_id": location.id}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        created = (await ac.post("/inventory/products", json=payload)).json()
+        found = await ac.get("/inventory/products/by-sku/SCAN-001")
+        adjusted = await ac.post("/inventory/products/by-sku/SCAN-001/adjust", params={"amount": 3, "action": "OUT"})
+
+        await ac.patch(f"/inventory/products/{created['id']}", json={"sku": "SCAN-002"})
+        old_sku = await ac.get("/inventory/products/by-sku/SCAN-001")
+        new_sku = await ac.get("/inventory/products/by-sku/SCAN-002")
+
+        # Another worker re-created the SKU under a new id: the stale entry is refreshed
+        other = await Product.create(name="Elsewhere", sku="SCAN-003", price=1, stock_quantity=1)
+        sku_index.add("SCAN-003", created["id"])
+        stale = await ac.post("/inventory/products/by-sku/SCAN-003/adjust", params={"amount": 2, "action": "IN"})
+
+        await ac.delete(f"/inventory/products/{created['id']}")
+        deleted = await ac.get("/inventory/products/by-sku/SCAN-002")
+
+    assert found.status_code == 200 and found.json()["supplier"]["name"] == "Scan Supplier"
+    assert adjusted.json()["new_quantity"] == 1
+    assert old_sku.status_code == 404 and new_sku.json()["id"] == created["id"]
+    assert stale.json()["product_id"] == other.id and stale.json()["new_quantity"] == 3
+    assert deleted.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_product_search_ranks_typos_and_paginates():
+    await Product.bulk_create([
+        Product(name="Steel screw M4", sku="SCR-M4", price=1),
+        Product(name="Steel screw M6", sku="SCR-M6", price=1),
+        Product(name="Wood screwdriver", sku="DRV-001", price=1),
+        Product(name="Hammer", sku="HAM-001", price=1),
+    ])
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        typo = await ac.get("/inventory/products/search", params={"q": "scrw m4"})
+        by_sku = await ac.get("/inventory/products/search", params={"q": "ham-001"})
+        first = await ac.get("/inventory/products/search", params={"q": "screw", "limit": 2})
+        second = await ac.get(
+            "/inventory/products/search", params={"q": "screw", "limit": 2, "after": first.headers["X-Next-Cursor"]}
+        )
+        nothing = await ac.get("/inventory/products/search", params={"q": "zzzz"})
+
+    assert typo.json()[0]["sku"] == "SCR-M4"
+    assert by_sku.json()[0]["sku"] == "HAM-001" and by_sku.json()[0]["score"] == 1.0
+    names = [p["name"] for p in first.json() + second.json()]
+    assert len(names) == 3 and set(names) == {"Steel screw M4", "Steel screw M6", "Wood screwdriver"}
+    assert "X-Next-Cursor" not in second.headers
+    assert nothing.json() == []
+
+
+@pytest.mark.asyncio
+async def test_product_search_ranks_in_sql_with_pg_trgm(monkeypatch):
+    conn = Tortoise.get_connection("default")
+    if not await conn.execute_query_dict("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"):
+        pytest.skip("pg_trgm is not installed on the test server; the in-process fallback is tested instead")
+    await Product.bulk_create([
+        Product(name="Steel screw M4", sku="SCR-M4", price=1),
+        Product(name="Wood screwdriver", sku="DRV-001", price=1),
+        Product(name="Hammer", sku="HAM-001", price=1),
+    ])
+    monkeypatch.setattr(search, "_trigram_support", {})
+
+    assert await search.trigram_search_available()
+    ranked = await search.search_products("scrw m4", 10)
+    by_sku = await search.search_products("ham-001", 10)
+
+    products = {p.id: p.sku for p in await Product.all()}
+    assert products[ranked[0][0]] == "SCR-M4"
+    assert products[by_sku[0][0]] == "HAM-001" and by_sku[0][1] == 1.0
+    assert not ngram_index.loaded
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_load_the_ngram_index_once(monkeypatch):
+    await Product.create(name="Steel screw M4", sku="SCR-M4", price=1)
+
+    async def no_trigram_support():
+        return False
+
+    loads = []
+    load = ngram_index.load
+
+    async def counted_load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        await load()
+
+    monkeypatch.setattr(search, "trigram_search_available", no_trigram_support)
+    monkeypatch.setattr(ngram_index, "load", counted_load)
+    results = await asyncio.gather(*(search.search_products("screw", 10) for _ in range(10)))
+
+    assert len(loads) == 1
+    assert all(len(ranked) == 1 for ranked in results)
+
+
+@pytest.mark.asyncio
+async def test_bulk_product_update_validates_set_wise_and_reports_per_item():
+    supplier = await Supplier.create(name="Bulk Supplier")
+    location = await Location.create(zone_name="B", shelf_number=2)
+    first = await Product.create(name="First", sku="BLK-001", price=1, stock_quantity=3)
+    second = await Product.create(name="Second", sku="BLK-002", price=2, stock_quantity=1)
+
+    items = [
+        {"product_id": first.id, "price": "9.50", "supplier_id": supplier.id, "location_id": location.id},
+        {"product_id": second.id, "sku": "BLK-001"},
+        {"product_id": second.id + 100, "price": "1"},
+        {"product_id": second.id, "location_id": location.id + 100},
+        {"product_id": second.id, "name": "Renamed", "sku": "BLK-NEW"},
+    ]
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        rejected = await ac.patch("/inventory/products/bulk", json={"items": items})
+        unchanged = await Product.get(id=first.id)
+        partial = await ac.patch("/inventory/products/bulk", json={"items": items, "atomic": False})
+
+    assert rejected.status_code == 409 and unchanged.price == 1
+    body = partial.json()
+    assert (body["updated"], body["failed"]) == (2, 3)
+    assert [r["error"] for r in body["results"]] == [
+        None, "SKU already in use", "Product not found", "Location not found", None
+    ]
+
+    await first.refresh_from_db()
+    await second.refresh_from_db()
+    assert (first.price, first.supplier_id, first.location_id, first.name) == (9.5, supplier.id, location.id, "First")
+    assert (second.name, second.sku, second.price) == ("Renamed", "BLK-NEW", 2)
+    assert (await SupplierValuation.get(supplier_id=supplier.id)).total_valuation == 28.5
+
+
+@pytest.mark.asyncio
+async def test_bulk_product_update_clears_reorder_level_only_when_sent():
+    kept = await Product.create(name="Kept", sku="BLK-101", stock_quantity=8, reorder_level=5)
+    cleared = await Product.create(name="Cleared", sku="BLK-102", stock_quantity=2, reorder_level=5)
+    assert await LowStockAlert.exists(product_id=cleared.id)
+
+    items = [
+        {"product_id": kept.id, "name": "Kept Renamed"},
+        {"product_id": cleared.id, "reorder_level": None},
+    ]
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.patch("/inventory/products/bulk", json={"items": items})
+
+    assert response.status_code == 200
+    await kept.refresh_from_db()
+    await cleared.refresh_from_db()
+    assert (kept.name, kept.reorder_level) == ("Kept Renamed", 5)
+    assert cleared.reorder_level is None
+    # The trigger clears the alert raised while the product was under its reorder level
+    assert not await LowStockAlert.exists(product_id=cleared.id)
+
+
+@pytest.mark.asyncio
+async def test_list_products_projection_matches_orm_serialisation():
+    supplier = await Supplier.create(name="Proj Supplier", contact_email="p@example.com")
+    location = await Location.create(zone_name="P", shelf_number=7)
+    await Product.create(name="Full 100%", sku="PRJ-001", price="12.30", stock_quantity=4, supplier=supplier, location=location)
+    await Product.create(name="Bare", sku="PRJ-002", price=0, stock_quantity=0)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        listed = await ac.get("/inventory/products")
+        literal_percent = await ac.get("/inventory/products", params={"name_prefix": "Full 100%"})
+        wildcard = await ac.get("/inventory/products", params={"name_prefix": "F_ll"})
+
+    orm_rows = await Product.all().select_related("supplier", "location").order_by("id")
+    adapter = TypeAdapter(list[ProductResponse])
+    expected = adapter.dump_json(adapter.validate_python(orm_rows, from_attributes=True))
+    assert listed.headers["content-type"] == "application/json"
+    assert listed.content == expected
+    assert [p["sku"] for p in literal_percent.json()] == ["PRJ-001"]
+    assert wildcard.json() == []
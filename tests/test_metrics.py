@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from tortoise import Tortoise
+
+import metrics
+from db import tortoise_config
+from inventory.ddl import apply_schema_extensions
+from main import app
+from settings import Settings
+from user.auth import get_current_user
+from user.model import User
+
+
+TEST_SETTINGS = Settings(db_name="warehouse_test")
+
+
+async def skip_auth():
+    return User(login="test_admin", is_admin=True)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    await Tortoise.init(config=tortoise_config(TEST_SETTINGS))
+    await Tortoise.generate_schemas()
+    await apply_schema_extensions()
+    app.dependency_overrides[get_current_user] = skip_auth
+
+    yield
+
+    app.dependency_overrides = {}
+    await Tortoise.close_connections()
+
+
+def sample(text: str, prefix: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+
+@pytest.mark.asyncio
+async def test_metrics_expose_route_latency_and_query_counts():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        before = (await ac.get("/metrics")).text
+        await ac.get("/inventory/products")
+        await ac.get("/inventory/products")
+        await ac.get("/no/such/route")
+        response = await ac.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    route = 'route="/inventory/products"'
+    latency_prefix = f'http_request_duration_seconds_count{{method="GET",{route},status="200"}}'
+    queries_prefix = f'http_request_db_queries_sum{{method="GET",{route}}}'
+
+    assert sample(text, latency_prefix) - sample(before, latency_prefix) == 2
+    assert sample(text, queries_prefix) - sample(before, queries_prefix) >= 2
+    assert 'route="<unmatched>"' in text
+    assert "db_query_duration_seconds_bucket" in text
+    assert 'db_pool_connections{state="in_use"}' in text
+    assert "http_requests_in_flight 1" in text
+
+
+def test_metrics_of_several_workers_are_merged(tmp_path):
+    metrics.QUERY_DURATION.observe(0.002, ("ok",))
+    metrics.APP_STARTUP_SECONDS.set(1.5)
+    # Another worker with the same values as this one, and one that has stopped
+    (tmp_path / "101.json").write_text(json.dumps(metrics.registry.snapshot()))
+    (tmp_path / "102.json").write_text(json.dumps(metrics.registry.snapshot(gauges=False)))
+
+    own = metrics.render()
+    merged = metrics.render(str(tmp_path))
+
+    count_prefix = 'db_query_duration_seconds_count{outcome="ok"}'
+    assert sample(merged, count_prefix) == 3 * sample(own, count_prefix)
+    assert 'app_startup_seconds{worker="101"} 1.5' in merged
+    assert f'app_startup_seconds{{worker="{os.getpid()}"}} 1.5' in merged
+    assert 'worker="102"' not in merged
@@ -1,26 +1,164 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
-from typing import Annotated
+from typing import Annotated, Optional
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
 from .model import User
+from .tokens import decode_token, token_versions
+
+# Either scheme may be used; each yields None when the Authorization header is of the other kind
+security = HTTPBasic(auto_error=False)
+bearer_security = HTTPBearer(auto_error=False)
+
+# bcrypt is CPU-bound and releases the GIL, so it runs on a small dedicated pool
+# instead of blocking the event loop for every authenticated request.
+BCRYPT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+
+# Verified credentials are remembered for a short time to skip both the hash and the DB query
+CREDENTIAL_CACHE_TTL = 60.0
+CREDENTIAL_CACHE_SIZE = 1024
+
+
+async def hash_password(password: str) -> str:
+    """Hashes a password with bcrypt on the bcrypt thread pool."""
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(_bcrypt_executor, bcrypt.hashpw, password.encode(), bcrypt.gensalt())
+    return hashed.decode()
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Checks a password against a bcrypt hash on the bcrypt thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _bcrypt_executor, bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8')
+    )
 
-security = HTTPBasic()
 
-async def get_current_user(credentials: Annotated[HTTPBasicCredentials, Depends(security)]):
+class CredentialCache:
     """
-    Authenticates the user using HTTP Basic Auth.
-    Verifies credentials against the database and bcrypt hashes.
+    Bounded LRU cache of recently verified logins with TTL eviction.
+    Passwords are never stored, only an HMAC digest keyed with a per-process secret.
+    Entries are local to the worker: get_current_user only trusts one while the user's
+    token_version still matches, so changes made through another worker apply here too.
     """
-    # 1. Fetch user from database
-    user = await User.get_or_none(login=credentials.username)
 
-    # 2. Check if user exists and verify password
-    if user:
-        password_bytes = credentials.password.encode('utf-8')
-        hashed_bytes = user.password.encode('utf-8')
+    def __init__(self, maxsize: int = CREDENTIAL_CACHE_SIZE, ttl: float = CREDENTIAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._key = secrets.token_bytes(32)
+        # login -> (credential digest, expiry timestamp, user)
+        self._entries: OrderedDict[str, tuple[bytes, float, User]] = OrderedDict()
+        # Bumped on every invalidation so verifications that raced with it are not cached
+        self.generation = 0
+
+    def _digest(self, login: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{login}\x00{password}".encode(), hashlib.sha256).digest()
+
+    def get(self, login: str, password: str) -> Optional[User]:
+        entry = self._entries.get(login)
+        if entry is None:
+            return None
+
+        digest, expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[login]
+            return None
+        if not hmac.compare_digest(digest, self._digest(login, password)):
+            return None
+
+        self._entries.move_to_end(login)
+        return user
+
+    def put(self, login: str, password: str, user: User, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self._entries[login] = (self._digest(login, password), time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(login)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *logins: str) -> None:
+        self.generation += 1
+        for login in logins:
+            self._entries.pop(login, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
 
-        if bcrypt.checkpw(password_bytes, hashed_bytes):
+credential_cache = CredentialCache()
+
+
+def invalidate_user_credentials(*logins: str) -> None:
+    """Drops cached credentials; call whenever an account is changed or removed."""
+    credential_cache.invalidate(*logins)
+
+
+async def authenticate(login: str, password: str) -> Optional[User]:
+    """The user with this login and password, or None; checks the database and bcrypt hash."""
+    user = await User.get_or_none(login=login)
+    if user and await verify_password(password, user.password):
+        return user
+    return None
+
+
+async def user_from_token(token: str) -> Optional[User]:
+    """
+    Builds the user from a valid access token without loading the row.
+    Tokens older than the user's current token_version (account changed or deleted) are refused.
+    """
+    claims = decode_token(token)
+    if claims is None or await token_versions.current(claims["sub"]) != claims["ver"]:
+        return None
+    return User(id=claims["sub"], login=claims["login"], is_admin=claims["adm"], token_version=claims["ver"])
+
+
+async def get_current_user(
+    credentials: Annotated[Optional[HTTPBasicCredentials], Depends(security)],
+    bearer: Annotated[Optional[HTTPAuthorizationCredentials], Depends(bearer_security)] = None,
+):
+    """
+    Authenticates the user with a bearer access token (see POST /users/login) or HTTP Basic Auth.
+    Tokens are checked by signature, without a query; Basic credentials are verified against
+    the database and bcrypt hashes, with recently verified ones served from the in-process cache
+    as long as the account's token_version is unchanged.
+    """
+    if credentials is None:
+        user = await user_from_token(bearer.credentials) if isinstance(bearer, HTTPAuthorizationCredentials) else None
+        if user is not None:
             return user
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated" if bearer is None else "Invalid or expired token",
+            headers={"WWW-Authenticate": "Basic" if bearer is None else "Bearer"},
+        )
+
+    # 0. Serve repeated requests without bcrypt, unless the account changed since they were cached
+    cached_user = credential_cache.get(credentials.username, credentials.password)
+    if cached_user is not None:
+        if await token_versions.current(cached_user.id) == cached_user.token_version:
+            return cached_user
+        credential_cache.invalidate(credentials.username)
+    generation = credential_cache.generation
+
+    # 1. Fetch user from database and verify password
+    user = await authenticate(credentials.username, credentials.password)
+
+    # 2. Remember the verified credentials along with the account version they were checked against
+    if user:
+        credential_cache.put(credentials.username, credentials.password, user, generation)
+        token_versions.set(user.id, user.token_version)
+        return user
 
     # 3. Raise 401 if EITHER user is missing OR password is wrong
     # Note: This must be OUTSIDE the 'if user' block to catch missing users
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from typing import List, Optional
+
+from pagination import PageParams, paginate
 
 # Import modelu bazy danych
 from .model import User
 
 # Import schematów Pydantic
-from .schemas import UserCreate, UserResponse, UserUpdate
+from .schemas import LoginRequest, TokenResponse, UserCreate, UserResponse, UserUpdate
 
 # Import autoryzacji
-from .auth import get_current_user, get_admin_user
-import bcrypt
+from .auth import authenticate, get_current_user, get_admin_user, hash_password, invalidate_user_credentials
+from .tokens import issue_token, token_versions
 
 # Initialize the router module
 router = APIRouter()
@@ -26,10 +28,23 @@ async def register_user(user_data: UserCreate):
     if await User.exists(login=user_data.login):
         raise HTTPException(status_code=400, detail="Login already registered")
 
-    hashed = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode()
+    hashed = await hash_password(user_data.password)
     await User.create(login=user_data.login, password=hashed, is_admin=False)
     return {"message": "User registered successfully"}
 
+@router.post("/login", response_model=TokenResponse, tags=["Users: Public"])
+async def login(credentials: LoginRequest):
+    """
+    Exchanges login and password for a short-lived access token.
+    Send it as "Authorization: Bearer <token>"; it is verified without a database query.
+    """
+    user = await authenticate(credentials.login, credentials.password)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect login or password")
+    token_versions.set(user.id, user.token_version)
+    token, expires_in = issue_token(user)
+    return {"access_token": token, "expires_in": expires_in}
+
 # ----------------------------------------------------------------------------------
 #                             USER (LOGGED IN)
 # ----------------------------------------------------------------------------------
@@ -56,9 +71,16 @@ async def get_user_by_id(user_id: int, admin: User = Depends(get_admin_user)):
     return {"id": user.id, "login": user.login, "is_admin": user.is_admin}
 
 @router.get("/", tags=["Users: Admin Management"])
-async def list_users(admin: User = Depends(get_admin_user)):
-    """Returns a list of all system users ordered by ID."""
-    users = await User.all().order_by("id")
+async def list_users(
+    response: Response,
+    login_prefix: Optional[str] = None,
+    page: PageParams = Depends(),
+    admin: User = Depends(get_admin_user)):
+    """Returns a page of system users ordered by ID."""
+    query = User.all()
+    if login_prefix:
+        query = query.filter(login__startswith=login_prefix)
+    users = await paginate(query, page, response)
     return [{"id": u.id, "login": u.login, "is_admin": u.is_admin} for u in users]
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED, tags=["Users: Admin Management"])
@@ -70,7 +92,7 @@ async def create_user(user_data: UserCreate, admin: User = Depends(get_admin_use
     if await User.exists(login=user_data.login):
         raise HTTPException(status_code=400, detail="Login already exists")
 
-    hashed = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode()
+    hashed = await hash_password(user_data.password)
     
     user = await User.create(
         login=user_data.login, 
@@ -90,6 +112,7 @@ async def update_user(user_id: int, user_data: UserUpdate, admin: User = Depends
         raise HTTPException(status_code=404, detail="User not found")
 
     data_to_update = user_data.model_dump(exclude_unset=True)
+    previous_login = user.login
 
     if "login" in data_to_update:
         new_login = data_to_update["login"]
@@ -98,12 +121,17 @@ async def update_user(user_id: int, user_data: UserUpdate, admin: User = Depends
         user.login = new_login
 
     if "password" in data_to_update:
-        user.password = bcrypt.hashpw(data_to_update["password"].encode(), bcrypt.gensalt()).decode()
+        user.password = await hash_password(data_to_update["password"])
     
     if "is_admin" in data_to_update:
         user.is_admin = data_to_update["is_admin"]
-    
+
+    # Access tokens issued before the change stop being accepted
+    user.token_version += 1
     await user.save() 
+    # Cached credentials must not outlive a password, login or role change
+    invalidate_user_credentials(previous_login, user.login)
+    token_versions.set(user.id, user.token_version)
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Users: Admin Management"])
@@ -120,4 +148,6 @@ async def delete_user(user_id: int, admin: User = Depends(get_admin_user)):
         raise HTTPException(status_code=404, detail="User not found")
         
     await user.delete() 
+    invalidate_user_credentials(user.login)
+    token_versions.revoke(user.id)
     return None # 204 No Content does not return a body
@@ -8,6 +8,8 @@ class User(models.Model):
     login = fields.CharField(max_length=100, unique=True)
     password = fields.CharField(max_length=255)
     is_admin = fields.BooleanField(default=False)
+    # Bumped on every account change; access tokens carrying an older version are rejected
+    token_version = fields.IntField(default=0)
 
     class Meta:
         table = "users"
@@ -26,3 +26,12 @@ class UserResponse(UserBase):
             }
         }
     )
+
+class LoginRequest(BaseModel):
+    login: str
+    password: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int = Field(..., description="Seconds until the token expires")
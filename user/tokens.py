@@ -0,0 +1,147 @@
+"""
+Short-lived signed access tokens.
+
+A token is "<payload>.<signature>", both base64url: the payload is compact JSON with the
+user id, login, admin flag, the user's token_version and an expiry; the signature is an
+HMAC-SHA256 of the payload. Verifying one needs no database access.
+
+Revocation: update_user and delete_user bump users.token_version (or remove the row).
+Each worker keeps the current version of users it has seen and re-reads them in one
+query at most every WMS_TOKEN_VERSION_REFRESH seconds, so a token older than the
+account change stops working within that interval everywhere and at once locally.
+The map holds at most TOKEN_VERSIONS_SIZE users, and users idle for TOKEN_VERSIONS_TTL
+seconds are dropped on refresh. A failed refresh empties it, so lookups go back to the database.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from tortoise import Tortoise
+
+from settings import settings
+
+# Without a configured secret tokens are only valid in the worker that issued them
+_SECRET = (settings.auth_token_secret or secrets.token_urlsafe(32)).encode()
+
+TOKEN_VERSIONS_SIZE = 10000
+# A user idle this long holds no unexpired token from an earlier request anyway
+TOKEN_VERSIONS_TTL = 900.0
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user, ttl: Optional[float] = None) -> tuple[str, int]:
+    """Returns (token, lifetime in seconds) for a user row."""
+    ttl = int(ttl or settings.access_token_ttl)
+    claims = {"sub": user.id, "login": user.login, "adm": user.is_admin, "ver": user.token_version,
+              "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}", ttl
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Claims of a correctly signed, unexpired token; None for anything else."""
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, binascii.Error):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+class TokenVersions:
+    """
+    Bounded LRU map of the current token_version per user id as seen by this worker;
+    a None version marks a deleted user.
+    """
+
+    def __init__(self, refresh_interval: float, maxsize: int = TOKEN_VERSIONS_SIZE,
+                 ttl: float = TOKEN_VERSIONS_TTL):
+        self.refresh_interval = refresh_interval
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # user id -> (token version, last lookup timestamp)
+        self._versions: OrderedDict[int, tuple[Optional[int], float]] = OrderedDict()
+        self._refreshed_at = time.monotonic()
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def _fetch(self, user_ids: list[int]) -> dict[int, Optional[int]]:
+        rows = await Tortoise.get_connection("default").execute_query_dict(
+            "SELECT id, token_version FROM users WHERE id = ANY($1::int[])", [user_ids]
+        )
+        found = {row["id"]: row["token_version"] for row in rows}
+        return {user_id: found.get(user_id) for user_id in user_ids}
+
+    async def _refresh_all(self) -> None:
+        self._refreshed_at = time.monotonic()
+        idle_since = self._refreshed_at - self.ttl
+        for user_id in [user_id for user_id, (_, used_at) in self._versions.items() if used_at < idle_since]:
+            del self._versions[user_id]
+        try:
+            fetched = await self._fetch(list(self._versions))
+        except Exception as e:
+            # Fail closed: versions that could not be checked are not trusted any longer
+            print(f"Token version refresh failed, dropping cached versions: {e}")
+            self._versions.clear()
+            return
+        for user_id, version in fetched.items():
+            entry = self._versions.get(user_id)
+            if entry is not None:
+                self._versions[user_id] = (version, entry[1])
+
+    def _store(self, user_id: int, version: Optional[int]) -> None:
+        self._versions[user_id] = (version, time.monotonic())
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.maxsize:
+            self._versions.popitem(last=False)
+
+    async def current(self, user_id: int) -> Optional[int]:
+        if user_id in self._versions and time.monotonic() - self._refreshed_at > self.refresh_interval:
+            # One shared query for every known user; concurrent requests wait for the same one
+            if self._refresh is None or self._refresh.done():
+                self._refresh = asyncio.ensure_future(self._refresh_all())
+            await asyncio.shield(self._refresh)
+        entry = self._versions.get(user_id)
+        if entry is None:
+            # Never seen, evicted, or dropped by a failed refresh: ask the database
+            version = (await self._fetch([user_id]))[user_id]
+        else:
+            version = entry[0]
+        self._store(user_id, version)
+        return version
+
+    def set(self, user_id: int, version: int) -> None:
+        self._store(user_id, version)
+
+    def revoke(self, user_id: int) -> None:
+        self._store(user_id, None)
+
+    def clear(self) -> None:
+        self._versions.clear()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+
+token_versions = TokenVersions(settings.token_version_refresh)